@@ -0,0 +1,115 @@
+"""
+Bencode codec benchmark: utils.bencode against bencodepy.
+
+For each bundled sample torrent (and a synthetic multi-file torrent with a
+large 'files' list) it times:
+  - bencodepy: read + decode + re-encode 'info' for the info-hash
+  - eager:     read + utils.bencode.decode + re-encode 'info'
+  - lazy:      mmap + utils.bencode.load + hash the raw 'info' range
+and reports peak Python heap allocation for each via tracemalloc.
+
+Run from src/:  python -m benchmarks.bench_bencode [--repeat N] [--json]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from utils import bencode
+
+try:
+    import bencodepy
+except ImportError:
+    bencodepy = None
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "torrents")
+
+
+def _with_bencodepy(path):
+    with open(path, "rb") as f:
+        data = bencodepy.decode(f.read())
+    info_hash = hashlib.sha1(bencodepy.encode(data[b"info"])).hexdigest()
+    return info_hash, len(data[b"info"][b"pieces"])
+
+
+def _with_eager(path):
+    with open(path, "rb") as f:
+        data = bencode.decode(f.read())
+    info_hash = hashlib.sha1(bencode.encode(data[b"info"])).hexdigest()
+    return info_hash, len(data[b"info"][b"pieces"])
+
+
+def _with_lazy(path):
+    data, mapping = bencode.load(path)
+    info_hash = bencode.info_hash(data)
+    pieces = len(data[b"info"][b"pieces"])
+    del data
+    mapping.close()
+    return info_hash, pieces
+
+
+def _time(func, path, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(path)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def _synthetic_torrent(directory, file_count=20000):
+    """A multi-file torrent with a large 'files' list and a ~2 MB pieces string."""
+    info = {
+        "name": "synthetic",
+        "piece_length": 262144,
+        "pieces": os.urandom(20 * 100000),
+        "files": [{"length": 1000 + i, "path": ["dir", f"file_{i}.bin"]} for i in range(file_count)],
+    }
+    path = os.path.join(directory, "synthetic.torrent")
+    with open(path, "wb") as f:
+        f.write(bencode.encode({"announce": "http://127.0.0.1:6881", "info": info}))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bencode codec benchmark")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    codecs = [("eager", _with_eager), ("lazy", _with_lazy)]
+    if bencodepy:
+        codecs.insert(0, ("bencodepy", _with_bencodepy))
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = sorted(glob.glob(os.path.join(SAMPLE_DIR, "*.torrent"))) + [_synthetic_torrent(tmp)]
+        for path in paths:
+            rows = {}
+            hashes = set()
+            for name, func in codecs:
+                (info_hash, pieces), seconds, peak = _time(func, path, args.repeat)
+                hashes.add(info_hash)
+                rows[name] = {"ms": round(seconds * 1000, 3), "peak_kb": round(peak / 1024, 1)}
+            if len(hashes) != 1:
+                raise AssertionError(f"Info-hash mismatch for {path}: {hashes}")
+            report[os.path.basename(path)] = {"size": os.path.getsize(path), "pieces_bytes": pieces, "codecs": rows}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, result in report.items():
+        print(f"\n{name} ({result['size']} bytes)")
+        for codec, row in result["codecs"].items():
+            print(f"  {codec:>10}: {row['ms']:>9} ms  peak {row['peak_kb']:>9} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Chunk throughput with logging at INFO.
+
+Feeds synthetic pieces through Downloader.handle_chunk_data from several
+threads, and runs REQUEST_CHUNK round trips through
+PeerConnection.send_message_to_peer over a socketpair, with the repo
+logger at INFO writing to logs/app.log under the working directory. Run it
+from a scratch directory to keep the real log untouched, e.g.
+
+    cd /tmp && PYTHONPATH=/path/to/src python -m benchmarks.bench_chunk_logging [--chunks 20000]
+         [--piece-length 16] [--threads 4] [--requests 5000] [--every-chunk] [--json]
+
+--every-chunk logs each piece as the old code did, to separate the cost of
+the queued writer from the throttling of progress messages.
+"""
+import os
+import json
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import contextlib
+from utils.logger import logger
+from peer.downloader import Downloader
+from peer.connections import PeerConnection
+
+
+def handle_chunks(chunks, piece_length, threads, every_chunk=False):
+    """Pieces per second through handle_chunk_data, split across threads."""
+    with tempfile.TemporaryDirectory() as folder:
+        total = chunks + 1  # One piece never arrives, so the file is never assembled
+        metadata = {b'name': b'bench.bin', b'length': total * piece_length, b'piece_length': piece_length}
+        peers = {("127.0.0.1", 7000 + t): None for t in range(threads)}
+        downloader = Downloader(chunk_size=512, peers=peers, save_path=folder, metadata=metadata)
+        if every_chunk and hasattr(downloader, "chunk_log"):
+            downloader.chunk_log.interval = 0
+        data = [os.urandom(piece_length) for _ in range(64)]
+
+        def work(t, peer):
+            for index in range(t, chunks, threads):
+                downloader.handle_chunk_data(peer, "bench.bin", data[index % 64] + index.to_bytes(4, 'big'), index)
+
+        workers = [threading.Thread(target=work, args=(t, peer)) for t, peer in enumerate(peers)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return chunks / (time.perf_counter() - start)
+
+
+def round_trips(requests):
+    """REQUEST_CHUNK-style header round trips per second through send_message_to_peer."""
+    client, server = socket.socketpair()
+    connection = PeerConnection(port=0)
+    connection.peer_pool[("127.0.0.1", 1)] = client
+    reply = json.dumps({'status': 'OK', 'command': 'CHUNK_DATA', 'file_name': 'bench.bin',
+                        'data_length': 0, 'chunk_index': 0}).encode()
+
+    def respond():
+        for _ in range(requests):
+            length = int.from_bytes(server.recv(4), 'big')
+            server.recv(length)
+            server.sendall(len(reply).to_bytes(4, 'big') + reply)
+
+    responder = threading.Thread(target=respond, daemon=True)
+    responder.start()
+    header = {'command': 'REQUEST_CHUNK', 'file_name': 'bench.bin', 'chunk_index': 0}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for _ in range(requests):
+            connection.send_message_to_peer(("127.0.0.1", 1), header, expect_response=True)
+        elapsed = time.perf_counter() - start
+    responder.join()
+    client.close()
+    server.close()
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk throughput with INFO logging")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--piece-length", type=int, default=16, help="Piece size in KB")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--every-chunk", action="store_true", help="Log every piece instead of throttling")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    if not logger.isEnabledFor(logging.INFO):
+        raise SystemExit("logger is not at INFO")
+
+    piece_length = args.piece_length * 1024
+    chunks_per_s = handle_chunks(args.chunks, piece_length, args.threads, args.every_chunk)
+    result = {
+        "chunks": args.chunks,
+        "piece_length_kb": args.piece_length,
+        "threads": args.threads,
+        "chunks_per_s": round(chunks_per_s),
+        "mb_per_s": round(chunks_per_s * piece_length / 1e6, 1),
+        "round_trips_per_s": round(round_trips(args.requests)),
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"handle_chunk_data: {result['chunks_per_s']} chunks/s ({result['mb_per_s']} MB/s of "
+          f"{args.piece_length} KB pieces, {args.threads} threads)")
+    print(f"send_message_to_peer round trips: {result['round_trips_per_s']}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+DHT lookup harness on loopback.
+
+Starts N DHTNodes on 127.0.0.1, each joining through a random node already
+up, then has random nodes announce random info-hashes and other random
+nodes look them up. Reports join time, routing table sizes, and for
+find_node and get_peers lookups the success rate, latency percentiles,
+hop counts and queries sent.
+
+Run from src/:  python -m benchmarks.bench_dht [--nodes 300] [--lookups 200] [--torrents 20] [--json]
+"""
+import os
+import json
+import time
+import random
+import argparse
+from statistics import mean
+from dht.node import DHTNode
+from dht.routing_table import distance
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(results, ok):
+    latencies = [result["seconds"] for result in results]
+    hops = [result["hops"] for result in results]
+    return {
+        "lookups": len(results),
+        "success_rate": round(sum(ok) / max(1, len(ok)), 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "hops_mean": round(mean(hops), 2) if hops else 0,
+        "hops_max": max(hops, default=0),
+        "queries_mean": round(mean(result["queries"] for result in results), 1) if results else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DHT lookups across loopback nodes")
+    parser.add_argument("--nodes", type=int, default=300)
+    parser.add_argument("--lookups", type=int, default=200, help="Lookups of each kind")
+    parser.add_argument("--torrents", type=int, default=20, help="Info-hashes announced before get_peers lookups")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    nodes = []
+    start = time.perf_counter()
+    try:
+        for _ in range(args.nodes):
+            node = DHTNode(host="127.0.0.1")
+            node.start()
+            if nodes:
+                node.bootstrap([("127.0.0.1", rng.choice(nodes).port)])
+            nodes.append(node)
+        join_seconds = time.perf_counter() - start
+
+        # find_node for ids of live nodes: success means the target itself was found
+        find_results, find_ok = [], []
+        for _ in range(args.lookups):
+            source, target = rng.sample(nodes, 2)
+            result = source.lookup(target.node_id)
+            find_results.append(result)
+            find_ok.append(any(node_id == target.node_id for node_id, _, _ in result["nodes"]))
+
+        # get_peers for announced info-hashes: success means the announcing peer came back
+        torrents = {}
+        for t in range(args.torrents):
+            info_hash = os.urandom(20)
+            announcer = rng.choice(nodes)
+            announcer.announce(info_hash, 10000 + t)
+            torrents[info_hash] = ("127.0.0.1", 10000 + t)
+        peer_results, peer_ok = [], []
+        for _ in range(args.lookups):
+            info_hash = rng.choice(list(torrents))
+            peers, result = rng.choice(nodes).get_peers(info_hash)
+            peer_results.append(result)
+            peer_ok.append(torrents[info_hash] in peers)
+
+        # How close each node's table is to the true k nearest of a random id, as a health check
+        target = os.urandom(20)
+        truth = sorted(nodes, key=lambda node: distance(node.node_id, target))[0].node_id
+        result = {
+            "nodes": args.nodes,
+            "join_seconds": round(join_seconds, 2),
+            "table_size_mean": round(mean(len(node.table) for node in nodes), 1),
+            "find_node": summarize(find_results, find_ok),
+            "get_peers": summarize(peer_results, peer_ok),
+            "closest_found": rng.choice(nodes).lookup(target)["nodes"][0][0] == truth,
+        }
+    finally:
+        for node in nodes:
+            node.stop_event.set()
+        for node in nodes:
+            node.stop()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['nodes']} nodes joined in {result['join_seconds']}s, "
+          f"routing table {result['table_size_mean']} nodes on average")
+    for kind in ("find_node", "get_peers"):
+        stats = result[kind]
+        print(f"{kind}: {stats['lookups']} lookups, success {stats['success_rate']:.1%}, "
+              f"p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms, "
+              f"hops mean {stats['hops_mean']} max {stats['hops_max']}, {stats['queries_mean']} queries")
+
+
+if __name__ == "__main__":
+    main()
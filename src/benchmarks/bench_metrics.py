@@ -0,0 +1,84 @@
+"""
+Cost of tracker instrumentation.
+
+Times Metrics.inc and Metrics.observe from one and from several threads,
+and a Peer_DB shard lock (_TimedLock) against a plain threading.Lock, in
+nanoseconds per call.
+
+Run from src/:  python -m benchmarks.bench_metrics [--calls 1000000] [--threads 4] [--json]
+"""
+import json
+import time
+import argparse
+import threading
+from tracker.metrics import Metrics
+from tracker.peers_db import _TimedLock
+
+ROUTE = (("route", "/announce"),)
+STATUS = ROUTE + (("status", 200),)
+
+
+def per_call_ns(func, calls):
+    start = time.perf_counter()
+    func(calls)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def threaded_ns(func, calls, threads):
+    workers = [threading.Thread(target=func, args=(calls // threads,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracker metrics recording cost")
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    metrics = Metrics()
+
+    def inc(n):
+        for _ in range(n):
+            metrics.inc("tracker_requests_total", STATUS)
+
+    def observe(n):
+        for _ in range(n):
+            metrics.observe("tracker_request_duration_seconds", 0.0003, ROUTE)
+
+    def empty(n):
+        for _ in range(n):
+            pass
+
+    def with_lock(lock):
+        def run(n):
+            for _ in range(n):
+                with lock:
+                    pass
+        return run
+
+    loop = per_call_ns(empty, args.calls)
+    result = {
+        "loop_ns": round(loop, 1),
+        "inc_ns": round(per_call_ns(inc, args.calls) - loop, 1),
+        "observe_ns": round(per_call_ns(observe, args.calls) - loop, 1),
+        f"inc_{args.threads}_threads_ns": round(threaded_ns(inc, args.calls, args.threads) - loop, 1),
+        "plain_lock_ns": round(per_call_ns(with_lock(threading.Lock()), args.calls) - loop, 1),
+        "timed_lock_ns": round(per_call_ns(with_lock(_TimedLock()), args.calls) - loop, 1),
+    }
+    total = metrics.snapshot().counters[("tracker_requests_total", STATUS)]
+    result["counted"] = total
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for key, value in result.items():
+        print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
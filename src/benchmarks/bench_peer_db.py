@@ -0,0 +1,83 @@
+"""
+Multi-threaded announce benchmark for Peer_DB.
+
+Each thread announces and refreshes peers on its own set of torrents, the
+pattern of concurrent /announce and /time_update requests. Two layouts are
+compared for 1..N threads:
+  - global:  one shard behind an extra outer lock (the old Tracker.lock + Peer_DB.lock)
+  - sharded: TRACKER_SHARDS shards, no outer lock
+reporting throughput and p99 operation latency, which includes lock waits.
+
+Run from src/:  python -m benchmarks.bench_peer_db [--ops 20000] [--max-threads 8] [--json]
+"""
+import argparse
+import json
+import threading
+import time
+from contextlib import nullcontext
+from tracker.peers_db import Peer_DB
+from utils.config import TRACKER_SHARDS
+
+
+def worker(db, outer_lock, thread_id, ops, latencies):
+    local = []
+    for i in range(ops):
+        torrent_id = f"torrent-{thread_id}-{i % 32}.torrent"
+        peer = (f"10.0.{thread_id}.{i % 250}", 6000 + i // 250)
+        start = time.perf_counter()
+        with outer_lock:
+            try:
+                db.add_peer(torrent_id, peer)
+            except BufferError:
+                db.update_last_seen(torrent_id, peer)
+            db.get_peers(torrent_id)
+        local.append(time.perf_counter() - start)
+    latencies.extend(local)
+
+
+def run(layout, threads, ops):
+    if layout == "global":
+        db, outer_lock = Peer_DB(shards=1), threading.Lock()
+    else:
+        db, outer_lock = Peer_DB(shards=TRACKER_SHARDS), nullcontext()
+    latencies = []
+    workers = [threading.Thread(target=worker, args=(db, outer_lock, t, ops, latencies)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "layout": layout,
+        "threads": threads,
+        "ops_per_s": round(threads * ops / elapsed),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peer_DB multi-threaded announce benchmark")
+    parser.add_argument("--ops", type=int, default=20000, help="Announces per thread")
+    parser.add_argument("--max-threads", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    threads = 1
+    while threads <= args.max_threads:
+        for layout in ("global", "sharded"):
+            results.append(run(layout, threads, args.ops))
+        threads *= 2
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'layout':>8} {'threads':>8} {'ops/s':>10} {'p99 us':>9}")
+    for r in results:
+        print(f"{r['layout']:>8} {r['threads']:>8} {r['ops_per_s']:>10} {r['p99_us']:>9}")
+
+
+if __name__ == "__main__":
+    main()
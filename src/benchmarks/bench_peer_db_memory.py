@@ -0,0 +1,73 @@
+"""
+Peer_DB memory per peer.
+
+Announces N distinct IPv4 peers spread over T torrents, each refreshed a
+couple of times the way /time_update does, and reports the Python heap
+growth per peer (tracemalloc) and the process RSS growth per peer, along
+with the time per announce.
+
+Run from src/:  python -m benchmarks.bench_peer_db_memory [--peers 1000000] [--torrents 1000]
+                [--refreshes 2] [--json]
+"""
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+from tracker.peers_db import Peer_DB
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096
+
+
+def peer(i):
+    return (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 6000 + (i >> 24))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peer_DB bytes per peer")
+    parser.add_argument("--peers", type=int, default=1_000_000)
+    parser.add_argument("--torrents", type=int, default=1000)
+    parser.add_argument("--refreshes", type=int, default=2, help="Refreshes per peer after the announce")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also measure with tracemalloc (slow)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    torrent_ids = [f"torrent-{t}.torrent" for t in range(args.torrents)]
+    gc.collect()
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = rss_bytes()
+    heap_before = tracemalloc.get_traced_memory()[0] if args.tracemalloc else 0
+
+    db = Peer_DB()
+    start = time.perf_counter()
+    for i in range(args.peers):
+        # Fresh strings per call, like values decoded from a request body
+        db.add_peer(str(torrent_ids[i % args.torrents]), peer(i))
+    announce_seconds = time.perf_counter() - start
+    for _ in range(args.refreshes):
+        for i in range(args.peers):
+            db.update_last_seen(str(torrent_ids[i % args.torrents]), peer(i))
+
+    gc.collect()
+    result = {
+        "peers": args.peers,
+        "torrents": args.torrents,
+        "rss_bytes_per_peer": round((rss_bytes() - rss_before) / args.peers, 1),
+        "announce_us": round(announce_seconds / args.peers * 1e6, 2),
+    }
+    if args.tracemalloc:
+        result["heap_bytes_per_peer"] = round((tracemalloc.get_traced_memory()[0] - heap_before) / args.peers, 1)
+        tracemalloc.stop()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(", ".join(f"{key} {value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Piece length tradeoff benchmark.
+
+For a few content sizes, compares fixed piece lengths with the automatic choice:
+  - metadata: size of the 'pieces' string (20 bytes per piece)
+  - overhead: request/response header bytes sent per piece, as a share of the payload
+  - refetch: bytes thrown away when one piece fails verification
+
+Run from src/:  python -m benchmarks.bench_piece_length [--hash-size MB] [--json]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from torrent.torrent_creator import TorrentCreator, choose_piece_length
+
+SIZES = {
+    "1 MB": 1 << 20,
+    "50 MB": 50 << 20,
+    "700 MB": 700 << 20,
+    "6 GB": 6114656256,
+}
+PIECE_LENGTHS_KB = [16, 64, 256, 512, 1024, 4096, 16384]
+
+
+def _header_overhead(file_name, chunk_index, piece_length):
+    """Bytes of framing PeerConnection spends on one REQUEST_CHUNK round trip."""
+    request = {'command': 'REQUEST_CHUNK', 'file_name': file_name, 'chunk_index': chunk_index}
+    response = {'status': 'OK', 'command': 'CHUNK_DATA', 'file_name': file_name,
+                'data_length': piece_length, 'chunk_index': chunk_index}
+    return 8 + len(json.dumps(request).encode()) + len(json.dumps(response).encode())
+
+
+def measure(total_size, piece_length_kb, file_name="ubuntu-24.04-desktop-amd64.iso"):
+    piece_length = piece_length_kb * 1024
+    pieces = (total_size + piece_length - 1) // piece_length
+    overhead = pieces * _header_overhead(file_name, pieces - 1, piece_length)
+    return {
+        "piece_length_kb": piece_length_kb,
+        "pieces": pieces,
+        "metadata_bytes": pieces * 20,
+        "overhead_bytes": overhead,
+        "overhead_pct": round(overhead / total_size * 100, 4),
+        "refetch_bytes": min(piece_length, total_size),
+    }
+
+
+def hash_throughput(size_mb):
+    """Time TorrentCreator piece hashing on a synthetic file for each piece length."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.bin")
+        with open(path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1 << 20))
+        for piece_length_kb in PIECE_LENGTHS_KB:
+            creator = TorrentCreator(path, "http://127.0.0.1:6881", piece_length=piece_length_kb)
+            start = time.perf_counter()
+            creator._calculate_pieces(path)
+            elapsed = time.perf_counter() - start
+            results.append({"piece_length_kb": piece_length_kb,
+                            "mb_per_s": round(size_mb / elapsed, 1)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Piece length tradeoff benchmark")
+    parser.add_argument("--hash-size", type=int, default=0, help="Also time hashing a synthetic file of this many MB")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    report = {"sizes": {}}
+    for label, total_size in SIZES.items():
+        auto = choose_piece_length(total_size)
+        rows = [measure(total_size, kb) for kb in PIECE_LENGTHS_KB]
+        rows.append(dict(measure(total_size, auto), auto=True))
+        report["sizes"][label] = rows
+    if args.hash_size:
+        report["hashing"] = hash_throughput(args.hash_size)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for label, rows in report["sizes"].items():
+        print(f"\n{label}")
+        print(f"{'piece':>10} {'pieces':>9} {'metadata':>10} {'overhead':>10} {'refetch':>10}")
+        for row in rows:
+            name = f"{row['piece_length_kb']}K" + ("*" if row.get("auto") else "")
+            print(f"{name:>10} {row['pieces']:>9} {row['metadata_bytes']:>10} "
+                  f"{row['overhead_pct']:>9}% {row['refetch_bytes']:>10}")
+    for row in report.get("hashing", []):
+        print(f"hash {row['piece_length_kb']:>6}K: {row['mb_per_s']} MB/s")
+    print("\n* = automatic choice")
+
+
+if __name__ == "__main__":
+    main()
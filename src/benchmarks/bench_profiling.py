@@ -0,0 +1,78 @@
+"""
+Cost of the profiling hooks.
+
+Times `with profiler.span(...)` around an empty body with profiling off (the
+normal case), with spans on, and with spans and cProfile on, against the
+same loop without a span. For scale it also times one SHA-1 of a piece,
+the smallest unit of work a span wraps.
+
+Run from src/:  python -m benchmarks.bench_profiling [--calls 1000000] [--piece-length 256] [--json]
+"""
+import json
+import time
+import hashlib
+import argparse
+from utils.profiling import Profiler
+
+
+def loop_ns(profiler, calls):
+    span = profiler.span
+    start = time.perf_counter()
+    for _ in range(calls):
+        with span("hash"):
+            pass
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def bare_ns(calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        pass
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profiling hook overhead")
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--piece-length", type=int, default=256, help="KB hashed for the per-piece comparison")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    bare = bare_ns(args.calls)
+    off = Profiler(spans=False)
+    disabled = loop_ns(off, args.calls) - bare
+    on = Profiler(spans=False)
+    on.start()
+    enabled = loop_ns(on, args.calls) - bare
+    on.stop()
+    cpu = Profiler(spans=False)
+    cpu.start(cpu=True)
+    calls = max(1, args.calls // 10)
+    profiled = loop_ns(cpu, calls) - bare
+    cpu.stop()
+
+    piece = bytes(args.piece_length * 1024)
+    start = time.perf_counter()
+    for _ in range(200):
+        hashlib.sha1(piece).digest()
+    piece_ns = (time.perf_counter() - start) / 200 * 1e9
+
+    result = {
+        "disabled_ns": round(disabled, 1),
+        "spans_ns": round(enabled, 1),
+        "spans_cprofile_ns": round(profiled, 1),
+        "piece_hash_us": round(piece_ns / 1000, 1),
+        "disabled_pct_of_piece_hash": round(disabled / piece_ns * 100, 4),
+        "spans_pct_of_piece_hash": round(enabled / piece_ns * 100, 4),
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"span, profiling off: {result['disabled_ns']} ns  ({result['disabled_pct_of_piece_hash']}% of hashing "
+          f"a {args.piece_length} KB piece, {result['piece_hash_us']} us)")
+    print(f"span, spans on:      {result['spans_ns']} ns  ({result['spans_pct_of_piece_hash']}%)")
+    print(f"span, with cProfile: {result['spans_cprofile_ns']} ns")
+
+
+if __name__ == "__main__":
+    main()
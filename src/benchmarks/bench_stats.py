@@ -0,0 +1,97 @@
+"""
+Cost of transfer statistics.
+
+Times the calls TransferStats puts on the transfer path (RateMeter.add and
+TransferStats.add with its meter lookup), a sample() over many peers, and
+PeerConnection._receive_chunk_data pulling data through a socketpair with
+and without a meter, to show the overhead on an actual receive loop.
+
+Run from src/:  python -m benchmarks.bench_stats [--calls 1000000] [--peers 200] [--torrents 5] [--mb 256] [--json]
+"""
+import json
+import time
+import socket
+import argparse
+import threading
+from peer.stats import TransferStats, DOWNLOAD
+from peer.connections import PeerConnection
+
+
+def per_call_ns(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def receive_seconds(connection, total, meter, block=1 << 20):
+    """Seconds for _receive_chunk_data to pull total bytes, as block-sized pieces, from a socketpair."""
+    reader, writer = socket.socketpair()
+    payload = bytes(block)
+
+    def send():
+        for _ in range(total // block):
+            writer.sendall(payload)
+    sender = threading.Thread(target=send, daemon=True)
+    start = time.perf_counter()
+    sender.start()
+    for _ in range(total // block):
+        connection._receive_chunk_data(reader, block, meter)
+    elapsed = time.perf_counter() - start
+    sender.join()
+    reader.close()
+    writer.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transfer statistics update cost")
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--peers", type=int, default=200, help="Peers per torrent for the sample() timing")
+    parser.add_argument("--torrents", type=int, default=5)
+    parser.add_argument("--mb", type=int, default=256, help="MB pulled through the receive loop")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    stats = TransferStats()
+    peer = ("127.0.0.1", 6000)
+    meter = stats.meter("file.bin", peer, DOWNLOAD)
+    for t in range(args.torrents):
+        for p in range(args.peers):
+            for direction in ("upload", "download"):
+                stats.add(f"torrent{t}", ("10.0.0.1", 7000 + p), direction, 1)
+    meters = args.torrents * args.peers * 2
+    sample_clock = [time.monotonic()]
+
+    def sample():
+        sample_clock[0] += 1.0
+        stats.sample(sample_clock[0])
+
+    connection = PeerConnection(port=0, size_limit=512)
+    total = args.mb << 20
+    # Alternate runs so drift in machine load hits both the same
+    plain, metered = [], []
+    for _ in range(3):
+        plain.append(receive_seconds(connection, total, None))
+        metered.append(receive_seconds(connection, total, meter))
+    plain, metered = min(plain), min(metered)
+    result = {
+        "meter_add_ns": round(per_call_ns(lambda: meter.add(512), args.calls), 1),
+        "stats_add_ns": round(per_call_ns(lambda: stats.add("file.bin", peer, DOWNLOAD, 512), args.calls), 1),
+        "sample_meters": meters + 1,
+        "sample_us": round(per_call_ns(sample, 200) / 1000, 1),
+        "receive_mb_per_s": round(args.mb / plain, 1),
+        "receive_metered_mb_per_s": round(args.mb / metered, 1),
+        "receive_overhead_pct": round((metered - plain) / plain * 100, 2),
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"RateMeter.add: {result['meter_add_ns']} ns, TransferStats.add: {result['stats_add_ns']} ns")
+    print(f"sample() over {result['sample_meters']} meters: {result['sample_us']} us")
+    print(f"receive loop: {result['receive_mb_per_s']} MB/s plain, {result['receive_metered_mb_per_s']} MB/s metered "
+          f"({result['receive_overhead_pct']:+.2f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Loopback swarm benchmark.
+
+Creates a synthetic file and its torrent, starts a Tracker and S seeds on
+127.0.0.1, then L leechers that announce, connect to every peer the tracker
+returns and download the file at the same time. Peers run as threads of this
+process, or with --processes each in its own interpreter so CPU and memory
+are measured per peer and the GIL is not shared.
+
+Reports time to complete (first leecher start to last leecher done),
+aggregate MB/s delivered to leechers, per-leecher download rates, bytes each
+peer uploaded, CPU seconds and peak RSS. --output writes the JSON report to a
+file and --baseline compares against an earlier one.
+
+Leechers get the torrent's info dict with 'path' pointed at their own save
+folder, as on another machine; otherwise they would read the seed's copy.
+
+Loopback has no latency and next to unlimited bandwidth. With --rtt,
+--jitter, --bandwidth or --loss every peer is put behind a benchmarks.netem
+proxy and announces the proxy's port, so all peer-to-peer traffic crosses
+an emulated link (the tracker is reached directly).
+
+Run from src/:  python -m benchmarks.bench_swarm [--seeds 1] [--leechers 4] [--size 16]
+                [--piece-length 256] [--processes] [--rtt MS] [--jitter MS] [--bandwidth MBIT]
+                [--loss PCT] [--json] [--output FILE] [--baseline FILE]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import contextlib
+import tempfile
+import threading
+import subprocess
+from peer.peer import Peer
+from torrent.torrent_creator import TorrentCreator
+from torrent.torrent_parser import TorrentParse
+from benchmarks.bench_tracker import free_port, start_tracker
+
+try:
+    import resource
+except ImportError:  # Windows: CPU from process_time, no peak RSS
+    resource = None
+
+HOST = "127.0.0.1"
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def usage():
+    """(CPU seconds, peak RSS in MB or None) of this process."""
+    if resource is None:
+        return time.process_time(), None
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is KB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss * scale / 1e6
+
+
+def make_torrent(folder, size_mb, piece_length_kb, tracker_url):
+    """Write size_mb of random data and its torrent into folder. Returns (torrent path, sha1 of the data)."""
+    path = os.path.join(folder, "synthetic.bin")
+    digest = hashlib.sha1()
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            block = os.urandom(1 << 20)
+            digest.update(block)
+            f.write(block)
+    torrent_path = TorrentCreator(path, tracker_url, piece_length=piece_length_kb).create_torrent(output_dir=folder)
+    return torrent_path, digest.hexdigest()
+
+
+def leecher_info(info, save_path):
+    info = dict(info)
+    info[b'path'] = os.path.join(save_path, bytes(info[b'name']).decode()).encode()
+    return info
+
+
+class ProxiedPeer(Peer):
+    """Peer reachable at public_port, a netem proxy in front of its listen port: it advertises that port and never dials it."""
+    def __init__(self, *args, public_port, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.public_port = public_port
+        self.pex.port = public_port
+
+    def preferred_peers(self):
+        return [peer for peer in super().preferred_peers() if peer != (self.host, self.public_port)]
+
+    def _merge_peers(self, added, dropped, connected=None, dial=True):
+        added = [peer for peer in added if tuple(peer) != (self.host, self.public_port)]
+        super()._merge_peers(added, dropped, connected, dial)
+
+
+def plan_peers(args):
+    """[(role, index, listen port, public port)]; the ports differ when peers sit behind netem proxies."""
+    shaped = shaping(args) is not None
+    return [(role, i, free_port(), free_port() if shaped else None)
+            for role, count in (("seed", args.seeds), ("leech", args.leechers)) for i in range(count)]
+
+
+def shaping(args):
+    """netem options for the links, or None on plain loopback."""
+    if not (args.rtt or args.jitter or args.bandwidth or args.loss):
+        return None
+    return ["--rtt", str(args.rtt), "--jitter", str(args.jitter), "--bandwidth", str(args.bandwidth),
+            "--loss", str(args.loss), "--stall", str(args.stall), "--seed", str(args.netem_seed)]
+
+
+def start_netem(args, peers):
+    """One netem process with a route per peer, or None when links are not shaped."""
+    options = shaping(args)
+    if options is None:
+        return None
+    routes = [arg for _, _, port, public_port in peers for arg in ("--route", f"{public_port}={HOST}:{port}")]
+    env = dict(os.environ, PYTHONPATH=SRC_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.netem", *routes, *options], env=env, text=True,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    if process.stdout.readline().strip() != "ready":
+        process.kill()
+        raise RuntimeError("netem proxy did not start")
+    return process
+
+
+def start_peer(torrent_path, port, tracker_url, save_path, seed, max_connections, public_port=None):
+    info = TorrentParse(torrent_path).get_info()
+    if not seed:
+        info = leecher_info(info, save_path)
+    options = dict(host=HOST, port=port, max_connections=max_connections,
+                   shared_files=info, save_path=save_path, is_seed=seed)
+    peer = ProxiedPeer(public_port=public_port, **options) if public_port else Peer(**options)
+    peer.start()
+    if not peer.connection.server_ready.wait(10):
+        raise RuntimeError(f"Peer on port {port} did not start")
+    if seed:
+        peer.announce_to_tracker([tracker_url], torrent_path, HOST, public_port or port)
+    return peer
+
+
+def leech(peer, torrent_path, tracker_url, sha1):
+    """Announce, connect and download. Returns this leecher's result."""
+    start = time.perf_counter()
+    public_port = getattr(peer, "public_port", peer.port)
+    peer.get_peer_list(peer.announce_to_tracker([tracker_url], torrent_path, peer.host, public_port))
+    for address in peer.preferred_peers():
+        peer.connect_to_peer(address)
+    name = bytes(peer.shared_files[b'name']).decode()
+    peer.download(name)
+    seconds = time.perf_counter() - start
+    output = os.path.join(peer.save_path, name)
+    complete = False
+    if os.path.exists(output):
+        digest = hashlib.sha1()
+        with open(output, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        complete = digest.hexdigest() == sha1
+    piece_length = peer.shared_files[b'piece_length']
+    length = peer.shared_files[b'length']
+    sources = {}
+    for source, files in peer.downloader.active_downloads.items():
+        served = sum(min(piece_length, length - index * piece_length) for index in files.get(name, []))
+        sources[f"{source[0]}:{source[1]}"] = served
+    received = sum(sources.values())
+    return {
+        "port": public_port,
+        "complete": complete,
+        "seconds": round(seconds, 3),
+        "bytes": received,
+        "mb_per_s": round(received / 1e6 / seconds, 2) if seconds else 0.0,
+        "sources": sources,
+    }
+
+
+def run_in_process(args, peers, torrent_path, tracker_url, sha1, folder):
+    seeds, leechers, results = [], [], []
+    cpu_before, _ = usage()
+    try:
+        for role, i, port, public_port in peers:
+            peer = start_peer(torrent_path, port, tracker_url, os.path.join(folder, f"{role}{i}"),
+                              role == "seed", args.max_connections, public_port)
+            (seeds if role == "seed" else leechers).append(peer)
+        lock = threading.Lock()
+
+        def run(peer):
+            result = leech(peer, torrent_path, tracker_url, sha1)
+            with lock:
+                results.append(result)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=run, args=(peer,)) for peer in leechers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(args.timeout)
+        wall = time.perf_counter() - start
+    finally:
+        for peer in seeds + leechers:
+            peer.stop()
+    cpu_after, peak_rss = usage()
+    process = {"cpu_seconds": round(cpu_after - cpu_before, 2),
+               "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None}
+    return wall, results, {"benchmark": process}
+
+
+def child(args):
+    """One peer of a --processes run, driven over stdin/stdout by the parent."""
+    out, sys.stdout = sys.stdout, open(os.devnull, "w")  # Keep the peer's own prints off the pipe
+    peer = start_peer(args.torrent, args.port, args.tracker, args.save, args.role == "seed", args.max_connections,
+                      args.public_port)
+    print("ready", file=out, flush=True)
+    if args.role == "leech":
+        sys.stdin.readline()  # Parent says go once every leecher is up
+        print(json.dumps(leech(peer, args.torrent, args.tracker, args.sha1)), file=out, flush=True)
+    sys.stdin.read()  # Keep serving pieces until the parent closes stdin
+    cpu, peak_rss = usage()
+    print(json.dumps({"cpu_seconds": round(cpu, 2),
+                      "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None}), file=out, flush=True)
+    peer.stop()
+    os._exit(0)
+
+
+def run_in_processes(args, peers, torrent_path, tracker_url, sha1, folder):
+    def spawn(role, index, port, public_port):
+        command = [sys.executable, "-m", "benchmarks.bench_swarm", "--role", role, "--torrent", torrent_path,
+                   "--port", str(port), "--tracker", tracker_url, "--sha1", sha1,
+                   "--save", os.path.join(folder, f"{role}{index}"), "--max-connections", str(args.max_connections)]
+        if public_port:
+            command += ["--public-port", str(public_port)]
+        workdir = os.path.join(folder, f"{role}{index}-cwd")  # Each child logs to its own logs/app.log
+        os.makedirs(workdir, exist_ok=True)
+        env = dict(os.environ, PYTHONPATH=SRC_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        process = subprocess.Popen(command, cwd=workdir, env=env, text=True,
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if process.stdout.readline().strip() != "ready":
+            raise RuntimeError(f"{role} {index} did not start")
+        return f"{role}:{public_port or port}", process
+
+    children, results = [], []
+    try:
+        for peer in peers:
+            children.append(spawn(*peer))
+        leechers = [process for name, process in children if name.startswith("leech")]
+        start = time.perf_counter()
+        for process in leechers:
+            process.stdin.write("go\n")
+            process.stdin.flush()
+        for process in leechers:
+            line = process.stdout.readline()
+            if line:
+                results.append(json.loads(line))
+        wall = time.perf_counter() - start
+        processes = {}
+        for name, process in children:
+            process.stdin.close()
+            line = process.stdout.readline()
+            process.wait(args.timeout)
+            processes[name] = json.loads(line) if line else None
+    finally:
+        for _, process in children:
+            if process.poll() is None:
+                process.kill()
+    return wall, results, processes
+
+
+def compare(report, baseline):
+    """Percent change of the headline numbers against an earlier report."""
+    changes = {}
+    for key in ("seconds", "mb_per_s", "cpu_seconds", "peak_rss_mb"):
+        old, new = baseline.get(key), report.get(key)
+        if old and new is not None:
+            changes[key] = round((new - old) / old * 100, 1)
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeds and leechers swarming one file over loopback")
+    parser.add_argument("--seeds", type=int, default=1)
+    parser.add_argument("--leechers", type=int, default=4)
+    parser.add_argument("--size", type=int, default=16, help="File size in MB")
+    parser.add_argument("--piece-length", type=int, default=256, help="Piece length in KB")
+    parser.add_argument("--max-connections", type=int, default=16, help="Connection limit of each peer")
+    parser.add_argument("--processes", action="store_true", help="Run each peer in its own process")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for the leechers")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--rtt", type=float, default=0.0, help="Round-trip delay of each peer link, ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Jitter on each direction of a link, ms")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="Cap per link and direction, Mbit/s")
+    parser.add_argument("--loss", type=float, default=0.0, help="Packet loss, percent, each costing a stall")
+    parser.add_argument("--stall", type=float, default=200.0, help="Stall per lost packet, ms")
+    parser.add_argument("--netem-seed", type=int, default=1, help="Random seed for jitter and loss")
+    # Used by the parent to start peers of a --processes run
+    parser.add_argument("--role", choices=["seed", "leech"], help=argparse.SUPPRESS)
+    parser.add_argument("--torrent", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--tracker", help=argparse.SUPPRESS)
+    parser.add_argument("--sha1", help=argparse.SUPPRESS)
+    parser.add_argument("--save", help=argparse.SUPPRESS)
+    parser.add_argument("--public-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.role:
+        return child(args)
+
+    # Peers and tracker print progress to stdout; keep it out of the report
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        tracker_port = free_port()
+        tracker = start_tracker("asyncio", tracker_port)
+        tracker_url = f"http://{HOST}:{tracker_port}"
+        peers = plan_peers(args)
+        seed_ports = [public_port or port for role, _, port, public_port in peers if role == "seed"]
+        netem = None
+        try:
+            torrent_path, sha1 = make_torrent(folder, args.size, args.piece_length, tracker_url)
+            netem = start_netem(args, peers)
+            run = run_in_processes if args.processes else run_in_process
+            wall, results, processes = run(args, peers, torrent_path, tracker_url, sha1, folder)
+        finally:
+            tracker.shutdown()
+            if netem is not None:
+                netem.stdin.close()
+                netem.wait(10)
+
+    uploaded = {}
+    for result in results:
+        for source, served in result["sources"].items():
+            uploaded[source] = uploaded.get(source, 0) + served
+    delivered = sum(result["bytes"] for result in results)
+    rss = [p["peak_rss_mb"] for p in processes.values() if p and p["peak_rss_mb"] is not None]
+    report = {
+        "config": {"seeds": args.seeds, "leechers": args.leechers, "size_mb": args.size,
+                   "piece_length_kb": args.piece_length, "max_connections": args.max_connections,
+                   "processes": args.processes,
+                   "link": {"rtt_ms": args.rtt, "jitter_ms": args.jitter, "bandwidth_mbit": args.bandwidth,
+                            "loss_pct": args.loss, "stall_ms": args.stall} if shaping(args) else None},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "complete": sum(result["complete"] for result in results),
+        "seconds": round(wall, 3),
+        "mb_per_s": round(delivered / 1e6 / wall, 2) if wall else 0.0,
+        "cpu_seconds": round(sum(p["cpu_seconds"] for p in processes.values() if p), 2),
+        "peak_rss_mb": max(rss) if rss else None,
+        "leechers": sorted(results, key=lambda result: result["port"]),
+        "uploaded": {source: {"bytes": served, "mb_per_s": round(served / 1e6 / wall, 2) if wall else 0.0,
+                              "seed": int(source.rsplit(":", 1)[1]) in seed_ports}
+                     for source, served in sorted(uploaded.items())},
+        "processes": processes,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["change_pct"] = compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    link = ""
+    if shaping(args):
+        link = f", links rtt {args.rtt} ms, {args.bandwidth or 'unlimited'} Mbit/s, loss {args.loss}%"
+    print(f"{args.seeds} seeds, {args.leechers} leechers, {args.size} MB in {args.piece_length} KB pieces"
+          f"{' (processes)' if args.processes else ''}{link}")
+    print(f"complete {report['complete']}/{args.leechers} in {report['seconds']}s, {report['mb_per_s']} MB/s aggregate, "
+          f"CPU {report['cpu_seconds']}s, peak RSS {report['peak_rss_mb']} MB")
+    for result in report["leechers"]:
+        print(f"  leecher :{result['port']}  {result['seconds']}s  {result['mb_per_s']} MB/s"
+              f"{'' if result['complete'] else '  INCOMPLETE'}")
+    for source, stats in report["uploaded"].items():
+        print(f"  {'seed' if stats['seed'] else 'peer'} {source} uploaded {stats['bytes'] / 1e6:.1f} MB "
+              f"({stats['mb_per_s']} MB/s)")
+    for key, change in report.get("change_pct", {}).items():
+        print(f"  {key}: {change:+.1f}% vs baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Tracker load benchmark.
+
+Starts a Tracker in-process on a free loopback port and drives it with
+concurrent keep-alive HTTP clients on one asyncio loop. Each client announces
+fresh peers and refreshes them with /time_update; the report gives requests
+per second and latency percentiles.
+
+Run from src/:  python -m benchmarks.bench_tracker [--engine asyncio|flask]
+                [--clients 50] [--requests 200] [--torrents 10] [--json]
+"""
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+from tracker.tracker import Tracker
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_tracker(engine, port, udp_port=None):
+    tracker = Tracker(host="127.0.0.1", port=port, engine=engine, udp_port=udp_port, state_folder=None)
+    threading.Thread(target=tracker.run, daemon=True).start()
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return tracker
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("Tracker did not start")
+
+
+class HttpClient:
+    """Keep-alive HTTP/1.1 client that reconnects when the server closes the connection."""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    async def post(self, path, payload):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode()
+        request = (
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        self.bytes_out += len(request)
+        self.writer.write(request)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        self.bytes_in += len(status_line)
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            self.bytes_in += len(line)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+        self.bytes_in += len(data)
+        if headers.get("connection", "").lower() == "close" or status_line.startswith(b"HTTP/1.0"):
+            self.close()
+        return int(status_line.split()[1]), data
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def run_client(client_id, port, requests, torrents, latencies, errors):
+    client = HttpClient("127.0.0.1", port)
+    peer_port = 10000 + client_id
+    torrent_id = f"torrent-{client_id % torrents}.torrent"
+    try:
+        for i in range(requests):
+            # Alternate a fresh announce with a refresh of that peer
+            path = "/announce" if i % 2 == 0 else "/time_update"
+            payload = {"torrent_id": torrent_id, "peer_ip": f"10.{client_id // 250}.{client_id % 250}.{i // 2 % 250}",
+                       "port": peer_port}
+            start = time.perf_counter()
+            status, _ = await client.post(path, payload)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        client.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_benchmark(engine, clients, requests, torrents):
+    port = free_port()
+    tracker = start_tracker(engine, port)
+    latencies, errors = [], []
+
+    async def drive():
+        await asyncio.gather(*(run_client(i, port, requests, torrents, latencies, errors) for i in range(clients)))
+
+    start = time.perf_counter()
+    asyncio.run(drive())
+    elapsed = time.perf_counter() - start
+    tracker.shutdown()
+    return {
+        "engine": engine,
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracker load benchmark")
+    parser.add_argument("--engine", choices=["asyncio", "flask"], default="asyncio")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per client")
+    parser.add_argument("--torrents", type=int, default=10, help="Number of swarms announced to")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.engine, args.clients, args.requests, args.torrents)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['engine']}: {result['requests']} requests from {result['clients']} clients "
+              f"in {result['seconds']}s = {result['rps']} req/s, "
+              f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, errors {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
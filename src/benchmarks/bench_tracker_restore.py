@@ -0,0 +1,86 @@
+"""
+Tracker warm-restart benchmark.
+
+Fills a Peer_DB with synthetic peers, journals a batch of announces on top,
+writes a snapshot, then times restoring everything into a fresh Peer_DB
+(snapshot load plus journal replay) and reports the file sizes.
+
+Run from src/:  python -m benchmarks.bench_tracker_restore [--peers 1000000] [--torrents 1000]
+                [--journal 100000] [--json]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+from tracker.peers_db import Peer_DB
+from tracker.persistence import TrackerJournal
+from utils.compact_peers import pack_key
+
+
+def fill(peer_db, peers, torrents):
+    expires = int(time.time()) + peer_db.timeout
+    per_torrent = max(1, peers // torrents)
+    for t in range(torrents):
+        swarm = [pack_key(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 6000 + t % 1000) for i in range(per_torrent)]
+        peer_db.restore_swarm(f"torrent-{t}.torrent", swarm, [expires] * len(swarm),
+                              bytes(i % 4 == 0 for i in range(len(swarm))), per_torrent // 4)
+    peer_db.rebuild_expiry()
+    return per_torrent * torrents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracker snapshot/journal restore benchmark")
+    parser.add_argument("--peers", type=int, default=1_000_000)
+    parser.add_argument("--torrents", type=int, default=1000)
+    parser.add_argument("--journal", type=int, default=100_000, help="Journal records written after the snapshot")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        source = Peer_DB()
+        peers = fill(source, args.peers, args.torrents)
+        journal = TrackerJournal(source, folder)
+        journal.start()
+
+        start = time.perf_counter()
+        journal.snapshot()
+        snapshot_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(args.journal):
+            source.add_peer(f"torrent-{i % args.torrents}.torrent", (f"192.168.{i >> 8 & 255}.{i & 255}", 7000 + i % 50))
+        journal_us = (time.perf_counter() - start) / max(1, args.journal) * 1e6
+        journal.flush()
+        snapshot_size = os.path.getsize(journal.snapshot_path)
+        journal_size = os.path.getsize(journal.journal_path)
+
+        target = Peer_DB()
+        start = time.perf_counter()
+        restored = TrackerJournal(target, folder).restore()
+        restore_seconds = time.perf_counter() - start
+        journal.stop_event.set()
+
+        result = {
+            "peers": peers,
+            "journal_records": args.journal,
+            "restored_entries": restored,
+            "snapshot_mb": round(snapshot_size / 2 ** 20, 2),
+            "journal_mb": round(journal_size / 2 ** 20, 2),
+            "snapshot_seconds": round(snapshot_seconds, 3),
+            "add_with_journal_us": round(journal_us, 2),
+            "restore_seconds": round(restore_seconds, 3),
+            "live_after_restore": sum(shard.live for shard in target.shards),
+        }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['peers']} peers: snapshot {result['snapshot_mb']} MB in {result['snapshot_seconds']}s, "
+          f"journal {result['journal_records']} records / {result['journal_mb']} MB "
+          f"({result['add_with_journal_us']} us per add), restore {result['live_after_restore']} peers "
+          f"in {result['restore_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
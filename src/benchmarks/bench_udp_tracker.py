@@ -0,0 +1,87 @@
+"""
+Announce cost per request: UDP tracker protocol against HTTP/JSON.
+
+Starts one Tracker with both listeners on loopback and announces the same
+peers sequentially over each transport, through a keep-alive HTTP client and
+through UDPTrackerClient. Reports wall time and CPU time per announce (client
+and tracker share the process, so CPU covers both ends) and the payload
+bytes each client actually sent and received per announce, excluding
+TCP/UDP/IP headers.
+
+Run from src/:  python -m benchmarks.bench_udp_tracker [--requests 2000] [--swarm 50] [--json]
+"""
+import argparse
+import asyncio
+import json
+import time
+from benchmarks.bench_tracker import HttpClient, free_port, start_tracker
+from peer.udp_tracker_client import UDPTrackerClient
+from tracker.udp_server import EVENT_NONE
+
+TORRENT_ID = "bench.torrent"
+
+
+def fill_swarm(tracker, size):
+    for i in range(size):
+        tracker.peer_db.add_peer(TORRENT_ID, (f"10.0.{i // 250}.{i % 250}", 6000))
+
+
+def bench_http(port, requests):
+    client = HttpClient("127.0.0.1", port)
+
+    async def drive():
+        for i in range(requests):
+            await client.post("/announce", {"torrent_id": TORRENT_ID, "peer_ip": "127.0.0.1",
+                                            "port": 20000 + i, "compact": 1})
+        client.close()
+
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    asyncio.run(drive())
+    return time.perf_counter() - start_wall, time.process_time() - start_cpu, client.bytes_out + client.bytes_in
+
+
+def bench_udp(port, requests):
+    client = UDPTrackerClient()
+    url = f"udp://127.0.0.1:{port}/announce"
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    for i in range(requests):
+        client.announce(url, TORRENT_ID, "127.0.0.1", 20000 + i, event=EVENT_NONE)
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    client.close()
+    return wall, cpu, client.bytes_out + client.bytes_in
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP vs HTTP announce cost")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--swarm", type=int, default=50, help="Peers already in the swarm (sets reply size)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    port = free_port()
+    tracker = start_tracker("asyncio", port, udp_port=port)
+    tracker.udp_server.ready.wait(5)
+    fill_swarm(tracker, args.swarm)
+
+    results = {}
+    for name, func in (("http", bench_http), ("udp", bench_udp)):
+        wall, cpu, wire_bytes = func(port, args.requests)
+        results[name] = {
+            "wall_us": round(wall / args.requests * 1e6, 1),
+            "cpu_us": round(cpu / args.requests * 1e6, 1),
+            "bytes": round(wire_bytes / args.requests),
+        }
+        # Each transport announces the same new peers, start the next from the same swarm
+        for i in range(args.requests):
+            tracker.peer_db.remove_peer(TORRENT_ID, ("127.0.0.1", 20000 + i))
+    tracker.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, r in results.items():
+        print(f"{name:>5}: {r['wall_us']:>8} us wall, {r['cpu_us']:>8} us CPU, {r['bytes']:>6} bytes per announce")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+User-space network emulation proxy.
+
+Forwards TCP connections from a listen port to a target address and shapes
+each direction of each connection like a WAN link: half the RTT of one-way
+delay plus uniform jitter, a bandwidth cap with a short queue (senders block
+once it holds more than QUEUE_SECONDS of data), and packet-loss-style stalls
+where a lost packet holds the link for the stall time, as a retransmission
+timeout would. Delivery stays in order, as it does over TCP.
+
+Needs no privileges: put a proxy in front of each peer's listen port and
+announce the proxy's port instead (see bench_swarm --rtt/--bandwidth).
+
+Run from src/:  python -m benchmarks.netem --route 7001=127.0.0.1:6001[,rtt=80,bandwidth=5] [--route ...]
+                [--rtt 50] [--jitter 5] [--bandwidth 20] [--loss 0.1] [--stall 200] [--seed 1]
+Prints "ready" once every route listens and runs until interrupted or stdin closes.
+"""
+import sys
+import socket
+import random
+import asyncio
+import threading
+import argparse
+
+CHUNK = 16 * 1024
+PACKET = 1460           # Loss is drawn per packet of this many bytes
+QUEUE_SECONDS = 0.1     # Link queue depth before the sender is made to wait
+
+
+class LinkProfile:
+    """Shaping of one direction of a link. rtt, jitter and stall in ms, bandwidth in Mbit/s (0 = unlimited), loss in %."""
+    FIELDS = ("rtt", "jitter", "bandwidth", "loss", "stall")
+
+    def __init__(self, rtt=0.0, jitter=0.0, bandwidth=0.0, loss=0.0, stall=200.0):
+        self.rtt = rtt
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.loss = loss
+        self.stall = stall
+
+    def replace(self, **changes):
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        values.update(changes)
+        return LinkProfile(**values)
+
+    def __repr__(self):
+        return "LinkProfile(" + ", ".join(f"{field}={getattr(self, field)}" for field in self.FIELDS) + ")"
+
+
+class Link:
+    """Delivery schedule of one direction of one connection."""
+    def __init__(self, profile, rng):
+        self.profile = profile
+        self.rng = rng
+        self.free_at = 0.0     # When the link finishes sending what it has queued
+        self.last_due = 0.0
+
+    def schedule(self, now, size):
+        """Time at which size bytes read at now reach the other side."""
+        profile = self.profile
+        start = max(now, self.free_at)
+        if profile.bandwidth:
+            start += size * 8 / (profile.bandwidth * 1e6)
+        if profile.loss:
+            packets = (size + PACKET - 1) // PACKET
+            if self.rng.random() < 1 - (1 - profile.loss / 100) ** packets:
+                start += profile.stall / 1000
+        self.free_at = start
+        delay = profile.rtt / 2000
+        if profile.jitter:
+            delay = max(0.0, delay + self.rng.uniform(-profile.jitter, profile.jitter) / 1000)
+        self.last_due = max(start + delay, self.last_due)
+        return self.last_due
+
+    def backlog(self, now):
+        return self.free_at - now
+
+
+class NetemProxy:
+    """Forwards listen_port to target, shaping both directions of every connection with profile."""
+    def __init__(self, listen_port, target, profile, host="127.0.0.1", seed=None):
+        self.host = host
+        self.listen_port = listen_port
+        self.target = target
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.server = None
+        self.connections = 0
+        self.bytes = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.listen_port)
+        self.listen_port = self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, client_reader, client_writer):
+        try:
+            target_reader, target_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            client_writer.close()
+            return
+        self.connections += 1
+        for writer in (client_writer, target_writer):
+            sock = writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            await asyncio.gather(
+                self._pipe(client_reader, target_writer, Link(self.profile, random.Random(self.rng.random()))),
+                self._pipe(target_reader, client_writer, Link(self.profile, random.Random(self.rng.random()))),
+                return_exceptions=True,
+            )
+        except asyncio.CancelledError:
+            pass  # Proxy shutting down with the connection still open
+        finally:
+            for writer in (client_writer, target_writer):
+                writer.close()
+
+    async def _pipe(self, reader, writer, link):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if data is None:
+                    break
+                writer.write(data)
+                await writer.drain()
+                self.bytes += len(data)
+            if writer.can_write_eof():
+                writer.write_eof()
+
+        sender = asyncio.ensure_future(deliver())
+        try:
+            while True:
+                try:
+                    data = await reader.read(CHUNK)
+                except ConnectionError:
+                    data = b""
+                now = loop.time()
+                if not data:
+                    queue.put_nowait((max(now, link.last_due), None))
+                    break
+                queue.put_nowait((link.schedule(now, len(data)), data))
+                backlog = link.backlog(now)
+                if backlog > QUEUE_SECONDS:
+                    await asyncio.sleep(backlog - QUEUE_SECONDS)
+            await sender
+        except (ConnectionError, OSError):
+            sender.cancel()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+
+def parse_route(value, default):
+    """'LISTEN_PORT=HOST:PORT[,field=value...]' -> (listen port, (host, port), LinkProfile)."""
+    try:
+        listen, _, rest = value.partition("=")
+        target, *overrides = rest.split(",")
+        host, _, port = target.rpartition(":")
+        changes = {}
+        for override in overrides:
+            field, _, number = override.partition("=")
+            if field not in LinkProfile.FIELDS:
+                raise ValueError(f"unknown link field {field}")
+            changes[field] = float(number)
+        return int(listen), (host or "127.0.0.1", int(port)), default.replace(**changes)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"invalid route {value}: {e}")
+
+
+async def serve(routes, seed=None):
+    proxies = [NetemProxy(listen, target, profile, seed=None if seed is None else seed + i)
+               for i, (listen, target, profile) in enumerate(routes)]
+    for proxy in proxies:
+        await proxy.start()
+    print("ready", flush=True)
+    loop = asyncio.get_running_loop()
+    closed = asyncio.Event()
+
+    def wait_stdin():
+        sys.stdin.read()
+        loop.call_soon_threadsafe(closed.set)
+    # Stop when stdin closes, so a parent process can end the proxy by closing the pipe
+    threading.Thread(target=wait_stdin, daemon=True).start()
+    await closed.wait()
+    for proxy in proxies:
+        proxy.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TCP proxy adding latency, jitter, bandwidth caps and stalls")
+    parser.add_argument("--route", action="append", required=True, metavar="PORT=HOST:PORT[,field=value]",
+                        help="Listen on PORT and forward to HOST:PORT; fields override the link defaults")
+    parser.add_argument("--rtt", type=float, default=0.0, help="Round-trip delay added, ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on each direction, ms")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="Cap per direction and connection, Mbit/s")
+    parser.add_argument("--loss", type=float, default=0.0, help="Packet loss, percent")
+    parser.add_argument("--stall", type=float, default=200.0, help="Stall per lost packet, ms")
+    parser.add_argument("--seed", type=int, help="Random seed for jitter and loss")
+    args = parser.parse_args()
+    default = LinkProfile(args.rtt, args.jitter, args.bandwidth, args.loss, args.stall)
+    routes = [parse_route(route, default) for route in args.route]
+    try:
+        asyncio.run(serve(routes, args.seed))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
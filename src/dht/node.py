@@ -0,0 +1,296 @@
+import os
+import hmac
+import time
+import socket
+import hashlib
+import threading
+import itertools
+from utils import bencode
+from utils.logger import logger
+from utils.compact_peers import pack_peer, unpack_peers
+from utils.config import (
+    DHT_K, DHT_ALPHA, DHT_TIMEOUT, DHT_TOKEN_INTERVAL, DHT_PEER_TTL,
+    DHT_ANNOUNCE_INTERVAL, DHT_MAX_VALUES
+)
+from dht.routing_table import RoutingTable, ID_LENGTH, random_id, distance, pack_nodes, unpack_nodes
+
+def to_id(info_hash):
+    """20-byte id from a hex info-hash (as TorrentParse.get_info_hash returns) or raw bytes."""
+    return bytes.fromhex(info_hash) if isinstance(info_hash, str) else bytes(info_hash)
+
+class DHTNode:
+    """
+    Kademlia node speaking the BEP 5 KRPC messages (ping, find_node,
+    get_peers, announce_peer) as bencoded dicts over UDP.
+
+    One thread serves the socket: it answers queries and hands replies to
+    the callers waiting on them, so lookups must run on other threads.
+    Lookups are iterative, alpha queries per round, until the k closest
+    nodes seen have all answered; get_peers may stop at the first round
+    that returns peers. announce_peer tokens are an HMAC of the querier's
+    IP and a time window, valid for two windows, so they need no state.
+    """
+    def __init__(self, host='0.0.0.0', port=0, node_id=None, k=DHT_K, alpha=DHT_ALPHA, timeout=DHT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.node_id = node_id or random_id()
+        self.k = k
+        self.alpha = alpha
+        self.timeout = timeout
+        self.table = RoutingTable(self.node_id, k)
+        self.secret = os.urandom(16)
+        self.storage = {}    # info_hash -> {(ip, port): expires}
+        self.storage_lock = threading.Lock()
+        self.pending = {}    # transaction id -> [event, reply, address]
+        self.pending_lock = threading.Lock()
+        self.transaction_ids = itertools.count()
+        self.announced = {}  # info_hash -> (port, monotonic time of the last announce)
+        self.sock = None
+        self.thread = None
+        self.maintenance_thread = None
+        self.stop_event = threading.Event()
+
+    # Lifecycle
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((self.host, self.port))
+        self.sock.settimeout(1)
+        self.port = self.sock.getsockname()[1]
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        logger.info(f"DHT node {self.node_id.hex()[:8]} on {self.host}:{self.port}")
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in (self.thread, self.maintenance_thread):
+            if thread:
+                thread.join(timeout=2)
+        if self.sock:
+            self.sock.close()
+        self.thread = self.maintenance_thread = self.sock = None
+
+    def _serve(self):
+        while not self.stop_event.is_set():
+            try:
+                packet, addr = self.sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                message = bencode.decode(packet)
+            except (ValueError, IndexError, TypeError):
+                continue
+            if not isinstance(message, dict):
+                continue
+            kind = message.get(b'y')
+            if kind == b'q':
+                reply = self._handle_query(message, addr)
+                try:
+                    self.sock.sendto(bencode.encode(reply), addr)
+                except OSError as e:
+                    logger.warning(f"DHT reply to {addr} failed: {e}")
+            elif kind in (b'r', b'e'):
+                self._handle_reply(message, addr)
+
+    # Serving
+    def _token(self, ip, window=None):
+        window = int(time.time()) // DHT_TOKEN_INTERVAL if window is None else window
+        return hmac.new(self.secret, f"{ip}:{window}".encode(), hashlib.sha1).digest()[:8]
+
+    def _valid_token(self, token, ip):
+        window = int(time.time()) // DHT_TOKEN_INTERVAL
+        return isinstance(token, bytes) and any(
+            hmac.compare_digest(token, self._token(ip, w)) for w in (window, window - 1))
+
+    def stored_peers(self, info_hash):
+        now = time.time()
+        with self.storage_lock:
+            peers = self.storage.get(info_hash, {})
+            return [address for address, expires in peers.items() if expires > now]
+
+    def _handle_query(self, message, addr):
+        transaction_id = message.get(b't', b'')
+        try:
+            args = message[b'a']
+            sender = args[b'id']
+            if isinstance(sender, bytes) and len(sender) == ID_LENGTH:
+                self.table.update(sender, addr)
+            method = message[b'q']
+            reply = {b'id': self.node_id}
+            if method == b'ping':
+                pass
+            elif method == b'find_node':
+                reply[b'nodes'] = pack_nodes(self.table.closest(args[b'target']))
+            elif method == b'get_peers':
+                info_hash = args[b'info_hash']
+                reply[b'token'] = self._token(addr[0])
+                peers = self.stored_peers(info_hash)[:DHT_MAX_VALUES]
+                if peers:
+                    reply[b'values'] = [record for record in (pack_peer(ip, port) for ip, port in peers) if record]
+                else:
+                    reply[b'nodes'] = pack_nodes(self.table.closest(info_hash))
+            elif method == b'announce_peer':
+                if not self._valid_token(args.get(b'token'), addr[0]):
+                    return {b't': transaction_id, b'y': b'e', b'e': [203, b"Bad token"]}
+                port = addr[1] if args.get(b'implied_port') else args[b'port']
+                if not isinstance(port, int) or not 0 < port < 65536:
+                    raise ValueError("Bad port")
+                with self.storage_lock:
+                    self.storage.setdefault(args[b'info_hash'], {})[(addr[0], port)] = time.time() + DHT_PEER_TTL
+            else:
+                return {b't': transaction_id, b'y': b'e', b'e': [204, b"Method Unknown"]}
+            return {b't': transaction_id, b'y': b'r', b'r': reply}
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return {b't': transaction_id, b'y': b'e', b'e': [203, b"Protocol Error"]}
+
+    def _handle_reply(self, message, addr):
+        with self.pending_lock:
+            waiter = self.pending.get(message.get(b't'))
+        if waiter is None or waiter[2] != addr:
+            return  # Unknown, late, or from someone we did not ask
+        reply = message.get(b'r')
+        waiter[1] = reply if isinstance(reply, dict) else None
+        waiter[0].set()
+
+    # Querying
+    def _send_query(self, address, method, args):
+        transaction_id = (next(self.transaction_ids) & 0xFFFFFFFF).to_bytes(4, 'big')
+        waiter = [threading.Event(), None, address]
+        with self.pending_lock:
+            self.pending[transaction_id] = waiter
+        query = {b't': transaction_id, b'y': b'q', b'q': method, b'a': {b'id': self.node_id, **args}}
+        try:
+            self.sock.sendto(bencode.encode(query), address)
+        except OSError:
+            waiter[0].set()
+        return transaction_id, waiter
+
+    def _query_many(self, method, queries):
+        """
+        Send every (node_id, address, args) query at once and wait up to timeout
+        for the replies. Returns (node_id, address, reply dict or None) in order.
+        """
+        sent = [(node_id, address, self._send_query(address, method, args)) for node_id, address, args in queries]
+        deadline = time.monotonic() + self.timeout
+        results = []
+        for node_id, address, (transaction_id, waiter) in sent:
+            waiter[0].wait(max(0.0, deadline - time.monotonic()))
+            with self.pending_lock:
+                self.pending.pop(transaction_id, None)
+            reply = waiter[1]
+            if reply is not None and isinstance(reply.get(b'id'), bytes):
+                self.table.update(reply[b'id'], address)
+            elif node_id is not None:
+                self.table.fail(node_id)
+            results.append((node_id, address, reply))
+        return results
+
+    def ping(self, address):
+        """Node id of the node at address, or None if it does not answer."""
+        _, _, reply = self._query_many(b'ping', [(None, tuple(address), {})])[0]
+        return reply.get(b'id') if reply else None
+
+    def lookup(self, target, method=b'find_node', stop_on_values=False):
+        """
+        Iterative lookup of target. Returns a dict with the k closest nodes
+        that answered as (node_id, address, token), peers found (get_peers),
+        hops (rounds of queries to the closest answering node, or to the first
+        node holding peers), queries sent and seconds taken.
+        """
+        start = time.perf_counter()
+        target = to_id(target)
+        args = {b'info_hash': target} if method == b'get_peers' else {b'target': target}
+        shortlist = dict(self.table.closest(target, self.k))
+        depth = dict.fromkeys(shortlist, 1)
+        queried, answered, peers = set(), {}, []
+        queries, value_depth = 0, None
+        key = lambda node_id: distance(node_id, target)
+        while True:
+            closest = sorted(shortlist, key=key)[:self.k]
+            batch = [node_id for node_id in closest if node_id not in queried][:self.alpha]
+            if not batch:
+                break
+            queried.update(batch)
+            queries += len(batch)
+            for node_id, address, reply in self._query_many(method, [(n, shortlist[n], args) for n in batch]):
+                if reply is None:
+                    del shortlist[node_id]
+                    continue
+                answered[node_id] = (address, reply.get(b'token'))
+                nodes = reply.get(b'nodes')
+                for found_id, found_address in unpack_nodes(nodes) if isinstance(nodes, bytes) else []:
+                    if found_id != self.node_id and found_id not in shortlist:
+                        shortlist[found_id] = found_address
+                        depth[found_id] = depth[node_id] + 1
+                values = reply.get(b'values')
+                if isinstance(values, list) and values:
+                    peers.extend(tuple(peer) for peer in unpack_peers(b"".join(v for v in values if isinstance(v, bytes))))
+                    value_depth = depth[node_id] if value_depth is None else min(value_depth, depth[node_id])
+            if stop_on_values and peers:
+                break
+        nodes = sorted(answered, key=key)[:self.k]
+        if value_depth is not None:
+            hops = value_depth
+        else:
+            hops = depth[nodes[0]] if nodes else 0
+        return {
+            "nodes": [(node_id, answered[node_id][0], answered[node_id][1]) for node_id in nodes],
+            "peers": list(dict.fromkeys(peers)),
+            "hops": hops,
+            "queries": queries,
+            "seconds": time.perf_counter() - start,
+        }
+
+    # High level
+    def bootstrap(self, addresses):
+        """Join through known nodes, then look up our own id to fill the routing table."""
+        addresses = [(socket.gethostbyname(host), int(port)) for host, port in addresses]
+        replies = self._query_many(b'ping', [(None, address, {}) for address in addresses])
+        if not any(reply for _, _, reply in replies):
+            logger.warning("DHT bootstrap: no node answered")
+            return 0
+        self.lookup(self.node_id)
+        return len(self.table)
+
+    def get_peers(self, info_hash):
+        """(peers, lookup stats) for info_hash."""
+        result = self.lookup(info_hash, b'get_peers', stop_on_values=True)
+        return result["peers"], result
+
+    def announce(self, info_hash, port):
+        """
+        Tell the k closest nodes to info_hash that we serve it on port, and keep
+        re-announcing every DHT_ANNOUNCE_INTERVAL. Returns (nodes that stored it, peers seen).
+        """
+        info_hash = to_id(info_hash)
+        result = self.lookup(info_hash, b'get_peers')
+        replies = self._query_many(b'announce_peer', [
+            (node_id, address, {b'info_hash': info_hash, b'port': port, b'token': token})
+            for node_id, address, token in result["nodes"] if token
+        ])
+        stored = sum(reply is not None for _, _, reply in replies)
+        self.announced[info_hash] = (port, time.monotonic())
+        if self.maintenance_thread is None and not self.stop_event.is_set():
+            self.maintenance_thread = threading.Thread(target=self._maintain, daemon=True)
+            self.maintenance_thread.start()
+        return stored, result["peers"]
+
+    def _maintain(self):
+        """Expire stored peers and re-announce our torrents before other nodes forget them."""
+        while not self.stop_event.wait(60):
+            now = time.time()
+            with self.storage_lock:
+                for info_hash in list(self.storage):
+                    peers = {address: expires for address, expires in self.storage[info_hash].items() if expires > now}
+                    if peers:
+                        self.storage[info_hash] = peers
+                    else:
+                        del self.storage[info_hash]
+            for info_hash, (port, last) in list(self.announced.items()):
+                if time.monotonic() - last >= DHT_ANNOUNCE_INTERVAL:
+                    try:
+                        self.announce(info_hash, port)
+                    except OSError as e:
+                        logger.warning(f"DHT re-announce failed: {e}")
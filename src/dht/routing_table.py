@@ -0,0 +1,91 @@
+import os
+import socket
+import struct
+import threading
+from collections import OrderedDict
+from utils.config import DHT_K
+
+ID_LENGTH = 20
+_PORT = struct.Struct(">H")
+NODE_INFO_LENGTH = ID_LENGTH + 6
+
+def random_id():
+    return os.urandom(ID_LENGTH)
+
+def distance(a, b):
+    """XOR metric between two node ids, as an int."""
+    return int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')
+
+def pack_nodes(nodes):
+    """Compact node info: 20-byte id, IPv4 address and big-endian port per node."""
+    out = []
+    for node_id, (ip, port) in nodes:
+        try:
+            out.append(node_id + socket.inet_aton(ip) + _PORT.pack(port))
+        except (OSError, struct.error):
+            continue
+    return b"".join(out)
+
+def unpack_nodes(data):
+    return [
+        (data[i:i + ID_LENGTH], (socket.inet_ntoa(data[i + ID_LENGTH:i + ID_LENGTH + 4]),
+                                 _PORT.unpack_from(data, i + ID_LENGTH + 4)[0]))
+        for i in range(0, len(data) - len(data) % NODE_INFO_LENGTH, NODE_INFO_LENGTH)
+    ]
+
+class RoutingTable:
+    """
+    Kademlia routing table: bucket i holds up to k nodes whose distance from
+    our id has bit length i + 1, least recently seen first. A full bucket
+    keeps its old nodes, which are the likeliest to stay up, unless one of
+    them has stopped answering; nodes are dropped after max_failures
+    unanswered queries in a row.
+    """
+    def __init__(self, node_id, k=DHT_K, max_failures=2):
+        self.node_id = node_id
+        self.k = k
+        self.max_failures = max_failures
+        self.buckets = [OrderedDict() for _ in range(ID_LENGTH * 8)]  # node id -> [address, failures]
+        self.lock = threading.Lock()
+
+    def _bucket(self, node_id):
+        return self.buckets[distance(self.node_id, node_id).bit_length() - 1]
+
+    def update(self, node_id, address):
+        """Record that node_id answered or queried us from address. Returns True if it is in the table."""
+        if node_id == self.node_id or len(node_id) != ID_LENGTH:
+            return False
+        with self.lock:
+            bucket = self._bucket(node_id)
+            if node_id in bucket:
+                bucket[node_id] = [address, 0]
+                bucket.move_to_end(node_id)
+                return True
+            if len(bucket) >= self.k:
+                stale = next((known for known, (_, failures) in bucket.items() if failures), None)
+                if stale is None:
+                    return False
+                del bucket[stale]
+            bucket[node_id] = [address, 0]
+            return True
+
+    def fail(self, node_id):
+        """A query to node_id went unanswered."""
+        with self.lock:
+            bucket = self._bucket(node_id) if node_id != self.node_id else {}
+            entry = bucket.get(node_id)
+            if entry is not None:
+                entry[1] += 1
+                if entry[1] >= self.max_failures:
+                    del bucket[node_id]
+
+    def closest(self, target, count=None):
+        """Up to count (default k) (node_id, address) pairs nearest to target."""
+        with self.lock:
+            nodes = [(node_id, entry[0]) for bucket in self.buckets for node_id, entry in bucket.items()]
+        target = int.from_bytes(target, 'big')
+        nodes.sort(key=lambda node: int.from_bytes(node[0], 'big') ^ target)
+        return nodes[:count or self.k]
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
@@ -1,8 +1,13 @@
 import socket
 import threading
 import json
-import requests
 from utils.logger import logger
+from utils.compact_peers import decode_peers
+from peer.udp_tracker_client import UDPTrackerClient
+from peer.tracker_client import TrackerClient
+from tracker.udp_server import EVENT_NONE, EVENT_STARTED, EVENT_STOPPED
+from peer.stats import UPLOAD, DOWNLOAD
+from utils.profiling import profiler
 
 class PeerConnection:
     def __init__(self, host='0.0.0.0', port=6881, max_connection=5, size_limit=1):
@@ -13,6 +18,9 @@ class PeerConnection:
         
         # Connection management
         self.peer_pool = {}
+        self.outbound = set()  # Addresses we connected to, keyed by their listening address
+        # One request/response exchange at a time per socket
+        self.peer_locks = {}
         self.server_ready = threading.Event()
         self.running = False
         self.lock = threading.Lock()
@@ -27,6 +35,12 @@ class PeerConnection:
         # Server infrastructure
         self.server_socket = None
         self.server_thread = None
+        # Pooled HTTP tracker requests with retry and failover; udp:// URLs use udp_tracker
+        self.tracker_client = TrackerClient()
+        self.udp_tracker = UDPTrackerClient()
+        # TransferStats counting piece bytes each way, set by Peer
+        self.stats = None
+        self.peer_address = None  # Optional: connection key -> listening address, so uploads and downloads meter alike
 
     def start_server(self):
         """Start the server in a separate non-daemon thread."""
@@ -51,6 +65,8 @@ class PeerConnection:
             self.chunk_request_callback = callback_func
         elif callback_type == 'chunk_received':
             self.chunk_received_callback = callback_func
+        elif callback_type == 'pex':
+            self.pex_callback = callback_func
         else:
             raise ValueError(f"Invalid callback type: {callback_type}")
         
@@ -120,6 +136,8 @@ class PeerConnection:
                         self._handle_chunk_request(conn, header, peer_id)
                     elif command == "CHUNK_DATA":
                         self._handle_incoming_chunk(conn, header)
+                    elif command == "PEX":
+                        self._handle_pex(conn, header, peer_id)
                 except socket.timeout():
                     continue
                 except KeyError as e:
@@ -162,16 +180,18 @@ class PeerConnection:
             if header_len <= 0 or header_len > 1024:  # Add reasonable limit
                 return None
 
-            # Receive full header
-            header = b''
-            while len(header) < header_len:
-                chunk = conn.recv(header_len - len(header))
-                if not chunk:
-                    return None
-                header += chunk
-
-            # Safely decode with error handling
-            decoded = json.loads(header.decode('utf-8', errors='replace'))
+            # Timed from the length prefix on, leaving out the wait for the next request
+            with profiler.span("receive_header"):
+                # Receive full header
+                header = b''
+                while len(header) < header_len:
+                    chunk = conn.recv(header_len - len(header))
+                    if not chunk:
+                        return None
+                    header += chunk
+
+                # Safely decode with error handling
+                decoded = json.loads(header.decode('utf-8', errors='replace'))
             
             # Convert only if it's a string
             if 'file_name' in decoded:
@@ -190,7 +210,9 @@ class PeerConnection:
             success, chunk_data = self.chunk_request_callback(
                 peer_id=peer_id,
                 file_name=file_name,  # Pass bytes directly
-                chunk_index=header['chunk_index']
+                chunk_index=header['chunk_index'],
+                offset=header.get('offset', 0),  # Optional block range within the piece
+                length=header.get('length')
             )
             # Keep response filename as string for JSON compatibility
             response_header = {
@@ -201,7 +223,12 @@ class PeerConnection:
             if success:
                 response_header['data_length'] = len(chunk_data)
                 response_header['chunk_index'] = header['chunk_index']
+                if 'offset' in header:
+                    response_header['offset'] = header['offset']
                 self._send_response(conn, response_header, chunk_data)
+                if self.stats is not None:
+                    peer = self.peer_address(peer_id) if self.peer_address else peer_id
+                    self.stats.add(response_header['file_name'], peer, UPLOAD, len(chunk_data))
             else:
                 self._send_response(conn, response_header)
 
@@ -235,32 +262,43 @@ class PeerConnection:
 
         except Exception as e:
             conn.sendall(b"ERR")
+    def _handle_pex(self, conn, header, peer_id):
+        """Hand a peer exchange request to the callback and send back its reply."""
+        if self.pex_callback:
+            reply = self.pex_callback(peer_id, header)
+        else:
+            reply = {'command': 'PEX', 'status': 'ERROR', 'reason': 'Peer exchange disabled'}
+        self._send_response(conn, reply)
     def _send_response(self, conn: socket.socket, header, data=None):
         """Send response and wait for ACK"""
         try:
-            header_bytes = json.dumps(header).encode()
-            conn.sendall(len(header_bytes).to_bytes(4, 'big'))
-            conn.sendall(header_bytes)
-            
-            if data:
-                conn.sendall(data)  # Rely on TCP for delivery confirmation
+            with profiler.span("send"):
+                header_bytes = json.dumps(header).encode()
+                conn.sendall(len(header_bytes).to_bytes(4, 'big'))
+                conn.sendall(header_bytes)
+
+                if data:
+                    conn.sendall(data)  # Rely on TCP for delivery confirmation
 
         except Exception as e:
             logger.error(f"Send response failed: {str(e)}")
             raise
 
-    def _receive_chunk_data(self, conn, data_length):
-        """Receive data without sending ACK"""
+    def _receive_chunk_data(self, conn, data_length, meter=None):
+        """Receive data without sending ACK, counting it on meter as it arrives"""
         chunk_data = b''
         data_remaining = data_length
-        
-        while data_remaining > 0:
-            chunk = conn.recv(min(data_remaining, self.size_limit))
-            if not chunk:
-                raise ConnectionError("Connection closed mid-transfer")
-            chunk_data += chunk
-            data_remaining -= len(chunk)
-            
+
+        with profiler.span("receive"):
+            while data_remaining > 0:
+                chunk = conn.recv(min(data_remaining, self.size_limit))
+                if not chunk:
+                    raise ConnectionError("Connection closed mid-transfer")
+                chunk_data += chunk
+                data_remaining -= len(chunk)
+                if meter is not None:
+                    meter.add(len(chunk))
+
         return chunk_data
 
     def _cleanup_peer_connection(self, conn, peer_id):
@@ -297,6 +335,7 @@ class PeerConnection:
                 if (peer_ip,peer_port) in self.peer_pool:
                     raise ConnectionRefusedError("Connection existed")
                 self.peer_pool[(peer_ip, peer_port)] = peer_socket
+                self.outbound.add((peer_ip, peer_port))
                 if self.connection_callbacks['new']:
                     self.connection_callbacks['new']((peer_ip, peer_port),peer_socket)
             logger.info(f"Connected to {peer_ip}:{peer_port}")
@@ -332,6 +371,9 @@ class PeerConnection:
                 except Exception as e:
                     logger.error(f"Error closing peer connection {addr}: {e}")
             self.peer_pool.clear()
+            self.outbound.clear()
+            self.peer_locks.clear()
+        self.udp_tracker.close()
 
         if self.server_thread and self.server_thread.is_alive():
             self.server_thread.join(timeout=5)
@@ -355,6 +397,17 @@ class PeerConnection:
                 'server_running': self.running,
                 'max_connections': self.max_connection
             }
+    def conversation(self, peer_address):
+        """Lock held across one request and its reply on the socket to peer_address."""
+        with self.lock:
+            lock = self.peer_locks.get(peer_address)
+            if lock is None:
+                lock = self.peer_locks[peer_address] = threading.RLock()
+            return lock
+    def exchange_peers(self, peer_address, header):
+        """Send a PEX request on an outbound connection and return the peer's PEX reply."""
+        with self.conversation(peer_address):
+            return self.send_message_to_peer(peer_address, header, expect_response=True)
     def get_socket(self,peer_address):
         return self.peer_pool[peer_address] if peer_address in self.peer_pool else None
     def send_message_to_peer(
@@ -369,14 +422,15 @@ class PeerConnection:
             if not conn:
                 raise ConnectionError(f"No active connection to {peer_address}")
 
-            # Send the header with 4-byte length prefix
-            header_bytes = json.dumps(header).encode("utf-8")
-            conn.sendall(len(header_bytes).to_bytes(4, "big"))
-            conn.sendall(header_bytes)
+            with profiler.span("send"):
+                # Send the header with 4-byte length prefix
+                header_bytes = json.dumps(header).encode("utf-8")
+                conn.sendall(len(header_bytes).to_bytes(4, "big"))
+                conn.sendall(header_bytes)
 
-            # Send optional data (e.g., chunk bytes)
-            if data:
-                conn.sendall(data)
+                # Send optional data (e.g., chunk bytes)
+                if data:
+                    conn.sendall(data)
 
             # Read the response if required (e.g., for tracker requests)
             if expect_response:
@@ -393,7 +447,7 @@ class PeerConnection:
 
                 # Parse and return the JSON response
                 response = json.loads(response_bytes.decode("utf-8"))
-                print("Received response:", response)  # Debug print
+                logger.debug("Received response: %s", response)
                 return response
 
             return True
@@ -401,42 +455,97 @@ class PeerConnection:
         except Exception as e:
             logger.error(f"Failed to send message to {peer_address}: {e}")
             return None
-    def receive_chunk_data(self, peer_address, data_length):
-        """Receive chunk data from specific peer"""
+    def receive_chunk_data(self, peer_address, data_length, torrent=None):
+        """Receive chunk data from specific peer, counted as a download of torrent if given"""
         conn = self.get_socket(peer_address)
         if not conn:
             raise ConnectionError("No active connection")
-        
-        return self._receive_chunk_data(conn, data_length)
-    def announce_to_tracker(self,tracker_url, torrent_id, peer_ip, port):
+        meter = None
+        if self.stats is not None and torrent is not None:
+            meter = self.stats.meter(torrent, peer_address, DOWNLOAD)
+        return self._receive_chunk_data(conn, data_length, meter)
+    @staticmethod
+    def _tracker_payload(torrent_id, peer_ip, port, numwant=None, left=None):
+        payload = {"torrent_id": torrent_id, "peer_ip": peer_ip, "port": port, "compact": 1}
+        if numwant is not None:
+            payload["numwant"] = numwant
+        if left is not None:
+            payload["left"] = left
+        return payload
+    @staticmethod
+    def _decode_peer_list(data):
+        """Tracker peer list as [ip, port] pairs, unpacking the compact form if used."""
+        peers = data['peers']
+        if data.get('compact') and isinstance(peers, str):
+            return decode_peers(peers) + [list(peer) for peer in data.get('peers_other', [])]
+        return peers
+    def _udp_announce(self, torrent_id, peer_ip, port, numwant=None, event=EVENT_NONE, left=None):
+        """udp_call for TrackerClient.request: a UDP announce with a reply shaped like the HTTP one."""
+        def call(url):
+            interval, peers = self.udp_tracker.announce(url, torrent_id, peer_ip, port, numwant, event, left)
+            return {"peers": peers, "interval": interval}
+        return call
+    def announce_to_tracker(self,tracker_url, torrent_id, peer_ip, port, numwant=None, left=None):
         try:
-            response = requests.post(tracker_url,json={"torrent_id": torrent_id,"peer_ip": peer_ip,"port": port})
-            if response.status_code == 200:
-                data = response.json()
-                print("Peer received from tracker:", data['peers'])
-                return data['peers']
-            else:
-                print("Tracker error:", response.status_code, response.text)
-                return []
+            data = self.tracker_client.request(
+                tracker_url, self._tracker_payload(torrent_id, peer_ip, port, numwant, left),
+                self._udp_announce(torrent_id, peer_ip, port, numwant, EVENT_STARTED, left))
+            peers = self._decode_peer_list(data)
+            print("Peer received from tracker:", peers)
+            return peers
         except Exception as e:
             print("Error contacting tracker:", e)
             return []
     def stop_connect_to_tracker(self,tracker_url, torrent_id, peer_ip, port):
         try:
-            response = requests.post(tracker_url,json={"torrent_id": torrent_id,"peer_ip": peer_ip,"port": port})
+            self.tracker_client.request(
+                tracker_url, {"torrent_id": torrent_id,"peer_ip": peer_ip,"port": port},
+                self._udp_announce(torrent_id, peer_ip, port, 0, EVENT_STOPPED))
         except Exception as e:
             print("Error stopping tracker:", e)
-    def update_peer_list(self,tracker_url, torrent_id, peer_ip, port):
+    def update_peer_list(self,tracker_url, torrent_id, peer_ip, port, numwant=None):
         try:
-            response = requests.post(tracker_url,json={"torrent_id": torrent_id,"peer_ip": peer_ip,"port": port})
-            data = response.json()
-            return data["peers"]
+            data = self.tracker_client.request(
+                tracker_url, self._tracker_payload(torrent_id, peer_ip, port, numwant),
+                self._udp_announce(torrent_id, peer_ip, port, numwant, EVENT_NONE))
+            return self._decode_peer_list(data)
         except Exception as e:
             print("Error updating peer list:", e)
-    def update_time(self,tracker_url, torrent_id, peer_ip, port):
+    def update_time(self,tracker_url, torrent_id, peer_ip, port, left=None):
+        try:
+            payload = {"torrent_id": torrent_id,"peer_ip": peer_ip,"port": port}
+            if left is not None:
+                payload["left"] = left
+            data = self.tracker_client.request(
+                tracker_url, payload, self._udp_announce(torrent_id, peer_ip, port, 0, EVENT_NONE, left))
+            return data.get("message", "Last seen updated")
+        except Exception as e:
+            print("Error updating last seen time:", e)
+    def batch_update(self,tracker_url, peer_ip, port, torrents):
+        """
+        Refresh several torrents in one request. torrents is a list of
+        {"torrent_id", "left"} dicts; returns {torrent_id: status}.
+        """
+        def udp_call(url):
+            # No batch message over UDP, refresh them one by one
+            interval = None
+            for entry in torrents:
+                interval, _ = self.udp_tracker.announce(url, entry["torrent_id"], peer_ip, port, 0, EVENT_NONE, entry.get("left"))
+            return {"results": {entry["torrent_id"]: "updated" for entry in torrents}, "interval": interval}
+        try:
+            data = self.tracker_client.request(
+                tracker_url, {"peer_ip": peer_ip,"port": port,"torrents": torrents}, udp_call)
+            return data["results"]
+        except Exception as e:
+            print("Error sending batch update:", e)
+            return {}
+    def scrape_tracker(self,tracker_url, torrent_ids):
+        """{torrent_id: {'seeders', 'leechers', 'completed'}} from the tracker's scrape endpoint."""
         try:
-            response = requests.post(tracker_url,json={"torrent_id": torrent_id,"peer_ip": peer_ip,"port": port})
-            data = response.json()
-            return data["message"]
+            data = self.tracker_client.request(
+                tracker_url, {"torrent_ids": list(torrent_ids)},
+                lambda url: {"files": self.udp_tracker.scrape(url, torrent_ids)})
+            return data["files"]
         except Exception as e:
-            print("Error updating last seen time:", e)
\ No newline at end of file
+            print("Error scraping tracker:", e)
+            return {}
\ No newline at end of file
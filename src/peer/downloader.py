@@ -1,6 +1,9 @@
 import os
+import hashlib
 import threading
-from utils.logger import logger
+from utils.logger import logger, LogThrottle
+from utils.profiling import profiler
+from torrent.merkle import MerkleVerifier, has_block_hashes
 
 class Downloader:
     def __init__(self, chunk_size, peers, save_path = "data/downloads", metadata = None, max_connection = 4):
@@ -12,9 +15,29 @@ class Downloader:
         self.chunks_data = {}
         self.max_connection = max_connection
         self.lock = threading.Lock()
+        self.verifier = None
+        self.chunk_log = LogThrottle()
+        if has_block_hashes(metadata):
+            self.verifier = MerkleVerifier(metadata)
+            if not self.verifier.check_root():
+                logger.error("Block hashes do not match merkle_root, falling back to piece hashes")
+                self.verifier = None
         os.makedirs(self.save_path, exist_ok=True)
+    def verify_piece(self, chunk_index, chunk_data):
+        """Check a whole piece against its SHA-1 in 'pieces'. Unverifiable pieces pass."""
+        if not self.metadata or b'pieces' not in self.metadata:
+            return True
+        expected = self.metadata[b'pieces'][chunk_index * 20:(chunk_index + 1) * 20]
+        with profiler.span("hash"):
+            return len(expected) == 20 and hashlib.sha1(chunk_data).digest() == expected
     def handle_chunk_data(self, peer_id, file_name, chunk_data, chunk_index):
+        with profiler.span("handle_chunk"):
+            return self._handle_chunk_data(peer_id, file_name, chunk_data, chunk_index)
+    def _handle_chunk_data(self, peer_id, file_name, chunk_data, chunk_index):
         try:
+            if not self.verify_piece(chunk_index, chunk_data):
+                logger.warning(f"Piece {chunk_index} from {peer_id} failed verification")
+                return False
             with self.lock:
                 if peer_id not in self.peers:
                     logger.error(f"{peer_id} not exist")
@@ -31,7 +54,9 @@ class Downloader:
                 self.chunks_data[file_name].append((chunk_index,chunk_data))
             if self._is_complete(file_name):
                 self._assemble_file(file_name)
-            logger.info(f"Downloading {chunk_index} completed")
+            skipped = self.chunk_log.allow()
+            if skipped is not None:
+                logger.info("Downloading %s completed (%d more since the last report)", chunk_index, skipped)
             return True
         except Exception as e:
             logger.error(f"Download failed: {e}")
@@ -46,18 +71,25 @@ class Downloader:
         output_path = os.path.join(self.save_path, file_name)
         sorted_chunks = sorted(self.chunks_data[file_name], key=lambda x: x[0])
         
-        with open(output_path, "wb") as f:
+        with profiler.span("disk_write"), open(output_path, "wb") as f:
             for _, chunk_data in sorted_chunks:
                 f.write(chunk_data)
         
         logger.info(f"Assembled {file_name} ({file_meta[b'length']} bytes)")
+    def bytes_left(self, file_name):
+        """Bytes of file_name not yet received, as reported to the tracker."""
+        if not self.metadata:
+            return 0
+        received = sum(len(chunk_data) for _, chunk_data in self.chunks_data.get(file_name, []))
+        return max(0, self.metadata[b"length"] - received)
     def add_peer(self, peer_id,conn):
         self.peers[peer_id] = conn
     def remove_peer(self,peer_id):
         self.peers.pop(peer_id,None)
     def get_download_status(self):
         status = {"files": {}, "active_peers": list(self.active_downloads.keys())}
-        
+        if not self.metadata:
+            return status  # Seeding, nothing to download
         # Decode the file name from bytes to string
         file_name_bytes = self.metadata[b'name']
         file_name_str = file_name_bytes.decode('utf-8')
@@ -73,7 +105,7 @@ class Downloader:
         progress = (downloaded / total_chunks * 100) if total_chunks > 0 else 0.0
             
         status["files"][file_name_str] = {
-            "downloaded_bytes": downloaded * chunk_size,
+            "downloaded_bytes": sum(len(chunk_data) for _, chunk_data in downloaded_chunks),
             "total_bytes": file_size,
             "progress": round(progress, 2),
             "chunks": {
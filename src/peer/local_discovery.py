@@ -0,0 +1,186 @@
+import os
+import time
+import socket
+import threading
+from utils.logger import logger
+from utils.config import LSD_GROUP, LSD_PORT, LSD_INTERFACE, LSD_INTERVAL, LSD_MIN_INTERVAL
+
+MAX_DATAGRAM = 1400
+# Infohash lines per announce so one stays under MAX_DATAGRAM
+HASHES_PER_MESSAGE = 20
+
+class LocalDiscovery:
+    """
+    Local Service Discovery after BEP 14. Peers multicast BT-SEARCH messages
+    naming the info-hashes they are active on and their listen port. Every
+    listener on the group reports the sender as (source ip, port) to
+    on_peer(info_hash, address) for the hashes it is active on too.
+
+    Announces go out when a torrent is added, every interval seconds, and in
+    reply to a peer not heard from before, at most once per min_interval per
+    torrent; ones that come sooner are sent when min_interval runs out. A
+    random cookie filters out our own messages, which come back because
+    multicast loopback is on (needed for peers on one host).
+    """
+    def __init__(self, port, on_peer, group=LSD_GROUP, lsd_port=LSD_PORT, interface=LSD_INTERFACE,
+                 interval=LSD_INTERVAL, min_interval=LSD_MIN_INTERVAL):
+        self.port = port
+        self.on_peer = on_peer
+        self.group = group
+        self.lsd_port = lsd_port
+        self.interface = interface
+        self.interval = interval
+        self.min_interval = min_interval
+        self.cookie = os.urandom(4).hex()
+        self.lock = threading.Lock()
+        self.info_hashes = {}  # hex info-hash -> monotonic time of its last announce
+        self.deferred = set()  # Hashes held back by min_interval, sent once it runs out
+        self.seen = set()      # (info_hash, address) already reported
+        self.sock = None
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("", self.lsd_port))
+        interface = socket.inet_aton(self.interface)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(self.group) + interface)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, interface)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        sock.settimeout(1)
+        self.sock = sock
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info(f"Local peer discovery on {self.group}:{self.lsd_port} via {self.interface}")
+
+    def add(self, info_hash):
+        info_hash = info_hash.lower()
+        with self.lock:
+            self.info_hashes.setdefault(info_hash, float('-inf'))
+        self.announce([info_hash])
+
+    def remove(self, info_hash):
+        info_hash = info_hash.lower()
+        with self.lock:
+            self.info_hashes.pop(info_hash, None)
+            self.deferred.discard(info_hash)
+            self.seen = {entry for entry in self.seen if entry[0] != info_hash}
+
+    def _message(self, info_hashes):
+        lines = ["BT-SEARCH * HTTP/1.1", f"Host: {self.group}:{self.lsd_port}", f"Port: {self.port}"]
+        lines += [f"Infohash: {info_hash}" for info_hash in info_hashes]
+        lines.append(f"cookie: {self.cookie}")
+        return ("\r\n".join(lines) + "\r\n\r\n\r\n").encode("ascii")
+
+    def announce(self, info_hashes, force=False):
+        """Multicast the given hashes; ones announced within min_interval are deferred unless force."""
+        now = time.monotonic()
+        with self.lock:
+            due = []
+            for info_hash in info_hashes:
+                if info_hash not in self.info_hashes:
+                    continue
+                if force or now - self.info_hashes[info_hash] >= self.min_interval:
+                    due.append(info_hash)
+                    self.info_hashes[info_hash] = now
+                    self.deferred.discard(info_hash)
+                else:
+                    self.deferred.add(info_hash)
+        if not due or self.sock is None:
+            return
+        for i in range(0, len(due), HASHES_PER_MESSAGE):
+            try:
+                self.sock.sendto(self._message(due[i:i + HASHES_PER_MESSAGE]), (self.group, self.lsd_port))
+            except OSError as e:
+                logger.warning(f"Local discovery announce failed: {e}")
+
+    @staticmethod
+    def parse(data):
+        """(port, [info_hash], cookie) from a BT-SEARCH message, or None if it is not one."""
+        try:
+            lines = data.decode("ascii").split("\r\n")
+        except UnicodeDecodeError:
+            return None
+        if not lines or not lines[0].startswith("BT-SEARCH"):
+            return None
+        port, info_hashes, cookie = None, [], None
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            name, value = name.strip().lower(), value.strip()
+            if name == "port" and value.isdigit():
+                port = int(value)
+            elif name == "infohash" and value:
+                info_hashes.append(value.lower())
+            elif name == "cookie":
+                cookie = value
+        if port is None or not 0 < port < 65536 or not info_hashes:
+            return None
+        return port, info_hashes, cookie
+
+    def _handle(self, data, source):
+        message = self.parse(data)
+        if message is None:
+            return
+        port, info_hashes, cookie = message
+        if cookie == self.cookie:
+            return  # Our own announce, looped back
+        address = (source[0], port)
+        new = []
+        with self.lock:
+            for info_hash in info_hashes:
+                if info_hash in self.info_hashes and (info_hash, address) not in self.seen:
+                    self.seen.add((info_hash, address))
+                    new.append(info_hash)
+        for info_hash in new:
+            logger.info(f"Local peer {address} for {info_hash}")
+            self.on_peer(info_hash, address)
+        if new:
+            self.announce(new)  # Let the newcomer find us without waiting a full interval
+
+    def _wait(self):
+        """Seconds until the next deferred announce is due, at most one."""
+        with self.lock:
+            if not self.deferred:
+                return 1
+            last = max(self.info_hashes[info_hash] for info_hash in self.deferred)
+        return min(1, max(0.01, last + self.min_interval - time.monotonic()))
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.sock.settimeout(self._wait())
+                data, source = self.sock.recvfrom(MAX_DATAGRAM)
+                self._handle(data, source)
+            except socket.timeout:
+                pass
+            except OSError as e:
+                if not self.stop_event.is_set():
+                    logger.error(f"Local discovery error: {e}")
+                break
+            now = time.monotonic()
+            with self.lock:
+                due = [info_hash for info_hash, last in self.info_hashes.items() if now - last >= self.interval]
+                deferred = [info_hash for info_hash in self.deferred
+                            if now - self.info_hashes[info_hash] >= self.min_interval]
+            if due:
+                self.announce(due, force=True)
+            if deferred:
+                self.announce(deferred)
+
+    def close(self):
+        self.stop_event.set()
+        if self.sock is not None:
+            try:
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP,
+                                     socket.inet_aton(self.group) + socket.inet_aton(self.interface))
+            except OSError:
+                pass
+            self.sock.close()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        self.sock = self.thread = None
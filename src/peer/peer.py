@@ -1,11 +1,19 @@
 import socket
+import ipaddress
 import threading
+import itertools
+import random
 import json
 from utils.logger import logger
 from peer.connections import PeerConnection
 from peer.uploader import Uploader
 from peer.downloader import Downloader
-from utils.config import TRACKER_HOST,TRACKER_PORT, DOWNLOAD_FOLDER
+from peer.pex import PeerExchange
+from peer.local_discovery import LocalDiscovery
+from peer.stats import TransferStats
+from dht.node import DHTNode
+from utils.config import TRACKER_HOST,TRACKER_PORT, DOWNLOAD_FOLDER, MAX_BLOCK_RETRIES, TRACKER_ANNOUNCE_INTERVAL
+
 class Peer:
     def __init__(self,
                  host: str = '127.0.0.1',
@@ -19,10 +27,26 @@ class Peer:
         self.host = host
         self.port = port
         self.max_connections = max_connections
-        self.peer_list = ()
+        self.peer_list = []
         self.save_path = save_path 
-        self.update_interval = 90
-        # self.is_seed = is_seed
+        # Peers from the tracker's last reply; the rest of peer_list came by peer exchange
+        self.tracker_peers = set()
+        self.peer_list_lock = threading.Lock()
+        self.pex = PeerExchange(port)
+        self.pex_timer = None
+        # Multicast discovery of peers on the LAN, started per torrent by start_local_discovery
+        self.local_discovery = None
+        self.local_peers = set()
+        # Kademlia node for trackerless peer lookup, started by start_dht
+        self.dht = None
+        # Until a tracker says otherwise; then its interval and min interval apply
+        self.update_interval = TRACKER_ANNOUNCE_INTERVAL
+        # Torrents refreshed by the shared update timer: {tracker_url: {torrent_id: left callable or None}}
+        self.tracked_torrents = {}
+        self.update_timer = None
+        self.update_lock = threading.Lock()
+        self.active = False
+        self.is_seed = is_seed
         # File management
         self.shared_files = shared_files or {}
         self.shared_files = {
@@ -41,6 +65,10 @@ class Peer:
             max_connection=max_connections,
             # shared_files=shared_files
         )
+        # Bytes and rates per torrent, peer and direction, counted by the connection
+        self.stats = TransferStats()
+        self.connection.stats = self.stats
+        self.connection.peer_address = self.pex.address
         self.uploader = Uploader(
             peer_id=(host,port),
             peers=self.connection.peer_pool,
@@ -68,6 +96,10 @@ class Peer:
             callback_type="chunk_received",
             callback_func=self._handle_chunk_received
         )
+        self.connection.register_callback(
+            callback_type="pex",
+            callback_func=self._handle_pex
+        )
         self.connection.register_callback(
             callback_type="new",
             callback_func=self._handle_new_connection
@@ -85,6 +117,8 @@ class Peer:
             
             self.connection.start_server()
             self.running = True
+            self.stats.start()
+            self._schedule_pex()
             logger.info("Peer started successfully")
         except Exception as e:
             logger.error(f"Startup fail: {e}")
@@ -95,23 +129,69 @@ class Peer:
         # self.uploader.stop()
         self.connection.stop()
         self.running = False
-    def start_periodic_updates(self, tracker_url, torrent_id):
-        self.active = True
-        def update_wrapper():
-            if self.active:
-                self.update_time(tracker_url, torrent_id, self.host, self.port)
-                # Reschedule
-                self.update_timer = threading.Timer(self.update_interval, update_wrapper)
-                self.update_timer.start()
-                
-        # Initial start
-        self.update_timer = threading.Timer(self.update_interval, update_wrapper)
+    def start_periodic_updates(self, tracker_url, torrent_id, left=None):
+        """
+        Keep torrent_id alive on tracker_url. All torrents share one timer and one
+        batch request per tracker. left, if given, returns the bytes torrent_id
+        still needs and is sent with each refresh; otherwise 'left' is omitted.
+        """
+        if not isinstance(tracker_url, str):
+            tracker_url = tuple(tracker_url)
+        with self.update_lock:
+            self.tracked_torrents.setdefault(tracker_url, {})[torrent_id] = left
+            self.active = True
+            if self.update_timer is None:
+                self._schedule_updates()
+    def stop_periodic_updates(self, tracker_url, torrent_id):
+        if not isinstance(tracker_url, str):
+            tracker_url = tuple(tracker_url)
+        with self.update_lock:
+            torrents = self.tracked_torrents.get(tracker_url)
+            if torrents:
+                torrents.pop(torrent_id, None)
+                if not torrents:
+                    del self.tracked_torrents[tracker_url]
+    def _next_update_delay(self):
+        """
+        Shortest interval any tracked tracker asked for (update_interval if none
+        said), less up to 10% jitter so peers started together drift apart, but
+        never below a tracker's min interval.
+        """
+        client = self.connection.tracker_client
+        urls = [url for key in self.tracked_torrents for url in ((key,) if isinstance(key, str) else key)]
+        interval = min((client.interval(url, self.update_interval) for url in urls), default=self.update_interval)
+        min_interval = max((client.min_interval(url) for url in urls), default=0)
+        return max(min_interval, interval * random.uniform(0.9, 1.0))
+    def _schedule_updates(self):
+        self.update_timer = threading.Timer(self._next_update_delay(), self._send_updates)
         self.update_timer.start()
+    def _send_updates(self):
+        with self.update_lock:
+            if not self.active:
+                return
+            tracked = {url: dict(torrents) for url, torrents in self.tracked_torrents.items()}
+        # One background request per tracker, so a slow or retrying tracker does not delay the others
+        for tracker_url, torrents in tracked.items():
+            entries = []
+            for torrent_id, left in torrents.items():
+                entry = {"torrent_id": torrent_id}
+                if left is not None:
+                    entry["left"] = left()
+                entries.append(entry)
+            self.connection.tracker_client.submit(self.batch_update, tracker_url, self.host, self.port, entries)
+        with self.update_lock:
+            if self.active:
+                self._schedule_updates()
     def stop(self) -> None:
         """Gracefully shutdown peer and clean up resources"""
-        self.active = False
-        if self.update_timer:
-            self.update_timer.cancel()
+        with self.update_lock:
+            self.active = False
+            if self.update_timer:
+                self.update_timer.cancel()
+                self.update_timer = None
+            if self.pex_timer:
+                self.pex_timer.cancel()
+                self.pex_timer = None
         with self.lock:
             if not self.running:
                 logger.debug("Peer already stopped")
@@ -120,6 +200,14 @@ class Peer:
             logger.info("Initiating shutdown sequence...")
             self.running = False 
         self.connection.stop()
+        self.connection.tracker_client.close()
+        self.stats.stop()
+        if self.local_discovery:
+            self.local_discovery.close()
+            self.local_discovery = None
+        if self.dht:
+            self.dht.stop()
+            self.dht = None
         logger.info("Peer shutdown complete")
         
     def connect_to_peer(self, address: tuple) -> bool:
@@ -128,9 +216,179 @@ class Peer:
         :param address: (IP, port) tuple of target peer
         :return: Connection success status
         """
-        return self.connection.connect_to_peer(peer_ip=address[0],peer_port=address[1])
+        connected = self.connection.connect_to_peer(peer_ip=address[0],peer_port=address[1])
+        if connected:
+            # Trade peer lists right away rather than at the next PEX tick
+            threading.Thread(target=self.exchange_peers, args=(tuple(address),), daemon=True).start()
+        return connected
+    def bytes_left(self):
+        """Bytes still to download; 0 once seeding. Sent to the tracker as 'left'."""
+        if self.is_seed or not self.shared_files.get(b'name'):
+            return 0
+        name = self.shared_files[b'name']
+        return self.downloader.bytes_left(name.decode('utf-8') if isinstance(name, bytes) else name)
     def get_peer_list(self,peer_list):
-        self.peer_list = peer_list
+        """Take the tracker's peer list, keeping the peers learned by peer exchange."""
+        tracker_peers = [tuple(peer) for peer in peer_list or []]
+        with self.peer_list_lock:
+            self.tracker_peers = set(tracker_peers)
+            self.peer_list = tracker_peers + [peer for peer in self.peer_list if peer not in self.tracker_peers]
+
+    # Peer exchange
+    def _schedule_pex(self):
+        self.pex_timer = threading.Timer(self.pex.interval / 4, self._send_pex)
+        self.pex_timer.daemon = True
+        self.pex_timer.start()
+    def _send_pex(self):
+        with self.connection.lock:
+            outbound = list(self.connection.outbound)
+        for address in self.pex.due(outbound):
+            self.exchange_peers(address)
+        with self.update_lock:
+            if self.running and self.pex_timer is not None:
+                self._schedule_pex()
+    def exchange_peers(self, address):
+        """Send our added/dropped peers to a peer we connected to and merge its reply."""
+        response = self.connection.exchange_peers(address, self.pex.build(address))
+        if not response or response.get('command') != 'PEX' or response.get('status', 'OK') != 'OK':
+            self.pex.reset(address)
+            return False
+        added, dropped = self.pex.receive(address, response, address[0], limit=False)
+        self._merge_peers(added, dropped)
+        return True
+    def _handle_pex(self, peer_id, header):
+        """PEX request on an incoming connection: merge it and reply with our own diff."""
+        known = self.pex.address(peer_id) != peer_id
+        update = self.pex.receive(peer_id, header, peer_id[0])
+        if not known and self.pex.address(peer_id) != peer_id:
+            # Uploads so far were metered under the connection's source port
+            self.stats.rename(peer_id, self.pex.address(peer_id))
+        if update is None:
+            return {'command': 'PEX', 'status': 'ERROR', 'reason': 'Too frequent'}
+        self._merge_peers(*update)
+        return {**self.pex.build(peer_id), 'status': 'OK'}
+    def _merge_peers(self, added, dropped, connected=None, dial=True):
+        """
+        Fold a PEX update into peer_list. Dropped peers are only forgotten if the
+        tracker did not list them and we are not connected to them; new ones
+        are dialled while connection slots are free. Callers already holding
+        the connection lock pass the connected addresses in.
+        """
+        me = (self.host, self.port)
+        if connected is None:
+            with self.connection.lock:
+                connected = set(self.connection.peer_pool)
+        with self.peer_list_lock:
+            known = set(self.peer_list)
+            new = [peer for peer in dict.fromkeys(added) if peer not in known and peer != me]
+            gone = {peer for peer in dropped if peer not in self.tracker_peers and peer not in connected}
+            if new or gone:
+                self.peer_list = [peer for peer in self.peer_list if peer not in gone] + new
+        if new and dial:
+            logger.info(f"Discovered {len(new)} new peers")
+            threading.Thread(target=self._connect_new_peers, args=(new,), daemon=True).start()
+    # Local peer discovery
+    def start_local_discovery(self, info_hash, interface=None):
+        """Announce info_hash on the LAN multicast group and take in the peers found there."""
+        if not info_hash:
+            return False
+        try:
+            if self.local_discovery is None:
+                options = {"interface": interface} if interface else {}
+                discovery = LocalDiscovery(self.port, self._handle_local_peer, **options)
+                discovery.start()
+                self.local_discovery = discovery
+            self.local_discovery.add(info_hash)
+            return True
+        except OSError as e:
+            logger.warning(f"Local peer discovery unavailable: {e}")
+            return False
+    # DHT
+    def start_dht(self, bootstrap=(), port=None):
+        """
+        Run a DHT node on UDP port (default: our TCP port) and join through
+        bootstrap, a list of "host:port" strings or (host, port) pairs.
+        Returns the routing table size after joining.
+        """
+        if self.dht is None:
+            self.dht = DHTNode(host=self.host, port=self.port if port is None else port)
+            self.dht.start()
+        nodes = []
+        for node in bootstrap:
+            if isinstance(node, str):
+                host, _, node_port = node.rpartition(':')
+                node = (host, int(node_port))
+            nodes.append(node)
+        return self.dht.bootstrap(nodes) if nodes else 0
+    def dht_announce(self, info_hash):
+        """Announce ourselves for info_hash on the DHT and merge the peers it already knows."""
+        if self.dht is None:
+            return []
+        stored, peers = self.dht.announce(info_hash, self.port)
+        logger.info(f"DHT announce stored on {stored} nodes, {len(peers)} peers found")
+        self._merge_peers(peers, [])
+        return peers
+    def dht_get_peers(self, info_hash):
+        if self.dht is None:
+            return []
+        peers, _ = self.dht.get_peers(info_hash)
+        self._merge_peers(peers, [])
+        return peers
+    def _handle_local_peer(self, info_hash, address):
+        address = self._reachable(address)
+        if address == (self.host, self.port):
+            return
+        self.local_peers.add(address)
+        # Both sides dial: each sends its requests on its own connection
+        self._merge_peers([address], [])
+    def _reachable(self, address):
+        """
+        Where to dial a peer that local discovery heard from address. Multicast
+        reports peers on this host at whichever interface the datagram left by,
+        so when we listen on loopback such a peer is dialled on loopback too.
+        """
+        try:
+            ip = ipaddress.ip_address(address[0])
+            listen = ipaddress.ip_address(socket.gethostbyname(self.host))
+        except (ValueError, OSError):
+            return address
+        if not listen.is_loopback or ip.is_loopback:
+            return address
+        if not self._own_address(address[0]):
+            return address  # Another host; we can still dial out to it
+        return (str(listen), address[1])
+    @staticmethod
+    def _own_address(ip):
+        """True if ip belongs to an interface of this host."""
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                probe.bind((ip, 0))
+            return True
+        except OSError:
+            return False
+    def _is_local(self, address):
+        """Found by local discovery, or on a loopback, private or link-local address."""
+        if address in self.local_peers:
+            return True
+        try:
+            ip = ipaddress.ip_address(address[0])
+        except ValueError:
+            return False
+        return ip.is_loopback or ip.is_private or ip.is_link_local
+    def preferred_peers(self):
+        """peer_list without ourselves, local peers first: LAN bandwidth is close to free."""
+        me = (self.host, self.port)
+        peers = [tuple(peer) for peer in self.peer_list if tuple(peer) != me]
+        return sorted(peers, key=lambda peer: not self._is_local(peer))
+    def _connect_new_peers(self, peers):
+        # Dial even peers that already connected to us: chunk requests only go
+        # out on our own connections, the incoming socket belongs to its reader
+        for peer in peers:
+            with self.connection.lock:
+                if len(self.connection.peer_pool) >= self.max_connections or peer in self.connection.peer_pool:
+                    continue
+            if self.running:
+                self.connect_to_peer(peer)
     def download(self, file_id):
         with self.lock:
             if not self.running:
@@ -142,9 +400,10 @@ class Peer:
             total_chunks = len(self.shared_files[b'pieces']) // 20
             
             for chunk_index in range(total_chunks):
-                for peer_address in self.peer_list:
-                    if tuple(peer_address) != (self.host,self.port):
-                        self.request_chunk(file_id=file_id_str,chunk_index=chunk_index,peer_address=tuple(peer_address))
+                # One copy of each piece, from the first peer that has it, local peers tried first
+                for peer_address in self.preferred_peers():
+                    if self.request_chunk(file_id=file_id_str,chunk_index=chunk_index,peer_address=peer_address):
+                        break
     def update_peer_list(self,torrent_id):
         with self.lock:
             if not self.running:
@@ -159,10 +418,13 @@ class Peer:
                 expect_response=True
             )
             if response and response.get('command') == 'MESSAGE':
-                print(response)
                 return response['peer_list']
             return None
     def request_chunk(self, file_id: str, chunk_index: int, peer_address: tuple) -> bool:
+        # Keep a PEX exchange from interleaving with this request on the same socket
+        with self.connection.conversation(peer_address):
+            return self._request_chunk(file_id, chunk_index, peer_address)
+    def _request_chunk(self, file_id: str, chunk_index: int, peer_address: tuple) -> bool:
         try:
             # Ensure file_id is a string
             if isinstance(file_id, bytes):
@@ -181,10 +443,16 @@ class Peer:
             if response and response.get('status') == 'OK':
                 # print(f"response: {response['data_length']}")
                 # Get chunk data immediately after header
-                chunk_data = self.connection.receive_chunk_data(
-                    peer_address=peer_address,
-                    data_length=response['data_length'],
-                )
+                if self.downloader.verifier:
+                    chunk_data = self._receive_verified_piece(file_id, chunk_index, peer_address, response['data_length'])
+                    if chunk_data is None:
+                        return False
+                else:
+                    chunk_data = self.connection.receive_chunk_data(
+                        peer_address=peer_address,
+                        data_length=response['data_length'],
+                        torrent=file_id
+                    )
                 if len(chunk_data) != response['data_length']:
                     logger.error("Data length mismatch")
                     return False
@@ -200,6 +468,63 @@ class Peer:
         except Exception as e:
             logger.error(f"Chunk request failed: {str(e)}")
             return False
+    def _receive_verified_piece(self, file_id, chunk_index, peer_address, data_length):
+        """
+        Receive a piece block by block, checking each block against its leaf
+        hash as it arrives, then refetch only the blocks that failed.
+        """
+        verifier = self.downloader.verifier
+        if data_length != verifier.piece_size(chunk_index):
+            logger.error(f"Piece {chunk_index} from {peer_address} has unexpected length {data_length}")
+            self.connection.receive_chunk_data(peer_address=peer_address, data_length=data_length, torrent=file_id)
+            return None
+        chunk_data = bytearray()
+        bad_blocks = []
+        for block_index in range(verifier.block_count(chunk_index)):
+            _, length = verifier.block_range(chunk_index, block_index)
+            block = self.connection.receive_chunk_data(peer_address=peer_address, data_length=length, torrent=file_id)
+            if not verifier.verify_block(chunk_index, block_index, block):
+                bad_blocks.append(block_index)
+            chunk_data += block
+        if bad_blocks:
+            logger.warning(f"Piece {chunk_index} from {peer_address}: refetching blocks {bad_blocks}")
+        for block_index in bad_blocks:
+            if not self._refetch_block(file_id, chunk_index, block_index, chunk_data, peer_address):
+                logger.error(f"Could not repair block {block_index} of piece {chunk_index}")
+                return None
+        return bytes(chunk_data)
+
+    def _refetch_block(self, file_id, chunk_index, block_index, chunk_data, peer_address):
+        """Request one block range, trying the original peer first, and splice it into chunk_data."""
+        verifier = self.downloader.verifier
+        offset, length = verifier.block_range(chunk_index, block_index)
+        candidates = [peer_address] + [
+            tuple(p) for p in self.peer_list
+            if tuple(p) not in (peer_address, (self.host, self.port))
+        ]
+        for candidate in itertools.islice(itertools.cycle(candidates), MAX_BLOCK_RETRIES):
+            if not self.connection.get_socket(candidate):
+                continue
+            with self.connection.conversation(candidate):
+                response = self.connection.send_message_to_peer(
+                    peer_address=candidate,
+                    header={
+                        'command': 'REQUEST_CHUNK',
+                        'file_name': file_id,
+                        'chunk_index': chunk_index,
+                        'offset': offset,
+                        'length': length
+                    },
+                    expect_response=True
+                )
+                if not response or response.get('status') != 'OK':
+                    continue
+                block = self.connection.receive_chunk_data(peer_address=candidate, data_length=response['data_length'],
+                                                           torrent=file_id)
+            if len(block) == length and verifier.verify_block(chunk_index, block_index, block):
+                chunk_data[offset:offset + length] = block
+                return True
+        return False
     def send_message_to_peer(self,peer_id,header,data=None,expect_rep = False):
         return self.connection.send_message_to_peer(
             peer_address=peer_id,
@@ -207,17 +532,25 @@ class Peer:
             data=data,
             expect_response=expect_rep
         )
+    @staticmethod
+    def _endpoint(tracker_url, path):
+        """Append path to a tracker URL, or to each URL of a failover list."""
+        if isinstance(tracker_url, str):
+            return tracker_url + path
+        return [url + path for url in tracker_url]
     def announce_to_tracker(self,tracker_url, torrent_id, peer_ip, port):
         return self.connection.announce_to_tracker(
-            tracker_url=tracker_url + '/announce',
+            tracker_url=self._endpoint(tracker_url, '/announce'),
             torrent_id = torrent_id,
             peer_ip = peer_ip,
-            port= port
+            port= port,
+            left = self.bytes_left()
         )
     def stop_connect_to_tracker(self, tracker_url, torrent_id, peer_ip, port):
+        self.stop_periodic_updates(tracker_url, torrent_id)
         try:
             return self.connection.stop_connect_to_tracker(
-                tracker_url=tracker_url + '/stop',
+                tracker_url=self._endpoint(tracker_url, '/stop'),
                 torrent_id=torrent_id,
                 peer_ip=peer_ip,
                 port=port
@@ -228,36 +561,62 @@ class Peer:
 
     def update_peer_list(self,tracker_url, torrent_id, peer_ip, port):
         return self.connection.update_peer_list(
-            tracker_url=tracker_url + '/peer_list_update',
+            tracker_url=self._endpoint(tracker_url, '/peer_list_update'),
             torrent_id=torrent_id,
             peer_ip=peer_ip,
             port=port
         )
-    def update_time(self,tracker_url, torrent_id, peer_ip, port):
+    def update_time(self,tracker_url, torrent_id, peer_ip, port, left=None):
         return self.connection.update_time(
-            tracker_url=tracker_url + '/time_update',
+            tracker_url=self._endpoint(tracker_url, '/time_update'),
             torrent_id=torrent_id,
             peer_ip=peer_ip,
-            port=port
+            port=port,
+            left=left
+        )
+    def batch_update(self,tracker_url, peer_ip, port, torrents):
+        return self.connection.batch_update(
+            tracker_url=self._endpoint(tracker_url, '/batch_update'),
+            peer_ip=peer_ip,
+            port=port,
+            torrents=torrents
+        )
+    def scrape_tracker(self,tracker_url, torrent_ids):
+        return self.connection.scrape_tracker(
+            tracker_url=self._endpoint(tracker_url, '/scrape'),
+            torrent_ids=torrent_ids
         )
     def get_network_status(self) -> dict:
         """Return current network connection status"""
         return{
             'connection': self.connection.get_connection_status(),
             'upload': self.uploader.get_upload_status(),
-            'downloader': self.downloader.get_download_status()
+            'downloader': self.downloader.get_download_status(),
+            'transfer': self.get_transfer_stats()
         }
+    def get_transfer_stats(self) -> dict:
+        """Bytes, rates and ETA per torrent and peer; see TransferStats.snapshot."""
+        left = {}
+        name = self.shared_files.get(b'name')
+        if name and not self.is_seed:
+            left[name.decode('utf-8') if isinstance(name, bytes) else name] = self.bytes_left()
+        return self.stats.snapshot(left)
     
     # Callback Processor
-    def _handle_chunk_request(self, peer_id, file_name, chunk_index):
+    def _handle_chunk_request(self, peer_id, file_name, chunk_index, offset=0, length=None):
         if isinstance(file_name, bytes):
             file_name = file_name.decode('utf-8')
-        success, _ = self.downloader.get_chunk_data(file_name,chunk_index)
-        return self.downloader.get_chunk_data(file_name,chunk_index) if success else self.uploader.handle_upload_request(
-            file_name=file_name,
-            chunk_index=chunk_index,
-            requesting_peer=peer_id
-        )
+        success, chunk_data = self.downloader.get_chunk_data(file_name,chunk_index)
+        if not success:
+            success, chunk_data = self.uploader.handle_upload_request(
+                file_name=file_name,
+                chunk_index=chunk_index,
+                requesting_peer=peer_id
+            )
+        if success and chunk_data and (offset or length is not None):
+            # Block request: send only the requested range of the piece
+            chunk_data = chunk_data[offset:offset + length if length is not None else None]
+        return success, chunk_data
     def _handle_chunk_received(self, peer_id: tuple, file_name: str, chunk_index: int, chunk_data: bytes):
         # Let the downloader assemble it
         return self.downloader.handle_chunk_data(
@@ -269,7 +628,12 @@ class Peer:
     def _handle_new_connection(self, peer_id,conn):
         self.uploader.add_peer(peer_id,conn)
         self.downloader.add_peer(peer_id,conn)
+        # Outgoing connections are keyed by the listening address; incoming ones report it in their first PEX
+        self.pex.connected(peer_id, peer_id if peer_id in self.connection.outbound else None)
 
     def _handle_close_connection(self, peer_id):
         self.uploader.remove_peer(peer_id)
-        self.downloader.remove_peer(peer_id)
\ No newline at end of file
+        self.downloader.remove_peer(peer_id)
+        self.stats.forget(self.pex.address(peer_id))
+        # Called with the connection lock held
+        self._merge_peers([], self.pex.forget(peer_id), set(self.connection.peer_pool))
\ No newline at end of file
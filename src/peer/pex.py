@@ -0,0 +1,109 @@
+import time
+import binascii
+import threading
+from utils.compact_peers import encode_peers, decode_peers
+from utils.config import PEX_INTERVAL, PEX_MIN_INTERVAL, PEX_MAX_PEERS
+
+class PeerExchange:
+    """
+    Peer exchange state, after BEP 11. Each connection is told which peers
+    were added and dropped since the last message it got, as packed 6-byte
+    records (IPv4 only), at most max_peers of each. Only peers we are
+    connected to are advertised, by their listening address.
+
+    The side that opened a connection sends a PEX request every interval
+    seconds; the other side merges it and replies with its own diff.
+    Requests arriving sooner than min_interval after the previous one from
+    the same connection are refused.
+    """
+    def __init__(self, port, interval=PEX_INTERVAL, min_interval=PEX_MIN_INTERVAL, max_peers=PEX_MAX_PEERS):
+        self.port = port
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_peers = max_peers
+        self.lock = threading.Lock()
+        self.listen = {}         # connection key -> listening address of that peer, once known
+        self.sent = {}           # connection key -> addresses it has been told about
+        self.last_sent = {}
+        self.last_received = {}
+        self.sources = {}        # address -> connection keys that advertised it
+
+    def connected(self, key, listen_address=None):
+        with self.lock:
+            self.sent.setdefault(key, set())
+            if listen_address is not None:
+                self.listen[key] = tuple(listen_address)
+
+    def address(self, key):
+        """Listening address of connection key if known, else the key itself."""
+        return self.listen.get(key, key)
+
+    def forget(self, key):
+        """Drop a closed connection. Returns the addresses no connection advertises any more."""
+        with self.lock:
+            self.listen.pop(key, None)
+            self.sent.pop(key, None)
+            self.last_sent.pop(key, None)
+            self.last_received.pop(key, None)
+            return self._withdraw(key, list(self.sources))
+
+    def _withdraw(self, key, addresses):
+        gone = []
+        for address in addresses:
+            keys = self.sources.get(address)
+            if keys is not None and key in keys:
+                keys.discard(key)
+                if not keys:
+                    del self.sources[address]
+                    gone.append(address)
+        return gone
+
+    def due(self, keys, now=None):
+        """The connections among keys whose next request is due."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return [key for key in keys if now - self.last_sent.get(key, float('-inf')) >= self.interval]
+
+    def build(self, key):
+        """PEX header for the connection key, marking its contents as sent."""
+        with self.lock:
+            current = {address for peer, address in self.listen.items() if peer != key}
+            current.discard(self.listen.get(key))
+            sent = self.sent.setdefault(key, set())
+            added = list(current - sent)[:self.max_peers]
+            dropped = list(sent - current)[:self.max_peers]
+            sent.update(added)
+            sent.difference_update(dropped)
+            self.last_sent[key] = time.monotonic()
+        return {'command': 'PEX', 'port': self.port, 'added': encode_peers(added), 'dropped': encode_peers(dropped)}
+
+    def reset(self, key):
+        """The last message to key was lost; start its diff over from nothing."""
+        with self.lock:
+            if key in self.sent:
+                self.sent[key] = set()
+
+    def receive(self, key, header, remote_ip, limit=True):
+        """
+        Apply a PEX message from the connection key. Returns (added, dropped)
+        address lists, with dropped limited to peers no other connection still
+        advertises, or None when limit is set and the message came too soon.
+        """
+        now = time.monotonic()
+        try:
+            added = [tuple(peer) for peer in decode_peers(header.get('added') or '')][:self.max_peers]
+            dropped = [tuple(peer) for peer in decode_peers(header.get('dropped') or '')][:self.max_peers]
+        except (binascii.Error, TypeError, ValueError):
+            added, dropped = [], []
+        with self.lock:
+            if limit and now - self.last_received.get(key, float('-inf')) < self.min_interval:
+                return None
+            self.last_received[key] = now
+            port = header.get('port')
+            if key not in self.listen and isinstance(port, int) and 0 < port < 65536:
+                self.listen[key] = (remote_ip, port)
+            if key in self.listen:
+                added.append(self.listen[key])  # The sender itself is in the swarm too
+            for address in added:
+                self.sources.setdefault(address, set()).add(key)
+            return added, self._withdraw(key, dropped)
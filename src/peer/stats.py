@@ -0,0 +1,156 @@
+import math
+import time
+import threading
+from utils.config import STATS_WINDOWS, STATS_INTERVAL
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+DIRECTIONS = (UPLOAD, DOWNLOAD)
+
+class RateMeter:
+    """
+    Byte counter with exponentially weighted rates over several windows.
+    add() is the only call on the transfer path; rates move when sample()
+    folds in the bytes counted since the last sample.
+    """
+    __slots__ = ("total", "sampled", "rates")
+
+    def __init__(self, windows):
+        self.total = 0
+        self.sampled = 0
+        self.rates = [0.0] * len(windows)
+
+    def add(self, n):
+        self.total += n
+
+    def sample(self, elapsed, alphas):
+        """Update the rates with the bytes counted over the last elapsed seconds. Returns that byte count."""
+        delta = self.total - self.sampled
+        self.sampled += delta
+        rate = delta / elapsed
+        rates = self.rates
+        for i, alpha in enumerate(alphas):
+            rates[i] += alpha * (rate - rates[i])
+        return delta
+
+class TransferStats:
+    """
+    Bytes moved and live rates for each (torrent, peer, direction), and per
+    torrent and direction the sum over its peers.
+
+    Each peer meter is written by one thread at a time (the conversation on
+    that connection), so add() needs no lock. A background thread samples
+    every interval seconds; torrent meters are fed the peer deltas there,
+    so the transfer path touches one counter per call.
+    """
+    def __init__(self, windows=STATS_WINDOWS, interval=STATS_INTERVAL):
+        self.windows = tuple(windows)
+        self.interval = interval
+        self.peers = {}     # (torrent, peer, direction) -> RateMeter
+        self.torrents = {}  # (torrent, direction) -> RateMeter
+        self.lock = threading.Lock()
+        self.last_sample = time.monotonic()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def meter(self, torrent, peer, direction):
+        """Meter for bytes of torrent moved to or from peer, created on first use."""
+        key = (torrent, peer, direction)
+        meter = self.peers.get(key)
+        if meter is None:
+            with self.lock:
+                meter = self.peers.get(key)
+                if meter is None:
+                    meter = self.peers[key] = RateMeter(self.windows)
+                    self.torrents.setdefault((torrent, direction), RateMeter(self.windows))
+        return meter
+
+    def add(self, torrent, peer, direction, n):
+        self.meter(torrent, peer, direction).add(n)
+
+    def forget(self, peer):
+        """Drop the meters of a closed connection, keeping its bytes in the torrent totals."""
+        with self.lock:
+            for key in [key for key in self.peers if key[1] == peer]:
+                meter = self.peers.pop(key)
+                self.torrents[(key[0], key[2])].add(meter.total - meter.sampled)
+
+    def rename(self, old, new):
+        """Move the meters of peer old to new, adding to any new already has."""
+        with self.lock:
+            for key in [key for key in self.peers if key[1] == old]:
+                meter = self.peers.pop(key)
+                target = self.peers.setdefault((key[0], new, key[2]), RateMeter(self.windows))
+                target.total += meter.total
+                target.sampled += meter.sampled
+                target.rates = [a + b for a, b in zip(target.rates, meter.rates)]
+
+    def sample(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            elapsed = now - self.last_sample
+            if elapsed <= 0:
+                return
+            self.last_sample = now
+            alphas = [1 - math.exp(-elapsed / window) for window in self.windows]
+            for (torrent, _, direction), meter in self.peers.items():
+                self.torrents[(torrent, direction)].add(meter.sample(elapsed, alphas))
+            for meter in self.torrents.values():
+                meter.sample(elapsed, alphas)
+
+    def start(self):
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        self.thread = None
+
+    def _describe(self, meter):
+        if meter is None:
+            return {"bytes": 0, "rates": {f"{window}s": 0.0 for window in self.windows}}
+        return {"bytes": meter.total,
+                "rates": {f"{window}s": round(rate, 1) for window, rate in zip(self.windows, meter.rates)}}
+
+    @staticmethod
+    def eta(left, rates):
+        """Seconds to fetch left bytes at the longest-window rate that is moving, or None if stalled."""
+        if not left:
+            return 0
+        for rate in reversed(rates):
+            if rate >= 1:
+                return math.ceil(left / rate)
+        return None
+
+    def snapshot(self, left=None):
+        """
+        Machine-readable view: per torrent its download/upload bytes and rates
+        (bytes per second, keyed by window), bytes left and ETA when left is
+        given as {torrent: bytes}, and the same per peer ("ip:port").
+        """
+        left = left or {}
+        with self.lock:
+            torrents = {}
+            for (torrent, direction), meter in self.torrents.items():
+                torrents.setdefault(torrent, {"peers": {}})[direction] = self._describe(meter)
+            for (torrent, peer, direction), meter in self.peers.items():
+                name = f"{peer[0]}:{peer[1]}" if isinstance(peer, tuple) else str(peer)
+                torrents[torrent]["peers"].setdefault(name, {})[direction] = self._describe(meter)
+            for torrent, entry in torrents.items():
+                for direction in DIRECTIONS:
+                    entry.setdefault(direction, self._describe(None))
+                    for peer in entry["peers"].values():
+                        peer.setdefault(direction, self._describe(None))
+                meter = self.torrents.get((torrent, DOWNLOAD))
+                if torrent in left:
+                    entry["left"] = left[torrent]
+                    entry["eta_seconds"] = self.eta(left[torrent], meter.rates if meter else [])
+        return {"windows": list(self.windows), "torrents": torrents}
@@ -0,0 +1,121 @@
+import time
+import random
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from utils.logger import logger
+from utils.config import (
+    TRACKER_HTTP_TIMEOUT, TRACKER_CLIENT_WORKERS, TRACKER_CLIENT_RETRIES,
+    TRACKER_BACKOFF_BASE, TRACKER_BACKOFF_MAX
+)
+
+class TrackerClient:
+    """
+    Shared HTTP side of the tracker protocol: one keep-alive connection pool,
+    retries with capped exponential backoff and full jitter, failover across
+    a list of announce URLs, and a small executor for calls the caller does
+    not want to wait on.
+    """
+    def __init__(self, workers=TRACKER_CLIENT_WORKERS, retries=TRACKER_CLIENT_RETRIES,
+                 backoff=TRACKER_BACKOFF_BASE, max_backoff=TRACKER_BACKOFF_MAX, timeout=TRACKER_HTTP_TIMEOUT):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers + 1)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tracker-client")
+        self.lock = threading.Lock()
+        self.failures = {}   # tracker -> consecutive failed requests, orders failover
+        self.intervals = {}  # tracker -> (interval, min interval) it last asked for
+
+    @staticmethod
+    def tracker_key(url):
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def backoff_delay(self, attempt):
+        """Full jitter: uniform in [0, min(max_backoff, backoff * 2**attempt)]."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def interval(self, url, default):
+        """Announce interval the tracker asked for, or default if it never said."""
+        with self.lock:
+            return self.intervals.get(self.tracker_key(url), (default, 0))[0]
+
+    def min_interval(self, url):
+        """Shortest gap the tracker allows between announces, 0 if it never said."""
+        with self.lock:
+            return self.intervals.get(self.tracker_key(url), (0, 0))[1]
+
+    def _note_reply(self, url, data):
+        if isinstance(data, dict) and isinstance(data.get("interval"), (int, float)):
+            min_interval = data.get("min interval")
+            if not isinstance(min_interval, (int, float)):
+                min_interval = 0
+            with self.lock:
+                self.intervals[self.tracker_key(url)] = (data["interval"], min_interval)
+
+    def _post(self, url, payload):
+        """POST with retries on connection errors and 5xx replies. Returns the decoded JSON body."""
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+                if response.status_code < 400:
+                    return response.json()
+                error = requests.HTTPError(f"{response.status_code} {response.text}", response=response)
+                if response.status_code < 500:
+                    raise error  # Retrying the same request will not help
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt < self.retries:
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Tracker request to {url} failed ({error}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+        raise error
+
+    def _ordered(self, urls):
+        """Least-failing tracker first; ties keep the torrent's own order."""
+        with self.lock:
+            return sorted(urls, key=lambda url: self.failures.get(self.tracker_key(url), 0))
+
+    def request(self, tracker_url, payload, udp_call=None):
+        """
+        Send payload to tracker_url, a URL or a list of failover URLs, and
+        return the first successful reply. udp:// URLs go through udp_call(url),
+        which must return a dict shaped like the HTTP reply.
+        """
+        urls = [tracker_url] if isinstance(tracker_url, str) else list(tracker_url)
+        last_error = ConnectionError("No tracker URL")
+        for url in self._ordered(urls):
+            try:
+                if url.startswith('udp://'):
+                    if udp_call is None:
+                        raise ValueError("Request has no UDP form")
+                    data = udp_call(url)
+                else:
+                    data = self._post(url, payload)
+            except (requests.RequestException, OSError, ValueError) as e:
+                last_error = e
+                with self.lock:
+                    key = self.tracker_key(url)
+                    self.failures[key] = self.failures.get(key, 0) + 1
+                logger.warning(f"Tracker {url} unavailable: {e}")
+                continue
+            with self.lock:
+                self.failures.pop(self.tracker_key(url), None)
+            self._note_reply(url, data)
+            return data
+        raise last_error
+
+    def submit(self, func, *args, **kwargs):
+        """Run func on the background executor and return its Future."""
+        return self.executor.submit(func, *args, **kwargs)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
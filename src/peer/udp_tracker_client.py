@@ -0,0 +1,129 @@
+import os
+import time
+import socket
+import threading
+from urllib.parse import urlparse
+from utils.compact_peers import unpack_peers
+from utils.config import TRACKER_UDP_TIMEOUT, TRACKER_UDP_RETRIES
+from tracker.udp_server import (
+    PROTOCOL_ID, ACTION_CONNECT, ACTION_ANNOUNCE, ACTION_SCRAPE, ACTION_ERROR,
+    EVENT_NONE, HEADER, ANNOUNCE, ID_LENGTH, LEFT, CONNECT_REPLY, ANNOUNCE_REPLY,
+    SCRAPE_ENTRY, REPLY_HEADER, CONNECTION_ID_TTL
+)
+
+class _Tracker:
+    __slots__ = ("sock", "lock", "connection_id", "obtained_at")
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.lock = threading.Lock()  # One exchange at a time, so replies reach their caller
+        self.connection_id = None
+        self.obtained_at = 0.0
+
+class UDPTrackerClient:
+    """Client side of the UDP tracker protocol in tracker.udp_server."""
+    def __init__(self, timeout=TRACKER_UDP_TIMEOUT, retries=TRACKER_UDP_RETRIES):
+        self.timeout = timeout
+        self.retries = retries
+        self.lock = threading.Lock()
+        # The tracker ties a connection id to the source ip:port, so each
+        # tracker gets one socket that lives as long as its cached id
+        self.trackers = {}  # (host, port) -> _Tracker
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    @staticmethod
+    def tracker_address(tracker_url):
+        parsed = urlparse(tracker_url)
+        return parsed.hostname, parsed.port
+
+    def _exchange(self, sock, address, request, transaction_id, expected_action):
+        """Send request and wait for the matching reply, resending with a doubling timeout."""
+        timeout = self.timeout
+        for _ in range(self.retries):
+            self.bytes_out += sock.sendto(request, address)
+            sock.settimeout(timeout)
+            deadline = time.monotonic() + timeout
+            try:
+                while True:
+                    reply = sock.recv(65536)
+                    self.bytes_in += len(reply)
+                    if len(reply) < REPLY_HEADER.size:
+                        continue
+                    action, reply_transaction = REPLY_HEADER.unpack_from(reply)
+                    if reply_transaction != transaction_id:
+                        continue
+                    if action == ACTION_ERROR:
+                        raise ConnectionError(reply[REPLY_HEADER.size:].decode('utf-8', errors='replace'))
+                    if action == expected_action:
+                        return reply
+                    sock.settimeout(max(0.01, deadline - time.monotonic()))
+            except socket.timeout:
+                timeout *= 2
+        raise TimeoutError(f"No reply from UDP tracker {address}")
+
+    def _tracker(self, address):
+        with self.lock:
+            tracker = self.trackers.get(address)
+            if tracker is None:
+                tracker = self.trackers[address] = _Tracker()
+        return tracker
+
+    def _connection_id(self, tracker, address):
+        if tracker.connection_id is not None and time.monotonic() - tracker.obtained_at < CONNECTION_ID_TTL / 2:
+            return tracker.connection_id
+        transaction_id = int.from_bytes(os.urandom(4), 'big')
+        reply = self._exchange(tracker.sock, address, HEADER.pack(PROTOCOL_ID, ACTION_CONNECT, transaction_id),
+                               transaction_id, ACTION_CONNECT)
+        _, _, tracker.connection_id = CONNECT_REPLY.unpack_from(reply)
+        tracker.obtained_at = time.monotonic()
+        return tracker.connection_id
+
+    def _request(self, tracker_url, action, body):
+        address = self.tracker_address(tracker_url)
+        tracker = self._tracker(address)
+        with tracker.lock:
+            connection_id = self._connection_id(tracker, address)
+            transaction_id = int.from_bytes(os.urandom(4), 'big')
+            request = HEADER.pack(connection_id, action, transaction_id) + body
+            try:
+                return self._exchange(tracker.sock, address, request, transaction_id, action)
+            except ConnectionError:
+                # Connection id may have expired on the tracker, get a new one once
+                tracker.connection_id = None
+                connection_id = self._connection_id(tracker, address)
+                request = HEADER.pack(connection_id, action, transaction_id) + body
+                return self._exchange(tracker.sock, address, request, transaction_id, action)
+
+    def close(self):
+        with self.lock:
+            trackers, self.trackers = self.trackers, {}
+        for tracker in trackers.values():
+            tracker.sock.close()
+
+    def announce(self, tracker_url, torrent_id, peer_ip, port, numwant=None, event=EVENT_NONE, left=None):
+        """Announce (or refresh, or with EVENT_STOPPED leave) and return (interval, [[ip, port], ...])."""
+        try:
+            ip = socket.inet_aton(peer_ip)
+        except (OSError, TypeError):
+            ip = b'\0\0\0\0'
+        torrent = torrent_id.encode('utf-8')
+        body = ANNOUNCE.pack(ip, port, -1 if numwant is None else numwant, event, len(torrent)) + torrent
+        if left is not None:
+            body += LEFT.pack(left)
+        reply = self._request(tracker_url, ACTION_ANNOUNCE, body)
+        _, _, interval = ANNOUNCE_REPLY.unpack_from(reply)
+        return interval, unpack_peers(reply[ANNOUNCE_REPLY.size:])
+
+    def scrape(self, tracker_url, torrent_ids):
+        """{torrent_id: {'seeders', 'completed', 'leechers'}} for each requested torrent."""
+        body = b''.join(ID_LENGTH.pack(len(t.encode('utf-8'))) + t.encode('utf-8') for t in torrent_ids)
+        reply = self._request(tracker_url, ACTION_SCRAPE, body)
+        result = {}
+        for i, torrent_id in enumerate(torrent_ids):
+            offset = REPLY_HEADER.size + i * SCRAPE_ENTRY.size
+            if offset + SCRAPE_ENTRY.size > len(reply):
+                break
+            seeders, completed, leechers = SCRAPE_ENTRY.unpack_from(reply, offset)
+            result[torrent_id] = {'seeders': seeders, 'completed': completed, 'leechers': leechers}
+        return result
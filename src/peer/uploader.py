@@ -1,5 +1,6 @@
 import os
 from utils.logger import logger
+from utils.profiling import profiler
 
 
 class Uploader:
@@ -23,16 +24,18 @@ class Uploader:
         if isinstance(file_name, str):
             file_name = file_name.encode('utf-8')
             
-        logger.debug(f"Request from {requesting_peer} for {file_name} chunk {chunk_index}")
+        logger.debug("Request from %s for %s chunk %s", requesting_peer, file_name, chunk_index)
         
         if file_name != self.shared_files[b'name']:
-            print(self.shared_files)
             logger.error(f"{file_name} not in shared files")
             return False, b''
         
         try:
             # Add actual file handling logic
             chunk_data = self._get_chunk_data(file_name, chunk_index)
+            if chunk_data:
+                files = self.active_connections.setdefault(requesting_peer, {})
+                files.setdefault(file_name.decode('utf-8', errors='replace'), []).append(chunk_index)
             return True, chunk_data
         except Exception as e:
             logger.error(f"Chunk retrieval failed: {str(e)}")
@@ -97,11 +100,12 @@ class Uploader:
             if not info:
                 logger.error("No 'info' in shared_files")
                 return None
-            if b"length" in info:
-                return self._get_single_file_chunk(file_name, chunk_index)
-            elif b"files" in info:
-                return self._get_multi_file_chunk(file_name, chunk_index)
-                
+            with profiler.span("disk_read"):
+                if b"length" in info:
+                    return self._get_single_file_chunk(file_name, chunk_index)
+                elif b"files" in info:
+                    return self._get_multi_file_chunk(file_name, chunk_index)
+
         except Exception as e:
             logger.error(f"Error getting chunk: {e}")
         return None
@@ -172,5 +176,7 @@ class Uploader:
         return sorted(files, key=lambda x: x['rel_path'])
     def add_peer(self, peer_id,conn):
         self.peers[peer_id] = conn
+        self.active_connections.setdefault(peer_id, {})
     def remove_peer(self,peer_id):
-        self.peers.pop(peer_id,None)
\ No newline at end of file
+        self.peers.pop(peer_id,None)
+        self.active_connections.pop(peer_id, None)
\ No newline at end of file
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+from utils import bencode
+from utils.logger import logger
+from utils.config import TORRENT_FOLDER, LIBRARY_DB, LIBRARY_SCAN_INTERVAL
+
+# Bump when the table changes; the catalog is rebuilt from the folder on the next refresh
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS torrents (
+    info_hash    TEXT NOT NULL,
+    path         TEXT PRIMARY KEY,
+    name         TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    piece_length INTEGER NOT NULL,
+    piece_count  INTEGER NOT NULL,
+    announce     TEXT,
+    mtime_ns     INTEGER NOT NULL,
+    file_size    INTEGER NOT NULL
+)
+"""
+COLUMNS = ("info_hash", "path", "name", "size", "piece_length", "piece_count", "announce")
+
+class TorrentLibrary:
+    """
+    Catalog of the .torrent files in a folder, kept in sqlite with one row per
+    file; copies of the same torrent share an info-hash. refresh() only re-parses files whose mtime or size changed, so
+    lookups and listings never have to open the torrent files themselves.
+    """
+    def __init__(self, folder=TORRENT_FOLDER, db_path=LIBRARY_DB):
+        self.folder = folder
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.shutdown_event = threading.Event()
+        self.watch_thread = None
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS torrents")
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def refresh(self):
+        """Bring the catalog in line with the folder. Returns (added_or_updated, removed)."""
+        on_disk = {}
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(".torrent"):
+                        st = entry.stat()
+                        on_disk[entry.name] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            logger.warning(f"Torrent folder does not exist: {self.folder}")
+
+        with self.lock:
+            known = {
+                path: (mtime_ns, file_size)
+                for path, mtime_ns, file_size in self.db.execute("SELECT path, mtime_ns, file_size FROM torrents")
+            }
+            changed = [name for name, stamp in on_disk.items() if known.get(name) != stamp]
+            removed = [name for name in known if name not in on_disk]
+
+            for name in changed:
+                row = self._read_torrent(name, *on_disk[name])
+                # A rewritten file may carry a new info-hash, drop its old row first
+                self.db.execute("DELETE FROM torrents WHERE path = ?", (name,))
+                if row:
+                    self.db.execute("INSERT INTO torrents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self.db.executemany("DELETE FROM torrents WHERE path = ?", [(name,) for name in removed])
+            self.db.commit()
+        if changed or removed:
+            logger.info(f"Library refreshed: {len(changed)} added/updated, {len(removed)} removed")
+        return len(changed), len(removed)
+
+    def _read_torrent(self, name, mtime_ns, file_size):
+        mapping = None
+        try:
+            data, mapping = bencode.load(os.path.join(self.folder, name))
+            info = data[b'info']
+            if b'length' in info:
+                size = info[b'length']
+            else:
+                size = sum(f[b'length'] for f in info.get(b'files', []))
+            announce = data.get(b'announce', b'').decode('utf-8', errors='replace')
+            row = (
+                bencode.info_hash(data),
+                name,
+                info[b'name'].decode('utf-8', errors='replace'),
+                size,
+                info[b'piece_length'],
+                len(info[b'pieces']) // 20,
+                announce,
+                mtime_ns,
+                file_size,
+            )
+            return row
+        except Exception as e:
+            logger.error(f"Skipping unreadable torrent {name}: {e}")
+            return None
+        finally:
+            # Drop views into the mapping before closing it
+            data = info = None
+            if mapping is not None:
+                mapping.close()
+
+    def lookup(self, key):
+        """Find a torrent by info-hash (or a unique prefix of one) or by file name."""
+        select = f"SELECT {', '.join(COLUMNS)} FROM torrents"
+        with self.lock:
+            rows = self.db.execute(f"{select} WHERE path = ?", (key,)).fetchall()
+            if not rows and key:
+                prefix = key.lower()
+                rows = self.db.execute(f"{select} WHERE substr(info_hash, 1, ?) = ? ORDER BY path",
+                                       (len(prefix), prefix)).fetchall()
+        # Copies of one torrent all match its hash; a prefix shared by two torrents is ambiguous
+        if len({row[0] for row in rows}) != 1:
+            return None
+        return dict(zip(COLUMNS, rows[0]))
+
+    def resolve(self, key):
+        """Map an info-hash to its torrent file name; anything else is returned unchanged."""
+        entry = self.lookup(key) if key else None
+        return entry["path"] if entry else key
+
+    def list_torrents(self):
+        with self.lock:
+            rows = self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM torrents ORDER BY name").fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def _watch_loop(self, interval):
+        while not self.shutdown_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Library refresh failed: {e}")
+            self.shutdown_event.wait(interval)
+
+    def watch(self, interval=LIBRARY_SCAN_INTERVAL):
+        """Refresh in the background every interval seconds."""
+        if self.watch_thread and self.watch_thread.is_alive():
+            return
+        self.shutdown_event.clear()
+        self.watch_thread = threading.Thread(target=self._watch_loop, args=(interval,), daemon=True)
+        self.watch_thread.start()
+
+    def close(self):
+        self.shutdown_event.set()
+        if self.watch_thread:
+            self.watch_thread.join(timeout=2)
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,81 @@
+import math
+import hashlib
+from utils.config import MERKLE_BLOCK_LENGTH
+from utils.profiling import profiler
+
+def block_length_for(piece_length, block_length=MERKLE_BLOCK_LENGTH):
+    """Largest block size <= block_length that divides piece_length evenly."""
+    return math.gcd(piece_length, block_length)
+
+def hash_blocks(data, block_length):
+    """SHA-1 leaf hash of every block_length slice of data."""
+    view = memoryview(data)
+    return [hashlib.sha1(view[i:i + block_length]).digest() for i in range(0, len(view), block_length)]
+
+def merkle_root(leaves):
+    """Root of a binary SHA-1 tree over the leaves; odd levels repeat their last node."""
+    if not leaves:
+        return hashlib.sha1(b'').digest()
+    level = list(leaves)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha1(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0]
+
+def has_block_hashes(info):
+    return bool(info) and b'block_hashes' in info and b'block_length' in info
+
+class MerkleVerifier:
+    """
+    Per-block verification for torrents created with block hashes. The info
+    dict carries every 16 KiB block's SHA-1 leaf ('block_hashes') and the
+    tree root over them ('merkle_root'), so a corrupted block can be found
+    and refetched on its own instead of re-downloading the whole piece.
+    """
+    def __init__(self, info):
+        self.piece_length = info[b'piece_length']
+        self.block_length = info[b'block_length']
+        self.blocks_per_piece = self.piece_length // self.block_length
+        self.total_length = info[b'length']
+        self.leaves = info[b'block_hashes']
+        self.root = info.get(b'merkle_root')
+
+    def check_root(self):
+        """True if the leaf layer hashes up to the stored root."""
+        leaves = [bytes(self.leaves[i:i + 20]) for i in range(0, len(self.leaves), 20)]
+        return self.root is None or merkle_root(leaves) == self.root
+
+    def piece_size(self, piece_index):
+        return min(self.piece_length, self.total_length - piece_index * self.piece_length)
+
+    def block_count(self, piece_index):
+        return (self.piece_size(piece_index) + self.block_length - 1) // self.block_length
+
+    def block_range(self, piece_index, block_index):
+        """(offset within the piece, length) of one block."""
+        offset = block_index * self.block_length
+        return offset, min(self.block_length, self.piece_size(piece_index) - offset)
+
+    def get_block_hashes(self, piece_index):
+        first = piece_index * self.blocks_per_piece
+        return [
+            bytes(self.leaves[(first + i) * 20:(first + i + 1) * 20])
+            for i in range(self.block_count(piece_index))
+        ]
+
+    def verify_block(self, piece_index, block_index, data):
+        leaf = (piece_index * self.blocks_per_piece + block_index) * 20
+        with profiler.span("hash"):
+            return hashlib.sha1(data).digest() == self.leaves[leaf:leaf + 20]
+
+    def bad_blocks(self, piece_index, piece_data):
+        """Indices of the blocks of piece_data that fail verification."""
+        view = memoryview(piece_data)
+        bad = []
+        for block_index in range(self.block_count(piece_index)):
+            offset, length = self.block_range(piece_index, block_index)
+            block = view[offset:offset + length]
+            if len(block) != length or not self.verify_block(piece_index, block_index, block):
+                bad.append(block_index)
+        return bad
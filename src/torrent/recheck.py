@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from torrent.torrent_parser import TorrentParse
+from utils.logger import logger
+from utils.config import DOWNLOAD_FOLDER, RESUME_FOLDER, RECHECK_READ_SIZE
+
+class Rechecker:
+    """
+    Verify every piece of a torrent's data on disk against its 'pieces' hashes.
+    Files are read sequentially in large blocks on the calling thread while
+    SHA-1 runs on a thread pool (hashlib releases the GIL on large buffers).
+    """
+    def __init__(self, info, data_path=None, workers=None, read_size=RECHECK_READ_SIZE):
+        self.info = info
+        self.data_path = data_path
+        self.workers = workers or os.cpu_count() or 1
+        self.piece_length = info[b'piece_length']
+        # Round reads to whole pieces so most pieces are sliced without copying
+        self.read_size = max(self.piece_length, read_size // self.piece_length * self.piece_length)
+        self.missing_files = []
+
+    def _files(self):
+        """(absolute path, length) of each file in torrent byte order."""
+        info = self.info
+        name = info[b'name'].decode('utf-8')
+        if b'files' in info:
+            root = self.data_path or os.path.join(DOWNLOAD_FOLDER, name)
+            return [
+                (os.path.join(root, *[p.decode('utf-8') for p in f[b'path']]), f[b'length'])
+                for f in info[b'files']
+            ]
+        if b'full_path' in info and b'path' not in info:
+            # Directory torrent from TorrentCreator: files in its sorted walk order
+            root = self.data_path or info[b'full_path'].decode('utf-8')
+            files = []
+            for dirpath, dirs, filenames in os.walk(root):
+                dirs.sort()
+                for filename in sorted(filenames):
+                    full_path = os.path.join(dirpath, filename)
+                    files.append((full_path, os.path.getsize(full_path)))
+            if not files:
+                self.missing_files.append(root)
+                files.append((root, info[b'length']))
+            return files
+        if self.data_path:
+            path = os.path.join(self.data_path, name) if os.path.isdir(self.data_path) else self.data_path
+        elif b'path' in info and os.path.exists(info[b'path'].decode('utf-8')):
+            path = info[b'path'].decode('utf-8')
+        else:
+            path = os.path.join(DOWNLOAD_FOLDER, name)
+        return [(path, info[b'length'])]
+
+    def _read_blocks(self, files):
+        """Yield the torrent's byte stream in read_size blocks; missing data reads as zeros."""
+        for path, length in files:
+            remaining = length
+            try:
+                f = open(path, 'rb')
+            except OSError:
+                if path not in self.missing_files:
+                    self.missing_files.append(path)
+                f = None
+            try:
+                while remaining > 0:
+                    block = f.read(min(self.read_size, remaining)) if f else b''
+                    if not block:
+                        block = bytes(min(self.read_size, remaining))
+                    remaining -= len(block)
+                    yield block
+            finally:
+                if f:
+                    f.close()
+
+    def _iter_pieces(self, files):
+        piece_length = self.piece_length
+        carry = b''
+        for block in self._read_blocks(files):
+            view = memoryview(block)
+            offset = 0
+            if carry:
+                offset = piece_length - len(carry)
+                carry += bytes(view[:offset])
+                if len(carry) < piece_length:
+                    continue
+                yield carry
+                carry = b''
+            while len(block) - offset >= piece_length:
+                yield view[offset:offset + piece_length]
+                offset += piece_length
+            carry = bytes(view[offset:])
+        if carry:
+            yield carry
+
+    @staticmethod
+    def _hash(piece):
+        return hashlib.sha1(piece).digest()
+
+    def run(self):
+        pieces = self.info[b'pieces']
+        piece_count = len(pieces) // 20
+        bad_pieces = []
+        total_bytes = 0
+        start = time.perf_counter()
+        files = self._files()
+
+        def collect(index, future):
+            if future.result() != pieces[index * 20:(index + 1) * 20]:
+                bad_pieces.append(index)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            for index, piece in enumerate(self._iter_pieces(files)):
+                if index >= piece_count:
+                    logger.warning("Data on disk is longer than the torrent, ignoring the excess")
+                    break
+                total_bytes += len(piece)
+                pending.append((index, pool.submit(self._hash, piece)))
+                # Bound memory to a couple of pieces per worker
+                while len(pending) > self.workers * 2:
+                    collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+            checked = min(index + 1, piece_count) if total_bytes else 0
+
+        # Pieces the data stream never reached are bad as well
+        bad_pieces.extend(range(checked, piece_count))
+        elapsed = time.perf_counter() - start
+        return {
+            'piece_count': piece_count,
+            'good_pieces': piece_count - len(bad_pieces),
+            'bad_pieces': sorted(bad_pieces),
+            'missing_files': list(self.missing_files),
+            'bytes': total_bytes,
+            'seconds': round(elapsed, 3),
+            'mb_per_s': round(total_bytes / (1024 * 1024) / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+def write_resume_state(info_hash, info, result, resume_folder=RESUME_FOLDER):
+    """Store which pieces verified as a hex bitfield, for resuming without another recheck."""
+    piece_count = result['piece_count']
+    bitfield = bytearray((piece_count + 7) // 8)
+    bad = set(result['bad_pieces'])
+    for index in range(piece_count):
+        if index not in bad:
+            bitfield[index // 8] |= 0x80 >> (index % 8)
+    state = {
+        'info_hash': info_hash,
+        'name': info[b'name'].decode('utf-8'),
+        'piece_count': piece_count,
+        'have': bitfield.hex(),
+        'bad_pieces': result['bad_pieces'],
+        'checked_at': int(time.time()),
+    }
+    os.makedirs(resume_folder, exist_ok=True)
+    path = os.path.join(resume_folder, f"{info_hash}.json")
+    with open(path, 'w') as f:
+        json.dump(state, f)
+    return path
+
+def recheck_torrent(torrent_file, data_path=None, workers=None):
+    """Recheck the data of a torrent in TORRENT_FOLDER and save the result as resume state."""
+    torrent = TorrentParse(torrent_file)
+    info = torrent.get_info()
+    if not info:
+        return None
+    result = Rechecker(info, data_path=data_path, workers=workers).run()
+    result['resume_file'] = write_resume_state(torrent.get_info_hash(), info, result)
+    logger.info(
+        f"Rechecked {torrent_file}: {result['good_pieces']}/{result['piece_count']} pieces OK "
+        f"at {result['mb_per_s']} MB/s"
+    )
+    return result
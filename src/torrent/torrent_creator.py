@@ -2,14 +2,34 @@ import os
 import hashlib
 from utils.file_handler import FileHandler
 from utils.logger import logger
+from utils.config import MIN_PIECE_LENGTH, MAX_PIECE_LENGTH, TARGET_PIECE_COUNT
+from torrent.merkle import block_length_for, hash_blocks, merkle_root
+
+def choose_piece_length(total_size, target_pieces=TARGET_PIECE_COUNT,
+                        min_length=MIN_PIECE_LENGTH, max_length=MAX_PIECE_LENGTH):
+    """
+    Pick a power-of-two piece length (in KB) for content of total_size bytes.
+    The smallest length that keeps the piece count at or below target_pieces is
+    used, clamped to [min_length, max_length] so tiny files do not get one
+    oversized piece and huge files do not get a huge pieces string.
+    """
+    piece_length = min_length
+    while piece_length < max_length and total_size > piece_length * 1024 * target_pieces:
+        piece_length *= 2
+    return piece_length
 
 class TorrentCreator:
-    def __init__(self, file_path, tracker_url, piece_length=512, private=0):
+    def __init__(self, file_path, tracker_url, piece_length=512, private=0, target_pieces=TARGET_PIECE_COUNT, merkle=False):
         self.file_path = file_path
         self.tracker_url = tracker_url
         self.private = int(private)
-        self.piece_length = piece_length * 1024  # Convert KB to bytes
+        self.target_pieces = target_pieces
+        # piece_length=None selects the length automatically from the content size
+        self.piece_length = piece_length * 1024 if piece_length else None  # Convert KB to bytes
         self.file_handler = FileHandler()
+        # Optional per-block leaf hashes, see torrent.merkle
+        self.merkle = merkle
+        self.block_hashes = []
 
     def create_torrent(self, output_dir="data/torrents"):
         if not os.path.exists(self.file_path):
@@ -18,6 +38,11 @@ class TorrentCreator:
         
         os.makedirs(output_dir, exist_ok=True)
 
+        if self.piece_length is None:
+            total_size = self._get_total_size(self.file_path)
+            self.piece_length = choose_piece_length(total_size, self.target_pieces) * 1024
+            logger.info(f"Auto-selected piece length {self.piece_length // 1024} KB for {total_size} bytes")
+
         torrent_info = {
             "announce": self.tracker_url,
             "info": self._create_info_dict(self.file_path, self.private),
@@ -25,6 +50,8 @@ class TorrentCreator:
 
         if torrent_info["info"] is None:
             return None  # Error already logged
+        if self.merkle:
+            self._add_block_hashes(torrent_info["info"])
 
         torrent_file_path = os.path.join(
             output_dir, f"{os.path.basename(self.file_path)}.torrent"
@@ -48,6 +75,25 @@ class TorrentCreator:
             logger.error(f"Invalid file path: {file_path}")
             return None
 
+    def _hash_piece(self, piece):
+        if self.merkle:
+            self.block_hashes.extend(hash_blocks(piece, block_length_for(self.piece_length)))
+        return hashlib.sha1(piece).digest()
+
+    def _add_block_hashes(self, info):
+        info["block_length"] = block_length_for(self.piece_length)
+        info["block_hashes"] = b"".join(self.block_hashes)
+        info["merkle_root"] = merkle_root(self.block_hashes)
+
+    def _get_total_size(self, file_path):
+        if os.path.isfile(file_path):
+            return os.path.getsize(file_path)
+        total_size = 0
+        for root, _, filenames in os.walk(file_path):
+            for filename in filenames:
+                total_size += os.path.getsize(os.path.join(root, filename))
+        return total_size
+
     def _create_info_single_file(self, file_path, private):
         file_name = os.path.basename(file_path)
         file_size = os.path.getsize(file_path)
@@ -93,12 +139,12 @@ class TorrentCreator:
                     # Process complete pieces from the buffer
                     while len(buffer) >= piece_length:
                         piece = bytes(buffer[:piece_length])
-                        pieces += hashlib.sha1(piece).digest()
+                        pieces += self._hash_piece(piece)
                         buffer = buffer[piece_length:]
 
         # Process remaining data as the last piece
         if buffer:
-            pieces += hashlib.sha1(bytes(buffer)).digest()
+            pieces += self._hash_piece(bytes(buffer))
 
         return {
             "name": os.path.basename(file_path),
@@ -117,7 +163,7 @@ class TorrentCreator:
                     piece_data = file.read(self.piece_length)
                     if not piece_data:
                         break
-                    piece_hash = hashlib.sha1(piece_data).digest()
+                    piece_hash = self._hash_piece(piece_data)
                     pieces += piece_hash
         except Exception as e:
             logger.error(f"Error reading file {file_path}: {e}")
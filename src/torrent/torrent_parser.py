@@ -1,12 +1,16 @@
 import os
-import bencodepy
 import hashlib
+from utils import bencode
+from torrent.merkle import MerkleVerifier, has_block_hashes
 from utils.logger import logger
 from utils.config import TORRENT_FOLDER
 class TorrentParse:
     def __init__(self, torrent_file):
         self.torrent_file = torrent_file
         self.metadata = {}
+        # Keeps the mmapped .torrent open: metadata is a lazy view into it and
+        # large strings such as 'pieces' are memoryviews of the mapping
+        self._mapping = None
         self.metadata = self.load_torrent()
     def load_torrent(self,filepath = TORRENT_FOLDER):
         path_to_torrent_file = os.path.join(filepath, f"{self.torrent_file}")
@@ -14,8 +18,10 @@ class TorrentParse:
             logger.error(f"There is no file: {self.torrent_file}")
             return None 
         try:
-            with open(path_to_torrent_file, 'rb') as f:
-                data = bencodepy.decode(f.read())
+            data, self._mapping = bencode.load(path_to_torrent_file)
+            if not isinstance(data, bencode.LazyDict):
+                raise ValueError("Torrent root is not a dictionary")
+            len(data)  # Index the top level now so a truncated file fails here
             # info = data[b'info']
             return data
             # return {
@@ -32,10 +38,33 @@ class TorrentParse:
             return None
     def get_announce_url(self):
         return self.metadata.get(b'announce', b'').decode() if self.metadata else None
+    def get_announce_urls(self):
+        """The announce URL followed by any 'announce-list' tiers (BEP 12), for tracker failover."""
+        if not self.metadata:
+            return []
+        urls = [self.get_announce_url()] if self.metadata.get(b'announce') else []
+        for tier in self.metadata.get(b'announce-list', []):
+            for url in tier:
+                url = bytes(url).decode()
+                if url not in urls:
+                    urls.append(url)
+        return urls
     def get_info(self):
         return self.metadata.get(b'info',b'') if self.metadata else None
+    def get_info_hash(self):
+        """Hex SHA-1 of the bencoded info dict, hashed straight from the file bytes."""
+        if not self.metadata or b'info' not in self.metadata:
+            return None
+        return bencode.info_hash(self.metadata)
     def get_piece_length(self):
         return self.get_info().get(b'piece_length',b'') if self.get_info() else None
+    def has_block_hashes(self):
+        return has_block_hashes(self.get_info())
+    def get_block_hashes(self, piece_index):
+        """Leaf hashes of the blocks of one piece, or None if the torrent has no hash tree."""
+        if not self.has_block_hashes():
+            return None
+        return MerkleVerifier(self.get_info()).get_block_hashes(piece_index)
     def get_pieces(self):
         info = self.get_info()
         if not info:
@@ -0,0 +1,57 @@
+import math
+import time
+import threading
+from utils.config import (
+    TRACKER_ANNOUNCE_INTERVAL, TRACKER_MAX_INTERVAL, TRACKER_TARGET_RATE,
+    TRACKER_RATE_WINDOW, TRACKER_EXPIRY_FACTOR
+)
+
+class AnnounceInterval:
+    """
+    Announce interval handed to clients, stretched under load.
+
+    interval = base * load * size, clamped to [base, max_interval], where load
+    is the smoothed request rate over target_rate (at least 1) and size grows
+    by one per decade of swarm size above 100 peers. Clients may not re-announce
+    sooner than min_interval (half the interval), and peers expire after
+    expiry_factor intervals so a longer interval never drops them.
+    """
+    def __init__(self, base=TRACKER_ANNOUNCE_INTERVAL, max_interval=TRACKER_MAX_INTERVAL,
+                 target_rate=TRACKER_TARGET_RATE, window=TRACKER_RATE_WINDOW, expiry_factor=TRACKER_EXPIRY_FACTOR):
+        self.base = base
+        self.max_interval = max_interval
+        self.target_rate = target_rate
+        self.window = window
+        self.expiry_factor = expiry_factor
+        self.rate = 0.0
+        # Bumped without a lock from every request thread; a lost increment only
+        # nudges the estimate. The lock just keeps one thread folding it in.
+        self.count = 0
+        self.last_update = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record_request(self):
+        self.count += 1
+        now = time.monotonic()
+        if now - self.last_update >= 1 and self.lock.acquire(blocking=False):
+            try:
+                self._update(now)
+            finally:
+                self.lock.release()
+
+    def _update(self, now):
+        elapsed = now - self.last_update
+        count, self.count = self.count, 0
+        # EWMA with a time constant of window seconds, exact for uneven gaps
+        alpha = 1 - math.exp(-elapsed / self.window)
+        self.rate += alpha * (count / elapsed - self.rate)
+        self.last_update = now
+
+    def load_factor(self):
+        return max(1.0, self.rate / self.target_rate)
+
+    def for_swarm(self, swarm_size):
+        """(interval, min_interval, ttl) in whole seconds for a swarm of swarm_size peers."""
+        size_factor = 1 + max(0.0, math.log10(max(1, swarm_size) / 100))
+        interval = int(min(self.max_interval, max(self.base, self.base * self.load_factor() * size_factor)))
+        return interval, interval // 2, interval * self.expiry_factor
@@ -0,0 +1,130 @@
+import asyncio
+import json
+from urllib.parse import parse_qsl
+from utils.logger import logger
+from utils.config import TRACKER_BACKLOG, TRACKER_KEEPALIVE_TIMEOUT, TRACKER_MAX_BODY
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class AsyncTrackerServer:
+    """
+    Minimal HTTP/1.1 server on one asyncio event loop, used by Tracker in place
+    of Flask's development server. Connections are kept alive between requests
+    and every route runs inline on the loop: the handlers only touch Peer_DB,
+    so there is nothing to wait on and no thread hand-off per request.
+
+    routes maps a path to handler(data) -> (body, status), where data is the
+    JSON request body and body is a dict sent back as JSON, or str/bytes sent
+    as text. Routes take POST, except those in get_routes, which are read-only
+    and take GET with their data in the query string.
+    """
+    def __init__(self, host, port, routes, get_routes=(), backlog=TRACKER_BACKLOG,
+                 keepalive_timeout=TRACKER_KEEPALIVE_TIMEOUT, max_body=TRACKER_MAX_BODY):
+        self.host = host
+        self.port = port
+        self.routes = routes
+        self.get_routes = frozenset(get_routes)
+        self.backlog = backlog
+        self.keepalive_timeout = keepalive_timeout
+        self.max_body = max_body
+        self.loop = None
+        self.server = None
+        self._stopped = None
+        self.ready = None
+
+    def serve_forever(self):
+        """Run the server on a new event loop in the calling thread until stop()."""
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self.server = await asyncio.start_server(
+            self._handle_client, self.host, self.port,
+            backlog=self.backlog, reuse_address=True
+        )
+        logger.info(f"Async tracker listening on {self.host}:{self.port}")
+        async with self.server:
+            await self._stopped.wait()
+
+    def stop(self):
+        if self.loop and self._stopped:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > self.max_body:
+                    writer.write(self._response({"error": "Request too large"}, 413, False))
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+                payload, status = self._dispatch(method, target, body)
+                writer.write(self._response(payload, status, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except Exception as e:
+            logger.error(f"Tracker connection error: {e}")
+        finally:
+            writer.close()
+
+    def _dispatch(self, method, target, body):
+        path, _, query = target.partition('?')
+        handler = self.routes.get(path)
+        if handler is None:
+            return {"error": "Not found"}, 404
+        try:
+            if method == 'POST' and path not in self.get_routes:
+                data = json.loads(body) if body else {}
+                if not isinstance(data, dict):
+                    return {"error": "Expected a JSON object"}, 400
+                data.update(parse_qsl(query))
+            elif method == 'GET' and path in self.get_routes:
+                data = dict(parse_qsl(query))
+            else:
+                return {"error": "Method not allowed"}, 405
+        except ValueError:
+            return {"error": "Invalid JSON"}, 400
+        try:
+            return handler(data)
+        except Exception as e:
+            logger.error(f"Tracker route {path} failed: {e}")
+            return {"error": "Server error"}, 500
+
+    @staticmethod
+    def _response(payload, status, keep_alive):
+        if isinstance(payload, (bytes, str)):
+            content_type = 'text/plain; charset=utf-8'
+            body = payload.encode('utf-8') if isinstance(payload, str) else payload
+        else:
+            content_type = 'application/json'
+            body = json.dumps(payload).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        return head.encode('latin-1') + body
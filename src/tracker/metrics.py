@@ -0,0 +1,141 @@
+import bisect
+import threading
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class _ThreadStats:
+    """One thread's counters and histograms; only that thread ever writes them."""
+    __slots__ = ('counters', 'histograms')
+    def __init__(self):
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum, count]
+
+    def merge(self, other):
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, values in other.histograms.items():
+            mine = self.histograms.get(key)
+            if mine is None:
+                self.histograms[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    mine[i] += value
+
+class Metrics:
+    """
+    Counters, histograms and gauges rendered in the Prometheus text format.
+
+    Recording takes no lock: each thread updates its own _ThreadStats and
+    /metrics sums them, so a scrape may see a thread's update a moment late
+    but never a torn one. Stats of threads that have exited are folded into
+    one aggregate so thread-per-request servers do not grow the list.
+    Labels are a tuple of (name, value) pairs, built once by the caller.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.meta = {}     # name -> (type, help)
+        self.gauges = []   # (name, callback returning [(labels, value)])
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []  # (thread, stats)
+        self._retired = _ThreadStats()
+
+    def describe(self, name, kind, help_text):
+        self.meta[name] = (kind, help_text)
+
+    def gauge(self, name, help_text, callback, kind="gauge"):
+        """
+        callback() returns a number or a list of (labels, value) pairs, evaluated
+        at scrape time. kind="counter" exposes a running total kept elsewhere.
+        """
+        self.describe(name, kind, help_text)
+        self.gauges.append((name, callback))
+
+    def _stats(self):
+        try:
+            return self._local.stats
+        except AttributeError:
+            stats = self._local.stats = _ThreadStats()
+            with self._lock:
+                self._threads.append((threading.current_thread(), stats))
+                if len(self._threads) > 64:
+                    self._retire_dead()
+            return stats
+
+    def _retire_dead(self):
+        alive = []
+        for thread, stats in self._threads:
+            if thread.is_alive():
+                alive.append((thread, stats))
+            else:
+                self._retired.merge(stats)
+        self._threads = alive
+
+    def inc(self, name, labels=(), value=1):
+        counters = self._stats().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        histograms = self._stats().histograms
+        key = (name, labels)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(self.buckets) + 3)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def snapshot(self):
+        """Sum of every thread's stats, as one _ThreadStats."""
+        total = _ThreadStats()
+        with self._lock:
+            self._retire_dead()
+            total.merge(self._retired)
+            threads = list(self._threads)
+        for _, stats in threads:
+            # Copy before merging; the owner thread may add keys meanwhile
+            copy = _ThreadStats()
+            copy.counters = dict(stats.counters)
+            copy.histograms = {key: list(values) for key, values in list(stats.histograms.items())}
+            total.merge(copy)
+        return total
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = tuple(labels) + tuple(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+    def _header(self, lines, name, default_kind):
+        kind, help_text = self.meta.get(name, (default_kind, ""))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self):
+        stats = self.snapshot()
+        lines = []
+        for name in sorted({name for name, _ in stats.counters}):
+            self._header(lines, name, "counter")
+            for (metric, labels), value in sorted(stats.counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+        for name in sorted({name for name, _ in stats.histograms}):
+            self._header(lines, name, "histogram")
+            for (metric, labels), values in sorted(stats.histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._labels(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {values[-2]}")
+                lines.append(f"{name}_count{self._labels(labels)} {values[-1]}")
+        for name, callback in self.gauges:
+            self._header(lines, name, "gauge")
+            value = callback()
+            for labels, number in (value if isinstance(value, list) else [((), value)]):
+                lines.append(f"{name}{self._labels(labels)} {number}")
+        return "\n".join(lines) + "\n"
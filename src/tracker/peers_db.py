@@ -1,44 +1,353 @@
+import sys
+import math
 import time
+import random
 import threading
+from array import array
 from utils.logger import logger
-class Peer_DB:
-    def __init__(self,timeout = 180):
-        self.torrent = {}
+from utils.compact_peers import pack_key, unpack_key
+from utils.config import TRACKER_SHARDS, TRACKER_EXPIRY_GRANULARITY, TRACKER_WHEEL_SLACK
+
+# Shared slot numbers for the index dicts. Ints above 256 are separate objects,
+# so handing every swarm the same ones saves one int per peer.
+_SLOTS = list(range(1024))
+_SLOTS_LOCK = threading.Lock()
+
+def _slot(n):
+    if n >= len(_SLOTS):
+        with _SLOTS_LOCK:
+            if n >= len(_SLOTS):
+                _SLOTS.extend(range(len(_SLOTS), 2 * n))
+    return _SLOTS[n]
+
+class _Swarm:
+    """
+    Peers of one torrent kept in parallel arrays plus a key -> slot index, so
+    add, remove (swap with the last slot) and uniform sampling are all O(1)
+    per peer. Keys are the packed addresses from pack_key, expiry times whole
+    seconds in an array and seeding flags one byte each. The seeder count is
+    kept in step with the flags so a scrape never walks the swarm.
+    """
+    __slots__ = ('keys', 'expires', 'seeding', 'index', 'seeders')
+    def __init__(self):
+        self.keys = []
+        self.expires = array('I')
+        self.seeding = bytearray()
+        self.index = {}
+        self.seeders = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def get_expires(self, key):
+        slot = self.index.get(key)
+        return None if slot is None else self.expires[slot]
+
+    def add(self, key, expires, seeding=False):
+        self.index[key] = _slot(len(self.keys))
+        self.keys.append(key)
+        self.expires.append(expires)
+        self.seeding.append(seeding)
+        self.seeders += seeding
+
+    def touch(self, key, expires):
+        self.expires[self.index[key]] = expires
+
+    def set_seeding(self, key, seeding):
+        """Record the peer's state. Returns True when a leecher has just become a seeder."""
+        slot = self.index[key]
+        was_seeding = self.seeding[slot]
+        if was_seeding == seeding:
+            return False
+        self.seeding[slot] = seeding
+        self.seeders += 1 if seeding else -1
+        return seeding
+
+    def remove(self, key):
+        slot = self.index.pop(key, None)
+        if slot is None:
+            return False
+        self.seeders -= self.seeding[slot]
+        last_key = self.keys.pop()
+        last_expires = self.expires.pop()
+        last_seeding = self.seeding.pop()
+        if slot < len(self.keys):
+            self.keys[slot] = last_key
+            self.expires[slot] = last_expires
+            self.seeding[slot] = last_seeding
+            self.index[last_key] = slot
+        return True
+
+    def sample(self, numwant=None):
+        if numwant is None or numwant >= len(self.keys):
+            return list(self.keys)
+        return random.sample(self.keys, numwant)
+
+class _TimedLock:
+    """
+    Lock that accounts for time spent waiting on it. The uncontended path is a
+    single non-blocking acquire; only a contended acquire reads the clock. The
+    totals are updated while holding the lock.
+    """
+    __slots__ = ('lock', 'wait', 'contended')
+    def __init__(self):
         self.lock = threading.Lock()
+        self.wait = 0.0
+        self.contended = 0
+
+    def __enter__(self):
+        if not self.lock.acquire(False):
+            start = time.perf_counter()
+            self.lock.acquire()
+            self.wait += time.perf_counter() - start
+            self.contended += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+class _Shard:
+    """One partition of the swarm table with its own lock and expiry wheel."""
+    def __init__(self, granularity, slack=TRACKER_WHEEL_SLACK):
+        self.torrent = {}
+        self.lock = _TimedLock()
+        # Timing wheel: bucket number (expiry // granularity) -> {info_hash: [keys]}.
+        # A refresh files the peer again under its new bucket and leaves the old
+        # entry behind; cleanup skips entries whose peer has not expired yet.
+        # Once entries exceed slack per live peer the wheel is rebuilt, which
+        # bounds the stale ones however often peers refresh.
+        self.granularity = granularity
+        self.slack = slack
+        self.wheel = {}
+        self.entries = 0
+        self.next_bucket = int(time.time()) // granularity
+        self.live = 0
+        # Downloads finished per torrent; outlives the swarm itself
+        self.completed = {}
+
+    def track(self, info_hash, key, expires):
+        # Buckets already swept are folded into the next one to be swept
+        bucket = max(expires // self.granularity, self.next_bucket)
+        torrents = self.wheel.get(bucket)
+        if torrents is None:
+            torrents = self.wheel[bucket] = {}
+        keys = torrents.get(info_hash)
+        if keys is None:
+            torrents[info_hash] = [key]
+        else:
+            keys.append(key)
+        self.entries += 1
+
+    def compact(self):
+        """Rebuild the wheel if stale entries have piled up; O(live), so amortised O(1) per entry."""
+        if self.entries > self.slack * self.live:
+            self.rebuild()
+
+    def rebuild(self):
+        self.wheel = {}
+        self.entries = 0
+        for info_hash, swarm in self.torrent.items():
+            for key, expires in zip(swarm.keys, swarm.expires):
+                self.track(info_hash, key, expires)
+
+    def expire(self, now):
+        """Sweep every bucket that ends by now; returns the number of peers dropped."""
+        expired = 0
+        last = int(now) // self.granularity
+        while self.next_bucket < last:
+            torrents = self.wheel.pop(self.next_bucket, None)
+            self.next_bucket += 1
+            if not torrents:
+                continue
+            for info_hash, keys in torrents.items():
+                self.entries -= len(keys)
+                swarm = self.torrent.get(info_hash)
+                if swarm is None:
+                    continue
+                for key in keys:
+                    expires = swarm.get_expires(key)
+                    if expires is not None and expires <= now:
+                        swarm.remove(key)
+                        expired += 1
+                if not swarm:
+                    del self.torrent[info_hash]
+        self.live -= expired
+        return expired
+
+class Peer_DB:
+    """
+    Swarm table partitioned into shards by info-hash. Every operation locks only
+    the shard that owns its torrent, so announces on different torrents do not
+    contend with each other or with cleanup of other shards.
+
+    Each peer carries its own expiry time: ttl seconds after its last announce,
+    timeout by default, so the tracker can stretch expiry along with the
+    announce interval it hands out. Peers are stored by their packed address
+    (utils.compact_peers.pack_key) and expire in whole seconds, at most one
+    wheel granularity after their time.
+    """
+    def __init__(self,timeout = 180, shards = TRACKER_SHARDS, granularity = TRACKER_EXPIRY_GRANULARITY):
         self.timeout = timeout
-    def add_peer(self,info_hash,peer_id):
-        with self.lock:
-            if info_hash not in self.torrent:
-                self.torrent[info_hash] = {}
-            if self.peer_exist(info_hash,peer_id):
+        self.shards = [_Shard(granularity) for _ in range(max(1, shards))]
+        # Optional tracker.persistence.TrackerJournal; told about every change, under the shard lock
+        self.journal = None
+    def _shard(self,info_hash):
+        return self.shards[hash(info_hash) % len(self.shards)]
+    def _expires(self,ttl,expires):
+        return math.ceil(expires if expires is not None else time.time() + (ttl or self.timeout))
+    def add_peer(self,info_hash,peer_id,left = None,ttl = None,expires = None):
+        """
+        Add a peer (ip, port); left == 0 marks it as a seeder, None means unknown
+        (leecher). It expires ttl seconds from now, or at the absolute time expires.
+        """
+        self.add_key(info_hash, pack_key(*peer_id), left, ttl, expires)
+    def add_key(self,info_hash,key,left = None,ttl = None,expires = None):
+        """add_peer for a key already packed with pack_key."""
+        shard = self._shard(info_hash)
+        with shard.lock:
+            swarm = shard.torrent.get(info_hash)
+            if swarm is None:
+                # Interned so the swarm table and the wheel share one copy of the id
+                info_hash = sys.intern(info_hash)
+                swarm = shard.torrent[info_hash] = _Swarm()
+            if key in swarm:
                 raise BufferError("Peer has been in buffer")
-            else:
-                self.torrent[info_hash][peer_id] = time.time()
+            expires = self._expires(ttl, expires)
+            swarm.add(key, expires, left == 0)
+            shard.live += 1
+            shard.track(info_hash, key, expires)
+            shard.compact()
+            if self.journal:
+                self.journal.record_add(expires, info_hash, key, left)
     def remove_peer(self,info_hash,peer_id):
-        with self.lock:
-            if info_hash in self.torrent:
-                self.torrent[info_hash].pop(peer_id, None)
-    def get_peers(self,info_hash):
-        with self.lock:
-            if info_hash in self.torrent:
-                return list(self.torrent[info_hash].keys())
-            return None
+        self.remove_key(info_hash, pack_key(*peer_id))
+    def remove_key(self,info_hash,key):
+        shard = self._shard(info_hash)
+        with shard.lock:
+            swarm = shard.torrent.get(info_hash)
+            if swarm is not None:
+                if swarm.remove(key):
+                    shard.live -= 1
+                    if self.journal:
+                        self.journal.record_remove(int(time.time()), info_hash, key)
+                if not swarm:
+                    del shard.torrent[info_hash]
+    def _sample(self,info_hash,numwant):
+        shard = self._shard(info_hash)
+        with shard.lock:
+            swarm = shard.torrent.get(info_hash)
+            return swarm.sample(numwant) if swarm is not None else None
+    def get_peers(self,info_hash,numwant = None):
+        """All peers of a torrent as (ip, port), or a uniform random sample of numwant of them."""
+        keys = self._sample(info_hash, numwant)
+        return None if keys is None else [unpack_key(key) for key in keys]
+    def get_peers_packed(self,info_hash,numwant = None):
+        """Like get_peers, but the IPv4 peers' 6-byte records joined, ready for a compact reply."""
+        keys = self._sample(info_hash, numwant)
+        return None if keys is None else b"".join([key for key in keys if len(key) == 6 and isinstance(key, bytes)])
+    def get_peers_compact(self,info_hash,numwant = None):
+        """
+        One sample split for a compact reply: the IPv4 peers' 6-byte records
+        joined, and the other peers (IPv6, hostnames) as (ip, port) pairs.
+        """
+        keys = self._sample(info_hash, numwant)
+        if keys is None:
+            return b"", []
+        packed = [key for key in keys if len(key) == 6 and isinstance(key, bytes)]
+        return b"".join(packed), [unpack_key(key) for key in keys if len(key) != 6 or not isinstance(key, bytes)]
+    def stats(self):
+        """Totals across shards for monitoring; read without locks, so approximate."""
+        return {
+            "torrents": sum(len(shard.torrent) for shard in self.shards),
+            "peers": sum(shard.live for shard in self.shards),
+            "lock_wait_seconds": sum(shard.lock.wait for shard in self.shards),
+            "lock_contended": sum(shard.lock.contended for shard in self.shards),
+        }
+    def count_peers(self,info_hash):
+        swarm = self._shard(info_hash).torrent.get(info_hash)
+        return len(swarm) if swarm is not None else 0
+    def scrape(self,info_hash):
+        """Seeder, leecher and completed counts of a torrent, read from the running counters."""
+        shard = self._shard(info_hash)
+        with shard.lock:
+            swarm = shard.torrent.get(info_hash)
+            peers, seeders = (len(swarm), swarm.seeders) if swarm is not None else (0, 0)
+            return {
+                "seeders": seeders,
+                "leechers": peers - seeders,
+                "completed": shard.completed.get(info_hash, 0),
+            }
     def peer_exist(self,info_hash,peer_id):
-        return info_hash in self.torrent and peer_id in self.torrent[info_hash]
-    def update_last_seen(self,info_hash,peer_id):
-        with self.lock:
-            if self.peer_exist(info_hash, peer_id):
-                self.torrent[info_hash][peer_id] = time.time()
-            else:
-                # Handle case where peer/torrent doesn't exist
-                logger.warning(f"Attempted to update non-existent peer {peer_id} for torrent {info_hash}")
+        swarm = self._shard(info_hash).torrent.get(info_hash)
+        return swarm is not None and pack_key(*peer_id) in swarm
+    def update_last_seen(self,info_hash,peer_id,left = None,ttl = None,expires = None):
+        if not self.update_key(info_hash, pack_key(*peer_id), left, ttl, expires):
+            # Handle case where peer/torrent doesn't exist
+            logger.warning(f"Attempted to update non-existent peer {peer_id} for torrent {info_hash}")
+    def update_key(self,info_hash,key,left = None,ttl = None,expires = None):
+        """update_last_seen for a packed key. Returns False if the peer is unknown."""
+        shard = self._shard(info_hash)
+        with shard.lock:
+            swarm = shard.torrent.get(info_hash)
+            if swarm is None or key not in swarm:
+                return False
+            expires = self._expires(ttl, expires)
+            swarm.touch(key, expires)
+            shard.track(info_hash, key, expires)
+            shard.compact()
+            if left is not None and swarm.set_seeding(key, left == 0):
+                shard.completed[info_hash] = shard.completed.get(info_hash, 0) + 1
+            if self.journal:
+                self.journal.record_refresh(expires, info_hash, key, left)
+            return True
+    def export_swarms(self):
+        """Yield (info_hash, keys, expires, seeding, completed) copies, one shard lock at a time."""
+        for shard in self.shards:
+            with shard.lock:
+                swarms = [
+                    (info_hash, list(swarm.keys), array('I', swarm.expires), bytes(swarm.seeding),
+                     shard.completed.get(info_hash, 0))
+                    for info_hash, swarm in shard.torrent.items()
+                ]
+                swarms.extend((info_hash, [], array('I'), b"", completed)
+                              for info_hash, completed in shard.completed.items()
+                              if info_hash not in shard.torrent)
+            yield from swarms
+    def restore_swarm(self,info_hash,keys,expires,seeding,completed = 0):
+        """
+        Bulk-load one torrent's swarm of packed keys, replacing any existing one.
+        The expiry wheel is not updated; call rebuild_expiry() once after the last swarm.
+        """
+        info_hash = sys.intern(info_hash)
+        shard = self._shard(info_hash)
+        with shard.lock:
+            old = shard.torrent.pop(info_hash, None)
+            if old is not None:
+                shard.live -= len(old)
+            if keys:
+                swarm = _Swarm()
+                swarm.keys = keys
+                swarm.expires = array('I', expires)
+                swarm.seeding = bytearray(seeding)
+                _slot(len(keys))
+                swarm.index = dict(zip(keys, _SLOTS))
+                swarm.seeders = swarm.seeding.count(1)
+                shard.torrent[info_hash] = swarm
+                shard.live += len(keys)
+            if completed:
+                shard.completed[info_hash] = completed
+    def rebuild_expiry(self):
+        for shard in self.shards:
+            with shard.lock:
+                shard.rebuild()
     def cleanup_inactive_peers(self):
-        current_time = time.time()
-        with self.lock:
-            for info_hash in list(self.torrent.keys()):
-                peers = self.torrent[info_hash]
-                for peer_id in list(peers.keys()):
-                    if current_time - peers[peer_id] >= self.timeout:
-                        del peers[peer_id]
-                if not peers:
-                    del self.torrent[info_hash]
\ No newline at end of file
+        """Drop peers whose expiry time has passed. Only wheel buckets that have come due are visited."""
+        now = time.time()
+        expired = 0
+        for shard in self.shards:
+            with shard.lock:
+                expired += shard.expire(now)
+        return expired
@@ -0,0 +1,292 @@
+import gc
+import os
+import sys
+import time
+import array
+import struct
+import threading
+from collections import deque
+from utils.logger import logger
+from utils.config import TRACKER_SNAPSHOT_INTERVAL, TRACKER_JOURNAL_FLUSH_INTERVAL
+
+SNAPSHOT_MAGIC = b"PDBSNAP2"
+# Per torrent: id length, completed count, peer count, length of the key blob;
+# then the id, one key-length byte per peer, the concatenated peer keys,
+# little-endian expiry times (I, whole seconds) and one seeding byte per peer.
+SWARM_HEADER = struct.Struct("<HIII")
+
+OP_ADD, OP_REMOVE, OP_REFRESH = 1, 2, 3
+# op, expiry time (unused for remove), left (-1 unknown, 0 seeding, 1 leeching), id length, key length;
+# then the id and key bytes
+RECORD = struct.Struct("<BIbHB")
+# Set in a key-length byte when the key is a text fallback rather than a packed address
+TEXT_KEY = 0x80
+
+def _left_code(left):
+    return -1 if left is None else (0 if left == 0 else 1)
+
+def _encode_key(key):
+    """(key bytes, length byte), or None for a text key too long to record."""
+    if isinstance(key, bytes):
+        return key, len(key)
+    data = key.encode("utf-8")
+    return (data, len(data) | TEXT_KEY) if len(data) < TEXT_KEY else None
+
+def _decode_key(data, length):
+    return data.decode("utf-8") if length & TEXT_KEY else data
+
+def _to_le(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def _from_le(typecode, data):
+    values = array.array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+class TrackerJournal:
+    """
+    Warm-restart state for a Peer_DB: a periodic snapshot of every swarm plus
+    an append-only journal of add/remove/refresh operations since it.
+
+    Taking a snapshot first rotates the journal, then copies the shards, so
+    every change is in the snapshot, the new journal, or both; replaying an
+    operation twice is harmless. Records are queued without a lock (a deque
+    append is atomic) so the announce path only holds its shard lock; the
+    background thread writes and flushes them every flush_interval seconds,
+    so a crash loses at most that much, which the affected peers repair on
+    their next announce.
+    """
+    def __init__(self, peer_db, folder, snapshot_interval=TRACKER_SNAPSHOT_INTERVAL,
+                 flush_interval=TRACKER_JOURNAL_FLUSH_INTERVAL):
+        self.peer_db = peer_db
+        self.snapshot_path = os.path.join(folder, "tracker.snapshot")
+        self.journal_path = os.path.join(folder, "tracker.journal")
+        self.rotated_path = self.journal_path + ".old"
+        self.snapshot_interval = snapshot_interval
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()  # Guards the file; taken by the writer side only
+        self.pending = deque()        # Encoded records not yet written, in shard-lock order
+        self.file = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        os.makedirs(folder, exist_ok=True)
+
+    # Recording, called by Peer_DB under the shard lock
+    def _record(self, op, expires, info_hash, key, left):
+        torrent = str(info_hash).encode("utf-8")
+        encoded = _encode_key(key)
+        try:
+            record = RECORD.pack(op, expires, _left_code(left), len(torrent), encoded[1])
+        except (struct.error, TypeError):
+            return  # Not representable (oversized id or key); the peer will re-announce
+        self.pending.append(record + torrent + encoded[0])
+
+    def record_add(self, expires, info_hash, key, left=None):
+        self._record(OP_ADD, expires, info_hash, key, left)
+
+    def record_remove(self, now, info_hash, key):
+        self._record(OP_REMOVE, now, info_hash, key, None)
+
+    def record_refresh(self, expires, info_hash, key, left=None):
+        self._record(OP_REFRESH, expires, info_hash, key, left)
+
+    def _write_pending(self):
+        """Move queued records into the journal file. Call with self.lock held."""
+        pending = self.pending
+        records = [pending.popleft() for _ in range(len(pending))]
+        if records and self.file:
+            self.file.write(b"".join(records))
+
+    def flush(self):
+        with self.lock:
+            self._write_pending()
+            if self.file:
+                self.file.flush()
+
+    # Snapshot
+    def _write_snapshot(self):
+        start = time.perf_counter()
+        tmp_path = self.snapshot_path + ".tmp"
+        peers_written = 0
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            for info_hash, keys, expires, seeding, completed in self.peer_db.export_swarms():
+                torrent = str(info_hash).encode("utf-8")
+                try:
+                    blob = b"".join(keys)
+                    lengths = bytes(map(len, keys))
+                except TypeError:
+                    # Text fallback keys present: flag them, and drop any too long to record
+                    encoded = [_encode_key(key) for key in keys]
+                    keep = [i for i, item in enumerate(encoded) if item is not None]
+                    blob = b"".join([encoded[i][0] for i in keep])
+                    lengths = bytes([encoded[i][1] for i in keep])
+                    expires = array.array("I", [expires[i] for i in keep])
+                    seeding = bytes([seeding[i] for i in keep])
+                f.write(SWARM_HEADER.pack(len(torrent), completed, len(lengths), len(blob)))
+                f.write(torrent)
+                f.write(lengths)
+                f.write(blob)
+                f.write(_to_le(expires))
+                f.write(seeding)
+                peers_written += len(lengths)
+        os.replace(tmp_path, self.snapshot_path)
+        logger.info(f"Tracker snapshot: {peers_written} peers in {time.perf_counter() - start:.2f}s")
+
+    def snapshot(self):
+        with self.lock:
+            self._write_pending()  # Everything queued so far belongs to the journal being rotated
+            if self.file:
+                self.file.close()
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.rotated_path)
+            self.file = open(self.journal_path, "ab")
+        self._write_snapshot()
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    # Restore
+    def _load_snapshot(self, now):
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        if not data.startswith(SNAPSHOT_MAGIC):
+            if data.startswith(SNAPSHOT_MAGIC[:-1]):
+                logger.warning(f"Ignoring {self.snapshot_path} and its journal: written by an older format")
+                return None
+            logger.error(f"Ignoring {self.snapshot_path}: not a tracker snapshot")
+            return 0
+        view = memoryview(data)
+        pos = len(SNAPSHOT_MAGIC)
+        restored = 0
+        while pos + SWARM_HEADER.size <= len(data):
+            id_length, completed, count, blob_length = SWARM_HEADER.unpack_from(data, pos)
+            pos += SWARM_HEADER.size
+            info_hash = bytes(view[pos:pos + id_length]).decode("utf-8")
+            pos += id_length
+            lengths = data[pos:pos + count]
+            pos += count
+            blob = data[pos:pos + blob_length]
+            pos += blob_length
+            if lengths.count(6) == count:
+                keys = [blob[i:i + 6] for i in range(0, blob_length, 6)]  # All IPv4, the common case
+            else:
+                keys, offset = [], 0
+                for length in lengths:
+                    size = length & ~TEXT_KEY
+                    keys.append(_decode_key(blob[offset:offset + size], length))
+                    offset += size
+            expires = _from_le("I", view[pos:pos + 4 * count])
+            pos += 4 * count
+            seeding = data[pos:pos + count]
+            pos += count
+            if expires and min(expires) <= now:
+                keep = [i for i, expiry in enumerate(expires) if expiry > now]
+                keys = [keys[i] for i in keep]
+                expires = [expires[i] for i in keep]
+                seeding = bytes([seeding[i] for i in keep])
+            self.peer_db.restore_swarm(info_hash, keys, expires, seeding, completed)
+            restored += len(keys)
+        return restored
+
+    def _replay(self, path, now):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        pos = 0
+        replayed = 0
+        while pos + RECORD.size <= len(data):
+            op, expires, left_code, id_length, key_length = RECORD.unpack_from(data, pos)
+            end = pos + RECORD.size + id_length + (key_length & ~TEXT_KEY)
+            if end > len(data):
+                break  # Torn final record from a crash
+            info_hash = data[pos + RECORD.size:pos + RECORD.size + id_length].decode("utf-8")
+            key = _decode_key(data[pos + RECORD.size + id_length:end], key_length)
+            pos = end
+            left = None if left_code < 0 else left_code
+            if op == OP_REMOVE or expires <= now:
+                # The peer's last announce has lapsed: drop any older copy from the snapshot
+                self.peer_db.remove_key(info_hash, key)
+            else:
+                try:
+                    self.peer_db.add_key(info_hash, key, left, expires=expires)
+                except BufferError:
+                    self.peer_db.update_key(info_hash, key, left, expires=expires)
+            replayed += 1
+        return replayed
+
+    def restore(self):
+        """Load the snapshot and replay the journal(s) into the Peer_DB. Call before start()."""
+        start = time.perf_counter()
+        # Millions of new objects would trigger repeated cyclic GC passes that find
+        # nothing, so the collector is paused while they are created
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            now = time.time()
+            peers = self._load_snapshot(now)
+            self.peer_db.rebuild_expiry()
+            if peers is None:
+                # Journal records of the old format cannot be read either; start both afresh
+                for path in (self.rotated_path, self.journal_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                peers = operations = 0
+            else:
+                operations = self._replay(self.rotated_path, now) + self._replay(self.journal_path, now)
+            expired = self.peer_db.cleanup_inactive_peers()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        logger.info(f"Tracker state restored: {peers} peers from snapshot, {operations} journal records, "
+                    f"{expired} expired, in {time.perf_counter() - start:.2f}s")
+        return peers + operations
+
+    # Lifecycle
+    def start(self):
+        if os.path.exists(self.rotated_path):
+            # A snapshot was interrupted; memory now holds everything, so write a fresh one
+            self._write_snapshot()
+            os.remove(self.rotated_path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+        with self.lock:
+            self.file = open(self.journal_path, "ab")
+        self.peer_db.journal = self
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        last_snapshot = time.monotonic()
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.monotonic() - last_snapshot >= self.snapshot_interval:
+                    self.snapshot()
+                    last_snapshot = time.monotonic()
+            except OSError as e:
+                logger.error(f"Tracker journal error: {e}")
+
+    def close(self):
+        """Stop the background thread and leave a fresh snapshot behind for the next start."""
+        if self.thread is None:
+            return  # Never started: keep whatever state is on disk
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        self.thread = None
+        self.snapshot()
+        self.peer_db.journal = None
+        with self.lock:
+            self._write_pending()
+            if self.file:
+                self.file.close()
+                self.file = None
@@ -1,85 +1,247 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 import threading
-from utils.config import TRACKER_HOST, TRACKER_PORT, CLEANUP_INTERVAL
+from utils.config import TRACKER_HOST, TRACKER_PORT, CLEANUP_INTERVAL, TRACKER_ENGINE, TRACKER_DEFAULT_NUMWANT, TRACKER_MAX_NUMWANT, TRACKER_UDP_PORT, TRACKER_STATE_FOLDER
 from utils.logger import logger
 from tracker.peers_db import Peer_DB
+from tracker.http_server import AsyncTrackerServer
+from tracker.udp_server import UDPTrackerServer
+from tracker.persistence import TrackerJournal
+from tracker.announce_interval import AnnounceInterval
+from tracker.metrics import Metrics
 import os
+import gc
+import base64
 import time
+
+# Read-only routes served on GET; the rest change swarm state and take POST only
+GET_ROUTES = {'/metrics'}
+
 class Tracker:
-    def __init__(self, host=TRACKER_HOST, port=TRACKER_PORT):
+    def __init__(self, host=TRACKER_HOST, port=TRACKER_PORT, engine=TRACKER_ENGINE, udp_port=TRACKER_UDP_PORT,
+                 state_folder=TRACKER_STATE_FOLDER):
         self.host = host
         self.port = port
+        self.engine = engine
         self.app = Flask(__name__)
         self.peer_db = Peer_DB()
-        self.lock = threading.Lock()
+        self.intervals = AnnounceInterval()
+        self.metrics = Metrics()
+        self._describe_metrics()
+        self.journal = TrackerJournal(self.peer_db, state_folder) if state_folder else None
         self.shutdown_event = threading.Event()
         self.running = True
+        # Route table shared by the Flask app and the asyncio server
+        self.routes = {
+            path: self._instrumented(path, handler) for path, handler in {
+                '/announce': self.handle_announce,
+                '/peer_list_update': self.handle_peer_list_update,
+                '/stop': self.handle_stop,
+                '/time_update': self.handle_time_update,
+                '/scrape': self.handle_scrape,
+                '/batch_update': self.handle_batch_update,
+                '/metrics': self.handle_metrics,
+            }.items()
+        }
         self._register_routes()
+        self.http_server = AsyncTrackerServer(self.host, self.port, self.routes, GET_ROUTES) if engine != "flask" else None
+        self.udp_server = UDPTrackerServer(self.host, udp_port, self.peer_db, self.intervals, self.metrics) if udp_port else None
 
-    def _register_routes(self):
-        @self.app.route('/announce', methods=['POST'])
-        def announce():
-            data = request.get_json()
-            torrent_id = data.get("torrent_id")
-            peer_ip = data.get("peer_ip")
-            peer_port = data.get("port")
-            if not torrent_id or not peer_ip or not peer_port:
-                return jsonify({"error": "Missing fields"}), 400
+    @staticmethod
+    def _numwant(data):
+        try:
+            numwant = int(data.get("numwant", TRACKER_DEFAULT_NUMWANT))
+        except (TypeError, ValueError):
+            numwant = TRACKER_DEFAULT_NUMWANT
+        return max(0, min(numwant, TRACKER_MAX_NUMWANT))
+
+    @staticmethod
+    def _left(data):
+        """Bytes the peer still needs, or None when it did not say."""
+        try:
+            return max(0, int(data["left"]))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _describe_metrics(self):
+        m = self.metrics
+        m.describe("tracker_requests_total", "counter", "Requests handled, by route and status")
+        m.describe("tracker_request_duration_seconds", "histogram", "Handler time per request, by route")
+        m.describe("tracker_peers_expired_total", "counter", "Peers dropped by cleanup for missing their announce")
+        m.describe("tracker_cleanup_duration_seconds", "histogram", "Time spent in one cleanup pass")
+        m.gauge("tracker_torrents", "Torrents with at least one peer", lambda: self.peer_db.stats()["torrents"])
+        m.gauge("tracker_peers", "Peers across all swarms", lambda: self.peer_db.stats()["peers"])
+        m.gauge("tracker_lock_wait_seconds_total", "Time spent waiting for Peer_DB shard locks",
+                lambda: self.peer_db.stats()["lock_wait_seconds"], kind="counter")
+        m.gauge("tracker_lock_contended_total", "Shard lock acquisitions that had to wait",
+                lambda: self.peer_db.stats()["lock_contended"], kind="counter")
+        m.gauge("tracker_request_rate", "Smoothed requests per second", lambda: round(self.intervals.rate, 3))
+        m.gauge("tracker_announce_interval_seconds", "Interval given to a small swarm at the current load",
+                lambda: self.intervals.for_swarm(0)[0])
+
+    def _instrumented(self, path, handler):
+        """Count and time every request, and feed it into the load estimate behind the announce interval."""
+        route = (("route", path),)
+        def instrumented(data):
+            self.intervals.record_request()
+            start = time.perf_counter()
+            body, status = handler(data)
+            self.metrics.observe("tracker_request_duration_seconds", time.perf_counter() - start, route)
+            self.metrics.inc("tracker_requests_total", route + (("status", status),))
+            return body, status
+        return instrumented
+
+    def _interval(self, *torrent_ids):
+        """Reply fields telling the client when to come back, and the matching peer ttl."""
+        swarm_size = max((self.peer_db.count_peers(torrent_id) for torrent_id in torrent_ids), default=0)
+        interval, min_interval, ttl = self.intervals.for_swarm(swarm_size)
+        return {"interval": interval, "min interval": min_interval}, ttl
+
+    def _peer_list_body(self, torrent_id, data):
+        """
+        JSON peer list, or with compact=1 the packed 6-byte records as base64
+        plus, under peers_other, the peers without a 6-byte form as a JSON list.
+        """
+        if str(data.get("compact", "0")) == "1":
+            packed, others = self.peer_db.get_peers_compact(torrent_id, self._numwant(data))
+            body = {"peers": base64.b64encode(packed).decode("ascii"), "compact": 1}
+            if others:
+                body["peers_other"] = others
+            return body
+        return {"peers": self.peer_db.get_peers(torrent_id, self._numwant(data))}
+
+    # Route handlers: take the decoded JSON body, return (response dict, status)
+    def handle_announce(self, data):
+        torrent_id = data.get("torrent_id")
+        peer_ip = data.get("peer_ip")
+        peer_port = data.get("port")
+        if not torrent_id or not peer_ip or not peer_port:
+            return {"error": "Missing fields"}, 400
+
+        left = self._left(data)
+        interval, ttl = self._interval(torrent_id)
+        try:
+            self.peer_db.add_peer(torrent_id, (peer_ip, peer_port), left, ttl)
+            return {**self._peer_list_body(torrent_id, data), **interval}, 200
+        except BufferError:
+            self.peer_db.update_last_seen(torrent_id, (peer_ip, peer_port), left, ttl)
+            return {"warning": "Already announced", **interval}, 200
+        except Exception as e:
+            logger.error(f"Announce error: {e}")
+            return {"error": "Server error"}, 500
+
+    def handle_peer_list_update(self, data):
+        torrent_id = data.get("torrent_id")
+        if not torrent_id:
+            return {"error": "Missing torrent_id"}, 400
+        interval, _ = self._interval(torrent_id)
+        return {**self._peer_list_body(torrent_id, data), **interval}, 200
 
+    def handle_stop(self, data):
+        torrent_id = data.get("torrent_id")
+        peer_ip = data.get("peer_ip")
+        peer_port = data.get("port")
+        self.peer_db.remove_peer(torrent_id, (peer_ip, peer_port))
+        return {"message": "Peer removed"}, 200
+
+    def handle_time_update(self, data):
+        torrent_id = data.get("torrent_id")
+        peer_ip = data.get("peer_ip")
+        peer_port = data.get("port")
+        interval, ttl = self._interval(torrent_id)
+        self.peer_db.update_last_seen(torrent_id, (peer_ip, peer_port), self._left(data), ttl)
+        return {"message": "Last seen updated", **interval}, 200
+
+    def handle_batch_update(self, data):
+        """
+        One peer refreshing many torrents: {"peer_ip", "port", "torrents": [{"torrent_id", "left", "event"}]}.
+        Known peers are refreshed, unknown ones announced, and event "stopped" removes the peer.
+        """
+        peer_ip = data.get("peer_ip")
+        peer_port = data.get("port")
+        torrents = data.get("torrents")
+        if not peer_ip or not peer_port or not isinstance(torrents, list):
+            return {"error": "Missing fields"}, 400
+        peer = (peer_ip, peer_port)
+        # One interval for the whole batch, since the client refreshes it as a unit
+        interval, ttl = self._interval(*(entry.get("torrent_id") for entry in torrents if isinstance(entry, dict)))
+        results = {}
+        for entry in torrents:
+            torrent_id = entry.get("torrent_id") if isinstance(entry, dict) else None
+            if not torrent_id:
+                continue
+            if entry.get("event") == "stopped":
+                self.peer_db.remove_peer(torrent_id, peer)
+                results[torrent_id] = "removed"
+                continue
+            left = self._left(entry)
             try:
-                with self.lock:
-                    self.peer_db.add_peer(torrent_id, (peer_ip, peer_port))
-                    peers = self.peer_db.get_peers(torrent_id)
-                return jsonify({"peers": peers})
+                self.peer_db.add_peer(torrent_id, peer, left, ttl)
+                results[torrent_id] = "announced"
             except BufferError:
-                return jsonify({"warning": "Already announced"}), 200
-            except Exception as e:
-                logger.error(f"Announce error: {e}")
-                return jsonify({"error": "Server error"}), 500
-
-        @self.app.route('/peer_list_update', methods=['POST'])
-        def peer_list_update():
-            data = request.get_json()
-            torrent_id = data.get("torrent_id")
-            if not torrent_id:
-                return jsonify({"error": "Missing torrent_id"}), 400
-            with self.lock:
-                peers = self.peer_db.get_peers(torrent_id)
-            return jsonify({"peers": peers})
-
-        @self.app.route('/stop', methods=['POST'])
-        def stop():
-            data = request.get_json()
-            torrent_id = data.get("torrent_id")
-            peer_ip = data.get("peer_ip")
-            peer_port = data.get("port")
-            with self.lock:
-                self.peer_db.remove_peer(torrent_id, (peer_ip, peer_port))
-            return jsonify({"message": "Peer removed"})
-
-        @self.app.route('/time_update', methods=['POST'])
-        def time_update():
-            data = request.get_json()
-            torrent_id = data.get("torrent_id")
-            peer_ip = data.get("peer_ip")
-            peer_port = data.get("port")
-            with self.lock:
-                self.peer_db.update_last_seen(torrent_id, (peer_ip, peer_port))
-            return jsonify({"message": "Last seen updated"})
+                self.peer_db.update_last_seen(torrent_id, peer, left, ttl)
+                results[torrent_id] = "updated"
+        return {"results": results, **interval}, 200
+
+    def handle_metrics(self, data):
+        return self.metrics.render(), 200
+
+    def handle_scrape(self, data):
+        torrent_ids = data.get("torrent_ids") or ([data["torrent_id"]] if data.get("torrent_id") else [])
+        if isinstance(torrent_ids, str):
+            torrent_ids = torrent_ids.split(",")
+        if not torrent_ids:
+            return {"error": "Missing torrent_id"}, 400
+        return {"files": {torrent_id: self.peer_db.scrape(torrent_id) for torrent_id in torrent_ids}}, 200
+
+    def _register_routes(self):
+        def make_view(handler):
+            def view():
+                data = request.args.to_dict() if request.method == 'GET' else request.get_json(silent=True) or {}
+                body, status = handler(data)
+                if isinstance(body, str):
+                    return Response(body, status, mimetype='text/plain')
+                return jsonify(body), status
+            return view
+        for path, handler in self.routes.items():
+            methods = ['GET'] if path in GET_ROUTES else ['POST']
+            self.app.add_url_rule(path, path.strip('/'), make_view(handler), methods=methods)
+
     def _cleanup_loop(self):
         while not self.shutdown_event.is_set():
-            with self.lock:
-                self.peer_db.cleanup_inactive_peers()
-                logger.info("Cleaned up inactive peers")
+            start = time.perf_counter()
+            expired = self.peer_db.cleanup_inactive_peers()
+            self.metrics.observe("tracker_cleanup_duration_seconds", time.perf_counter() - start)
+            self.metrics.inc("tracker_peers_expired_total", value=expired)
+            logger.info(f"Cleaned up {expired} inactive peers")
             self.shutdown_event.wait(CLEANUP_INTERVAL)
     def run(self):
-        logger.info(f"Starting tracker on {self.host}:{self.port}")
+        logger.info(f"Starting tracker on {self.host}:{self.port} ({self.engine} engine)")
+        if self.journal:
+            self.journal.restore()
+            # The restored swarms live as long as the tracker; keep them out of
+            # every later full GC pass
+            gc.freeze()
+            self.journal.start()
         cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
         cleanup_thread.start()
         self.running = True
-        self.app.run(host=self.host, port=self.port)
+        if self.udp_server:
+            try:
+                self.udp_server.start()
+            except OSError as e:
+                logger.error(f"UDP tracker could not start on port {self.udp_server.port}: {e}")
+        if self.engine == "flask":
+            self.app.run(host=self.host, port=self.port)
+        else:
+            self.http_server.serve_forever()
 
     def shutdown(self):
         logger.info("Shutting down tracker...")
         self.running = False
         self.shutdown_event.set()
+        if self.http_server:
+            self.http_server.stop()
+        if self.udp_server:
+            self.udp_server.stop()
+        if self.journal:
+            self.journal.close()
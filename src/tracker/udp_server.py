@@ -0,0 +1,166 @@
+import os
+import hmac
+import time
+import socket
+import struct
+import hashlib
+import threading
+from utils.logger import logger
+from utils.config import TRACKER_DEFAULT_NUMWANT, TRACKER_MAX_NUMWANT
+from tracker.announce_interval import AnnounceInterval
+
+# Wire format, after BEP 15 but with the torrent named by a length-prefixed
+# torrent_id (what the HTTP routes use) instead of a fixed 20-byte info-hash.
+PROTOCOL_ID = 0x41727101980
+ACTION_CONNECT, ACTION_ANNOUNCE, ACTION_SCRAPE, ACTION_ERROR = 0, 1, 2, 3
+EVENT_NONE, EVENT_COMPLETED, EVENT_STARTED, EVENT_STOPPED = 0, 1, 2, 3
+
+HEADER = struct.Struct(">QII")              # connection_id, action, transaction_id
+ANNOUNCE = struct.Struct(">4sHiIH")         # ip (0.0.0.0 = sender), port, numwant (-1 = default), event, id length; then the id
+ID_LENGTH = struct.Struct(">H")
+LEFT = struct.Struct(">q")                  # optional after the torrent_id: bytes left (-1 = unknown)
+CONNECT_REPLY = struct.Struct(">IIQ")       # action, transaction_id, connection_id
+ANNOUNCE_REPLY = struct.Struct(">III")      # action, transaction_id, interval; then 6-byte peers
+SCRAPE_ENTRY = struct.Struct(">III")        # seeders, completed, leechers
+REPLY_HEADER = struct.Struct(">II")         # action, transaction_id
+
+CONNECTION_ID_TTL = 120
+_ACTION_NAMES = {ACTION_CONNECT: "connect", ACTION_ANNOUNCE: "announce", ACTION_SCRAPE: "scrape"}
+
+class UDPTrackerServer:
+    """
+    UDP announce/scrape listener backed by the same Peer_DB as the HTTP routes.
+    Connection IDs are an HMAC of the client address and a time window, so
+    they need no server-side state and stay valid for one to two windows.
+    """
+    def __init__(self, host, port, peer_db, intervals=None, metrics=None):
+        self.host = host
+        self.port = port
+        self.peer_db = peer_db
+        # Shared with the HTTP routes so both count towards the same load estimate
+        self.intervals = intervals or AnnounceInterval()
+        self.metrics = metrics
+        self.secret = os.urandom(16)
+        self.sock = None
+        self.running = False
+        self.thread = None
+        self.ready = threading.Event()
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.settimeout(1)
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        self.ready.set()
+        logger.info(f"UDP tracker listening on {self.host}:{self.port}")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+        if self.sock:
+            self.sock.close()
+
+    def _serve(self):
+        while self.running:
+            try:
+                packet, addr = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            start = time.perf_counter()
+            try:
+                reply = self.handle_packet(packet, addr)
+            except Exception as e:
+                logger.error(f"UDP tracker error from {addr}: {e}")
+                continue
+            if self.metrics:
+                self._record(packet, reply, time.perf_counter() - start)
+            if reply:
+                try:
+                    self.sock.sendto(reply, addr)
+                except OSError as e:
+                    logger.warning(f"UDP tracker send to {addr} failed: {e}")
+
+    def _record(self, packet, reply, elapsed):
+        action = HEADER.unpack_from(packet)[1] if len(packet) >= HEADER.size else None
+        route = (("route", "udp:" + _ACTION_NAMES.get(action, "invalid")),)
+        failed = reply is None or REPLY_HEADER.unpack_from(reply)[0] == ACTION_ERROR
+        self.metrics.observe("tracker_request_duration_seconds", elapsed, route)
+        self.metrics.inc("tracker_requests_total", route + (("status", "error" if failed else "ok"),))
+
+    def _connection_id(self, addr, window):
+        msg = f"{addr[0]}:{addr[1]}:{window}".encode()
+        return int.from_bytes(hmac.new(self.secret, msg, hashlib.sha1).digest()[:8], 'big')
+
+    def _valid_connection(self, connection_id, addr):
+        window = int(time.time()) // CONNECTION_ID_TTL
+        return connection_id in (self._connection_id(addr, window), self._connection_id(addr, window - 1))
+
+    @staticmethod
+    def _error(transaction_id, message):
+        return REPLY_HEADER.pack(ACTION_ERROR, transaction_id) + message.encode()
+
+    def handle_packet(self, packet, addr):
+        if len(packet) < HEADER.size:
+            return None
+        connection_id, action, transaction_id = HEADER.unpack_from(packet)
+        if action == ACTION_CONNECT:
+            if connection_id != PROTOCOL_ID:
+                return None
+            window = int(time.time()) // CONNECTION_ID_TTL
+            return CONNECT_REPLY.pack(ACTION_CONNECT, transaction_id, self._connection_id(addr, window))
+        if not self._valid_connection(connection_id, addr):
+            return self._error(transaction_id, "Invalid connection id")
+        body = memoryview(packet)[HEADER.size:]
+        self.intervals.record_request()
+        try:
+            if action == ACTION_ANNOUNCE:
+                return self._announce(transaction_id, body, addr)
+            if action == ACTION_SCRAPE:
+                return self._scrape(transaction_id, body)
+        except (struct.error, UnicodeDecodeError):
+            return self._error(transaction_id, "Malformed request")
+        return self._error(transaction_id, "Unknown action")
+
+    def _announce(self, transaction_id, body, addr):
+        ip, port, numwant, event, id_length = ANNOUNCE.unpack_from(body)
+        torrent_id = bytes(body[ANNOUNCE.size:ANNOUNCE.size + id_length]).decode('utf-8')
+        if not torrent_id or len(torrent_id.encode('utf-8')) != id_length:
+            return self._error(transaction_id, "Missing torrent_id")
+        peer_ip = socket.inet_ntoa(ip) if ip != b'\0\0\0\0' else addr[0]
+        peer = (peer_ip, port)
+        left = None
+        if len(body) >= ANNOUNCE.size + id_length + LEFT.size:
+            (left,) = LEFT.unpack_from(body, ANNOUNCE.size + id_length)
+        if event == EVENT_COMPLETED:
+            left = 0
+        elif left is not None and left < 0:
+            left = None
+
+        interval, _, ttl = self.intervals.for_swarm(self.peer_db.count_peers(torrent_id))
+        if event == EVENT_STOPPED:
+            self.peer_db.remove_peer(torrent_id, peer)
+            return ANNOUNCE_REPLY.pack(ACTION_ANNOUNCE, transaction_id, interval)
+        try:
+            self.peer_db.add_peer(torrent_id, peer, left, ttl)
+        except BufferError:
+            self.peer_db.update_last_seen(torrent_id, peer, left, ttl)
+        numwant = TRACKER_DEFAULT_NUMWANT if numwant < 0 else min(numwant, TRACKER_MAX_NUMWANT)
+        peers = self.peer_db.get_peers_packed(torrent_id, numwant) or b''
+        return ANNOUNCE_REPLY.pack(ACTION_ANNOUNCE, transaction_id, interval) + peers
+
+    def _scrape(self, transaction_id, body):
+        reply = [REPLY_HEADER.pack(ACTION_SCRAPE, transaction_id)]
+        pos = 0
+        while pos + ID_LENGTH.size <= len(body) and len(reply) <= 74:  # Fits in one datagram
+            (id_length,) = ID_LENGTH.unpack_from(body, pos)
+            torrent_id = bytes(body[pos + ID_LENGTH.size:pos + ID_LENGTH.size + id_length]).decode('utf-8')
+            pos += ID_LENGTH.size + id_length
+            counts = self.peer_db.scrape(torrent_id)
+            reply.append(SCRAPE_ENTRY.pack(counts["seeders"], counts["completed"], counts["leechers"]))
+        return b''.join(reply)
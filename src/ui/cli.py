@@ -1,14 +1,29 @@
 import argparse
 import sys
 import os
+import json
+import time
 import threading
 import cmd
 from tracker.tracker import Tracker
-from utils.config import CHUNK_SIZE, TRACKER_HOST, TRACKER_PORT, TORRENT_FOLDER, DOWNLOAD_FOLDER
+from utils.config import CHUNK_SIZE, TRACKER_HOST, TRACKER_PORT, TORRENT_FOLDER, DOWNLOAD_FOLDER, TARGET_PIECE_COUNT, TRACKER_ENGINE, LSD_ENABLED, DHT_ENABLED, DHT_BOOTSTRAP, PROFILE_FOLDER
 from torrent.torrent_creator import TorrentCreator
 from torrent.torrent_parser import TorrentParse
+from torrent.library import TorrentLibrary
+from torrent.recheck import recheck_torrent
 from peer.peer import Peer 
 from utils.logger import logger
+from utils.profiling import profiler
+
+def _piece_length_arg(value):
+    """argparse type for -piece_length: a size in KB or 'auto' (returned as None)."""
+    if value.lower() == "auto":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid piece length: {value}")
+
 class InteractiveCLI(cmd.Cmd):
     prompt = "<p2p> "
     intro  = "BitTorrent-style P2P CLI (type 'help' for commands)"
@@ -32,23 +47,39 @@ class InteractiveCLI(cmd.Cmd):
             pass
 
     def _start_seeding(self, args):
+        args.filepath = self.cli.library.resolve(args.filepath)
         print(f"Seeding file: {args.filepath}")
         torrent = TorrentParse(args.filepath)
         self.metadata = torrent.get_info()
         if self.metadata is None:
             raise Exception
-        self.tracker_url = args.tracker if args.tracker else torrent.get_announce_url()
+        self.tracker_url = [args.tracker] if args.tracker else torrent.get_announce_urls()
         self.filepath =  args.filepath
         self.active_peer = Peer(
             host=args.host,
             port=args.port,
             shared_files=self.metadata,
-            save_path=DOWNLOAD_FOLDER
+            save_path=DOWNLOAD_FOLDER,
+            is_seed=True
         )
         threading.Thread(target=self.active_peer.start, daemon=True).start()
-        peer_list = self.active_peer.announce_to_tracker(self.tracker_url, args.filepath, args.host, args.port)
-        self.active_peer.get_peer_list(peer_list)
-        self.active_peer.start_periodic_updates(self.tracker_url, args.filepath)
+        if LSD_ENABLED:
+            self.active_peer.start_local_discovery(torrent.get_info_hash())
+        self._start_dht(args, torrent)
+        if self.tracker_url:
+            peer_list = self.active_peer.announce_to_tracker(self.tracker_url, args.filepath, args.host, args.port)
+            self.active_peer.get_peer_list(peer_list)
+            self.active_peer.start_periodic_updates(self.tracker_url, args.filepath, self.active_peer.bytes_left)
+    def _start_dht(self, args, torrent):
+        """Announce on the DHT when enabled or given --dht nodes; alongside the tracker, or alone if there is none."""
+        bootstrap = args.dht or DHT_BOOTSTRAP
+        if not (DHT_ENABLED or args.dht) or not bootstrap:
+            return
+        try:
+            self.active_peer.start_dht(bootstrap)
+            self.active_peer.dht_announce(torrent.get_info_hash())
+        except (OSError, ValueError) as e:
+            logger.error(f"DHT unavailable: {e}")
     def do_download(self, arg: str):
         """Download a file: download <torrent_file>"""
         try:
@@ -58,12 +89,13 @@ class InteractiveCLI(cmd.Cmd):
             pass
 
     def _start_download(self, args):
+        args.filepath = self.cli.library.resolve(args.filepath)
         print(f"Downloading from torrent: {args.filepath}")
         torrent = TorrentParse(args.filepath)
         self.metadata = torrent.get_info()
         if self.metadata is None:
             raise Exception
-        self.tracker_url = torrent.get_announce_url()
+        self.tracker_url = torrent.get_announce_urls()
         self.filepath =  args.filepath
         try:
             if not self.active_peer:
@@ -74,11 +106,20 @@ class InteractiveCLI(cmd.Cmd):
                     save_path=args.s
                 )
                 threading.Thread(target=self.active_peer.start, daemon=True).start()
-                self.active_peer.get_peer_list(self.active_peer.announce_to_tracker(self.tracker_url,args.filepath,args.host,args.port))
+                if self.tracker_url:
+                    self.active_peer.get_peer_list(self.active_peer.announce_to_tracker(self.tracker_url,args.filepath,args.host,args.port))
             else:
                 threading.Thread(target=self.active_peer.start, daemon=True).start()
-                self.active_peer.get_peer_list(self.active_peer.update_peer_list(self.tracker_url,args.filepath,args.host,args.port))
-            self.active_peer.start_periodic_updates(self.tracker_url, self.filepath)
+                if self.tracker_url:
+                    self.active_peer.get_peer_list(self.active_peer.update_peer_list(self.tracker_url,args.filepath,args.host,args.port))
+            if self.tracker_url:
+                # bytes_left describes the torrent the peer was created for; a reused peer leaves 'left' out
+                holds = self.active_peer.shared_files == self.metadata
+                self.active_peer.start_periodic_updates(self.tracker_url, self.filepath,
+                                                        self.active_peer.bytes_left if holds else None)
+            if LSD_ENABLED:
+                self.active_peer.start_local_discovery(torrent.get_info_hash())
+            self._start_dht(args, torrent)
             for peer in self.active_peer.peer_list:
                 if (self.active_peer.host,self.active_peer.port) != tuple(peer):
                     self.active_peer.connect_to_peer(tuple(peer))
@@ -94,6 +135,30 @@ class InteractiveCLI(cmd.Cmd):
         except SystemExit:
             pass
 
+    def do_recheck(self, arg: str):
+        """Verify downloaded data against a torrent: recheck -filepath <torrent> [-s <data path>] [--workers N]"""
+        try:
+            args = self.cli._parse_recheck_args(arg.split())
+            self.cli.recheck(args)
+        except SystemExit:
+            pass
+
+    def do_list(self, arg: str):
+        """List torrents in the library: list"""
+        try:
+            self.cli._parse_list_args(arg.split())
+            self.cli.list_torrents()
+        except SystemExit:
+            pass
+
+    def do_profile(self, arg: str):
+        """Profile transfers: profile start [--cpu] [--memory] | profile spans | profile stop [-o FILE]"""
+        try:
+            args = self.cli._parse_profile_args(arg.split())
+            self.cli.profile(args)
+        except SystemExit:
+            pass
+
     def do_run_tracker(self, arg: str):
         """Start tracker server: run-tracker [--host HOST] [--port PORT]"""
         try:
@@ -104,17 +169,40 @@ class InteractiveCLI(cmd.Cmd):
 
     def _start_tracker(self, args):
         print(f"Starting tracker at {args.host}:{args.port}")
-        self.active_tracker = Tracker(host=args.host, port=args.port)
+        self.active_tracker = Tracker(host=args.host, port=args.port, engine=args.engine)
         threading.Thread(target=self.active_tracker.run, daemon=True).start()
 
     def do_status(self,args):
-        """Show current status"""
+        """Show current status: status [--json]"""
+        if args.strip() == "--json":
+            if self.active_peer:
+                print(json.dumps(self.active_peer.get_transfer_stats(), indent=2))
+            return
         print("\n=== System Status ===")
         if self.active_tracker:
             print(f"Tracker: {'Running' if self.active_tracker else 'Stopped'}")
         if self.active_peer:
             print(f"Peer: {'Active' if self.active_peer else 'Inactive'}")
-            print(self.active_peer.get_network_status())
+            connection = self.active_peer.connection.get_connection_status()
+            print(f"Connections: {len(connection['active_peers'])}/{connection['max_connections']}")
+            self._print_transfer(self.active_peer.get_transfer_stats())
+
+    @staticmethod
+    def _rate(direction):
+        return " ".join(f"{rate / 1e6:.2f}" for rate in direction["rates"].values()) + " MB/s"
+
+    def _print_transfer(self, stats):
+        windows = "/".join(f"{window}s" for window in stats["windows"])
+        for torrent, entry in stats["torrents"].items():
+            line = (f"{torrent}: down {self._rate(entry['download'])} up {self._rate(entry['upload'])} ({windows}), "
+                    f"{entry['download']['bytes'] / 1e6:.1f} MB down, {entry['upload']['bytes'] / 1e6:.1f} MB up")
+            if "left" in entry:
+                eta = entry["eta_seconds"]
+                eta = "stalled" if eta is None else f"{eta // 3600}:{eta // 60 % 60:02}:{eta % 60:02}"
+                line += f", {entry['left'] / 1e6:.1f} MB left, ETA {eta}"
+            print(line)
+            for peer, directions in entry["peers"].items():
+                print(f"  {peer}: down {self._rate(directions['download'])} up {self._rate(directions['upload'])}")
 
     def do_exit(self,args):
         """Exit the program"""
@@ -124,6 +212,7 @@ class InteractiveCLI(cmd.Cmd):
             self.active_peer.stop()
         if self.active_tracker:
             self.active_tracker.shutdown()
+        self.cli.library.close()
         return True
 
 class CLI:
@@ -131,6 +220,8 @@ class CLI:
         self.parser = self._create_main_parser()
         self.subparsers = self.parser.add_subparsers(dest="command", required=True)
         self._setup_parsers()
+        self.library = TorrentLibrary()
+        self.library.watch()
 
     def _create_main_parser(self):
         return argparse.ArgumentParser(
@@ -145,6 +236,8 @@ class CLI:
         seed_p.add_argument("--host",type=str,default="127.0.0.1",required=True,help="Peer's host")
         seed_p.add_argument("--port",type=int,default=6000,required=True,help="Peer's port")
         seed_p.add_argument("--tracker", help="Tracker URL")
+        seed_p.add_argument("--dht", action="append", metavar="HOST:PORT",
+                            help="DHT node to join through (repeatable); enables the DHT")
 
         # download
         dl_p = self.subparsers.add_parser("download", help="Download a file")
@@ -152,14 +245,37 @@ class CLI:
         dl_p.add_argument("--host",type=str, default="127.0.0.1", help="Peer's host")
         dl_p.add_argument("--port",type=int, default=6000, help="Peer's port")
         dl_p.add_argument("-s",type=str, default=DOWNLOAD_FOLDER, help="Download directory")
+        dl_p.add_argument("--dht", action="append", metavar="HOST:PORT",
+                          help="DHT node to join through (repeatable); enables the DHT")
 
         # create
         create_p = self.subparsers.add_parser("create", help="Create torrent file")
         create_p.add_argument("-filepath",type=str, required=True, help="File to share")
         create_p.add_argument("--tracker", required=True, help="Tracker URL")
-        create_p.add_argument("-piece_length", type=int, default=CHUNK_SIZE)
+        create_p.add_argument("-piece_length", type=_piece_length_arg, default=CHUNK_SIZE,
+                              help="Piece length in KB, or 'auto' to pick one from the content size")
+        create_p.add_argument("-target_pieces", type=int, default=TARGET_PIECE_COUNT,
+                              help="Piece count aimed for when -piece_length is auto")
+        create_p.add_argument("-merkle", action="store_true",
+                              help="Also store per-block hashes so bad blocks can be refetched alone")
         create_p.add_argument("-s", default=TORRENT_FOLDER, help="Output directory")
 
+        # recheck
+        recheck_p = self.subparsers.add_parser("recheck", help="Verify data on disk against a torrent")
+        recheck_p.add_argument("-filepath", required=True, help="Torrent file name or info-hash")
+        recheck_p.add_argument("-s", default=None, help="Data file or directory (defaults to the seeded path or download folder)")
+        recheck_p.add_argument("--workers", type=int, default=None, help="Hashing threads (default: CPU count)")
+
+        # list
+        self.subparsers.add_parser("list", help="List torrents in the library")
+
+        # profile (interactive shell only: it acts on the running peer)
+        profile_p = self.subparsers.add_parser("profile", help="Time transfer spans, with optional cProfile/tracemalloc")
+        profile_p.add_argument("action", choices=["start", "stop", "spans"])
+        profile_p.add_argument("--cpu", action="store_true", help="start: also run cProfile")
+        profile_p.add_argument("--memory", action="store_true", help="start: also trace allocations with tracemalloc")
+        profile_p.add_argument("-o", default=None, help=f"stop: report file (default: {PROFILE_FOLDER}/profile-<time>.txt)")
+
         # run-tracker (also alias run_tracker)
         tracker_p = self.subparsers.add_parser(
             "run-tracker",
@@ -168,6 +284,8 @@ class CLI:
         )
         tracker_p.add_argument("--host", default=TRACKER_HOST)
         tracker_p.add_argument("--port", type=int, default=TRACKER_PORT)
+        tracker_p.add_argument("--engine", choices=["asyncio", "flask"], default=TRACKER_ENGINE,
+                               help="HTTP server: asyncio keep-alive server or Flask's development server")
 
     def _get_parser(self, command: str) -> argparse.ArgumentParser:
         """
@@ -190,6 +308,15 @@ class CLI:
     def _parse_create_args(self, args):
         return self._get_parser("create").parse_args(args)
 
+    def _parse_recheck_args(self, args):
+        return self._get_parser("recheck").parse_args(args)
+
+    def _parse_list_args(self, args):
+        return self._get_parser("list").parse_args(args)
+
+    def _parse_profile_args(self, args):
+        return self._get_parser("profile").parse_args(args)
+
     def _parse_tracker_args(self, args):
         # accept either "run-tracker" or "run_tracker"
         sub = "run-tracker" if "run-tracker" in self.subparsers.choices else "run_tracker"
@@ -200,11 +327,55 @@ class CLI:
         torrent = TorrentCreator(
             file_path=args.filepath,
             tracker_url=args.tracker,
-            piece_length=args.piece_length
+            piece_length=args.piece_length,
+            target_pieces=args.target_pieces,
+            merkle=args.merkle
         )
         output_path = torrent.create_torrent(args.s)
         print(f"Torrent created: {output_path}")
 
+    def recheck(self, args):
+        torrent_file = self.library.resolve(args.filepath)
+        print(f"Rechecking {torrent_file}")
+        result = recheck_torrent(torrent_file, data_path=args.s, workers=args.workers)
+        if result is None:
+            print("Could not read torrent")
+            return
+        print(f"{result['good_pieces']}/{result['piece_count']} pieces OK, "
+              f"{result['bytes']} bytes in {result['seconds']}s ({result['mb_per_s']} MB/s)")
+        if result['missing_files']:
+            print(f"Missing files: {result['missing_files']}")
+        if result['bad_pieces']:
+            shown = result['bad_pieces'][:20]
+            more = len(result['bad_pieces']) - len(shown)
+            print(f"Bad pieces: {shown}" + (f" (+{more} more)" if more else ""))
+        print(f"Resume state written to {result['resume_file']}")
+
+    def profile(self, args):
+        if args.action == "start":
+            profiler.start(cpu=args.cpu, memory=args.memory)
+            print(f"Profiling spans{', cProfile' if args.cpu else ''}{', tracemalloc' if args.memory else ''}")
+        elif args.action == "spans":
+            for name, span in profiler.span_summary().items():
+                print(f"{name:<16} {span['count']:>8}x  mean {span['mean_us']} us  p99 {span['p99_us']} us")
+        elif profiler.started is None:
+            print("No profile running")
+        else:
+            path = args.o or os.path.join(PROFILE_FOLDER, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.txt")
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            profiler.stop(path)
+            print(f"Profile written to {path}")
+
+    def list_torrents(self):
+        self.library.refresh()
+        torrents = self.library.list_torrents()
+        if not torrents:
+            print("No torrents in library")
+            return
+        print(f"{'info_hash':<12} {'size':>14} {'pieces':>8}  name")
+        for t in torrents:
+            print(f"{t['info_hash'][:12]:<12} {t['size']:>14} {t['piece_count']:>8}  {t['name']} ({t['path']})")
+
     def run(self):
         if len(sys.argv) > 1:
             args = self.parser.parse_args()
@@ -214,6 +385,12 @@ class CLI:
                 self._start_download(args)
             elif args.command == "create":
                 self.create_torrent(args)
+            elif args.command == "recheck":
+                self.recheck(args)
+            elif args.command == "list":
+                self.list_torrents()
+            elif args.command == "profile":
+                print("profile acts on a running peer; use it from the interactive shell")
             elif args.command in ("run-tracker"):
                 self._start_tracker(args)
         else:
@@ -0,0 +1,285 @@
+import hashlib
+import mmap
+from collections.abc import Mapping, Sequence
+
+# Strings at least this long are returned as memoryviews into the source buffer
+# by the lazy decoder instead of being copied into new bytes objects.
+LAZY_STRING_THRESHOLD = 1024
+
+_INT = ord("i")
+_LIST = ord("l")
+_DICT = ord("d")
+_END = ord("e")
+_ZERO = ord("0")
+_NINE = ord("9")
+
+
+def _find(data, sub, pos):
+    # mmap has find() but no index()
+    found = data.find(sub, pos)
+    if found == -1:
+        raise ValueError(f"Unterminated bencode value at offset {pos}")
+    return found
+
+
+def encode(obj):
+    """
+    Encode a Python object to bencode bytes. Dict keys keep their insertion
+    order, as bencodepy did when writing the existing .torrent files, so that
+    decoding and re-encoding a torrent reproduces its bytes and info-hash.
+    """
+    out = []
+    _encode(obj, out)
+    return b"".join(out)
+
+
+def _encode(obj, out):
+    if isinstance(obj, (LazyDict, LazyList)):
+        # Already canonical bencode in the source buffer, copy it verbatim
+        out.append(bytes(obj.raw()))
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        out.append(str(len(obj)).encode())
+        out.append(b":")
+        out.append(bytes(obj))
+    elif isinstance(obj, str):
+        _encode(obj.encode("utf-8"), out)
+    elif isinstance(obj, int):
+        out.append(b"i%de" % obj)
+    elif isinstance(obj, Mapping):
+        out.append(b"d")
+        for key, value in obj.items():
+            _encode(key, out)
+            _encode(value, out)
+        out.append(b"e")
+    elif isinstance(obj, Sequence):
+        out.append(b"l")
+        for item in obj:
+            _encode(item, out)
+        out.append(b"e")
+    else:
+        raise TypeError(f"Cannot bencode object of type {type(obj).__name__}")
+
+
+def decode(data):
+    """Eagerly decode bencode bytes into dicts, lists, ints and bytes."""
+    try:
+        value, pos = _decode_eager(data, 0)
+    except IndexError:
+        # An unterminated list or dict, or no data at all
+        raise ValueError("Bencode value runs past end of data") from None
+    if pos != len(data):
+        raise ValueError(f"Trailing data after bencode value at offset {pos}")
+    return value
+
+
+def _decode_eager(data, pos):
+    c = data[pos]
+    if c == _INT:
+        end = _find(data, b"e", pos)
+        return int(data[pos + 1:end]), end + 1
+    if _ZERO <= c <= _NINE:
+        colon = _find(data, b":", pos)
+        start = colon + 1
+        end = start + int(data[pos:colon])
+        if end > len(data):
+            raise ValueError(f"String at offset {pos} runs past end of data")
+        return bytes(data[start:end]), end
+    if c == _LIST:
+        pos += 1
+        items = []
+        while data[pos] != _END:
+            item, pos = _decode_eager(data, pos)
+            items.append(item)
+        return items, pos + 1
+    if c == _DICT:
+        pos += 1
+        result = {}
+        while data[pos] != _END:
+            key, pos = _decode_eager(data, pos)
+            result[key], pos = _decode_eager(data, pos)
+        return result, pos + 1
+    raise ValueError(f"Invalid bencode byte {chr(c)!r} at offset {pos}")
+
+
+def _skip(data, pos):
+    """Return the offset just past the value starting at pos without decoding it."""
+    find = data.find
+    depth = 0
+    while True:
+        try:
+            c = data[pos]
+        except IndexError:
+            raise ValueError("Bencode value runs past end of data") from None
+        if _ZERO <= c <= _NINE:
+            colon = find(b":", pos)
+            if colon == -1:
+                raise ValueError(f"Unterminated bencode string at offset {pos}")
+            pos = colon + 1 + int(data[pos:colon])
+        elif c == _LIST or c == _DICT:
+            depth += 1
+            pos += 1
+            continue
+        elif c == _INT:
+            pos = _find(data, b"e", pos) + 1
+        elif c == _END and depth > 0:
+            depth -= 1
+            pos += 1
+        else:
+            raise ValueError(f"Invalid bencode byte {chr(c)!r} at offset {pos}")
+        if depth == 0:
+            if pos > len(data):
+                raise ValueError("Bencode value runs past end of data")
+            return pos
+
+
+class _LazySource:
+    """The buffer being decoded: the original object for searching and a memoryview for slicing."""
+    def __init__(self, data):
+        self.data = data
+        self.view = memoryview(data)
+
+    def value(self, start, end):
+        c = self.data[start]
+        if c == _DICT:
+            return LazyDict(self, start, end)
+        if c == _LIST:
+            return LazyList(self, start, end)
+        if c == _INT:
+            return int(self.data[start + 1:end - 1])
+        colon = _find(self.data, b":", start)
+        if end - colon - 1 >= LAZY_STRING_THRESHOLD:
+            return self.view[colon + 1:end]
+        return bytes(self.data[colon + 1:end])
+
+
+class LazyDict(Mapping):
+    """
+    Read-only dict view over a bencoded dictionary. Keys are indexed on first
+    access by skipping over the values; each value is decoded only when read.
+    """
+    def __init__(self, source, start, end=None):
+        self._source = source
+        self._start = start
+        self._end = end
+        self._offsets = None
+        self._cache = {}
+
+    def _index(self):
+        if self._offsets is None:
+            data = self._source.data
+            offsets = {}
+            pos = self._start + 1
+            while data[pos] != _END:
+                colon = _find(data, b":", pos)
+                key_end = colon + 1 + int(data[pos:colon])
+                key = bytes(data[colon + 1:key_end])
+                value_end = _skip(data, key_end)
+                offsets[key] = (key_end, value_end)
+                pos = value_end
+            self._end = pos + 1
+            self._offsets = offsets
+        return self._offsets
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        if key not in self._cache:
+            start, end = self._index()[key]
+            self._cache[key] = self._source.value(start, end)
+        return self._cache[key]
+
+    def __iter__(self):
+        return iter(self._index())
+
+    def __len__(self):
+        return len(self._index())
+
+    def __repr__(self):
+        return f"LazyDict({list(self._index())})"
+
+    def raw(self, key=None):
+        """Return the bencoded bytes of this dict, or of one of its values, as a memoryview."""
+        if key is None:
+            self._index()
+            return self._source.view[self._start:self._end]
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        start, end = self._index()[key]
+        return self._source.view[start:end]
+
+    def to_dict(self):
+        """Fully decode into plain Python objects."""
+        return decode(bytes(self.raw()))
+
+
+class LazyList(Sequence):
+    """Read-only list view over a bencoded list whose items are decoded on demand."""
+    def __init__(self, source, start, end=None):
+        self._source = source
+        self._start = start
+        self._end = end
+        self._offsets = None
+        self._cache = {}
+
+    def _index(self):
+        if self._offsets is None:
+            data = self._source.data
+            offsets = []
+            pos = self._start + 1
+            while data[pos] != _END:
+                item_end = _skip(data, pos)
+                offsets.append((pos, item_end))
+                pos = item_end
+            self._end = pos + 1
+            self._offsets = offsets
+        return self._offsets
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        offsets = self._index()
+        if index < 0:
+            index += len(offsets)
+        if index not in self._cache:
+            start, end = offsets[index]
+            self._cache[index] = self._source.value(start, end)
+        return self._cache[index]
+
+    def __len__(self):
+        return len(self._index())
+
+    def __repr__(self):
+        return f"LazyList(len={len(self)})"
+
+    def raw(self):
+        self._index()
+        return self._source.view[self._start:self._end]
+
+    def to_list(self):
+        return decode(bytes(self.raw()))
+
+
+def decode_lazy(data):
+    """
+    Decode the value at the start of data lazily. Dicts and lists come back as
+    LazyDict/LazyList views that keep a reference to data, so it must stay
+    alive (and, for an mmap, open) while they are in use.
+    """
+    source = _LazySource(data)
+    end = _skip(data, 0)
+    return source.value(0, end)
+
+
+def load(file_path):
+    """
+    Memory-map a bencoded file and decode it lazily. Returns (value, mmap);
+    the caller owns the mmap and must keep it open while the value is used.
+    """
+    with open(file_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return decode_lazy(mapped), mapped
+
+
+def info_hash(torrent):
+    """SHA-1 of the raw 'info' byte range of a lazily decoded torrent."""
+    return hashlib.sha1(torrent.raw(b"info")).hexdigest()
@@ -0,0 +1,52 @@
+import base64
+import socket
+import struct
+
+_PORT = struct.Struct(">H")
+
+def pack_key(ip, port):
+    """
+    Compact peer key: 6 bytes for IPv4, 18 for IPv6 (address then big-endian
+    port). Anything else (hostnames, odd ports) falls back to an "ip|port" str.
+    """
+    try:
+        port = int(port)
+        if ':' in ip:
+            return socket.inet_pton(socket.AF_INET6, ip) + _PORT.pack(port)
+        return socket.inet_aton(ip) + _PORT.pack(port) if ip.count('.') == 3 else f"{ip}|{port}"
+    except (OSError, TypeError, ValueError, struct.error):
+        return f"{ip}|{port}"
+
+def unpack_key(key):
+    """Inverse of pack_key: the (ip, port) pair."""
+    if isinstance(key, str):
+        ip, _, port = key.rpartition('|')
+        return (ip, int(port) if port.isdigit() else port)
+    if len(key) == 6:
+        return (socket.inet_ntoa(key[:4]), _PORT.unpack_from(key, 4)[0])
+    return (socket.inet_ntop(socket.AF_INET6, key[:16]), _PORT.unpack_from(key, 16)[0])
+
+def pack_peer(ip, port):
+    """6-byte record: IPv4 address then big-endian port. Returns None for non-IPv4 peers."""
+    try:
+        return socket.inet_aton(ip) + _PORT.pack(int(port))
+    except (OSError, TypeError, ValueError, struct.error):
+        return None
+
+def pack_peers(peers):
+    """Concatenate the 6-byte records of (ip, port) pairs, skipping ones that cannot be packed."""
+    return b"".join(record for record in (pack_peer(ip, port) for ip, port in peers) if record)
+
+def unpack_peers(data):
+    """Inverse of pack_peers: a list of [ip, port] pairs, the same shape as the JSON peer list."""
+    return [
+        [socket.inet_ntoa(data[i:i + 4]), _PORT.unpack_from(data, i + 4)[0]]
+        for i in range(0, len(data) - len(data) % 6, 6)
+    ]
+
+def encode_peers(peers):
+    """Packed records as base64 text so they fit in a JSON response."""
+    return base64.b64encode(pack_peers(peers)).decode("ascii")
+
+def decode_peers(text):
+    return unpack_peers(base64.b64decode(text))
@@ -6,11 +6,39 @@ TRACKER_HOST = "127.0.0.1"
 TRACKER_PORT = 6881
 PEER_PORT_RANGE = (6000,6999)
 CLEANUP_INTERVAL = 60
+TRACKER_ENGINE = "asyncio"  # or "flask" for the Flask development server
+TRACKER_BACKLOG = 1024
+TRACKER_KEEPALIVE_TIMEOUT = 75
+TRACKER_MAX_BODY = 64 * 1024
+TRACKER_SHARDS = 16  # Peer_DB partitions, each with its own lock
+TRACKER_DEFAULT_NUMWANT = 50  # Peers returned when the client does not send numwant
+TRACKER_MAX_NUMWANT = 200
+TRACKER_ANNOUNCE_INTERVAL = 90  # Seconds between client refreshes at normal load
+TRACKER_MAX_INTERVAL = 1800  # Upper bound when stretched for load and swarm size
+TRACKER_TARGET_RATE = 500  # Requests/s the tracker is sized for; above it intervals grow
+TRACKER_RATE_WINDOW = 30  # Seconds over which the request rate is smoothed
+TRACKER_EXPIRY_FACTOR = 2  # Peers expire after this many missed intervals
+TRACKER_EXPIRY_GRANULARITY = 5  # Seconds per Peer_DB expiry wheel bucket; peers expire at most this late
+TRACKER_WHEEL_SLACK = 2  # Wheel entries per live peer before a shard rebuilds its wheel without the stale ones
+TRACKER_UDP_PORT = TRACKER_PORT  # UDP listener beside the HTTP one; None disables it
+TRACKER_UDP_TIMEOUT = 2  # Client-side initial reply timeout, doubled on each retry
+TRACKER_UDP_RETRIES = 3
+TRACKER_HTTP_TIMEOUT = 5
+TRACKER_CLIENT_WORKERS = 4  # Background threads for non-blocking announces
+TRACKER_CLIENT_RETRIES = 3
+TRACKER_BACKOFF_BASE = 0.5  # Seconds; retry delays are jittered up to base * 2**attempt
+TRACKER_BACKOFF_MAX = 30
+TRACKER_STATE_FOLDER = "data/tracker"  # Snapshot and journal for warm restarts; None disables them
+TRACKER_SNAPSHOT_INTERVAL = 300
+TRACKER_JOURNAL_FLUSH_INTERVAL = 1  # Journal records buffered at most this long (seconds)
 TORRENT_FOLDER = "data/torrents"
 DOWNLOAD_FOLDER = "data/downloads"
 UPLOAD_FOLDER = "data/uploads"
+RESUME_FOLDER = "data/resume"
+LIBRARY_DB = "data/library.sqlite"
+LIBRARY_SCAN_INTERVAL = 30
 
-for folder in [TORRENT_FOLDER,DOWNLOAD_FOLDER,UPLOAD_FOLDER]:
+for folder in [TORRENT_FOLDER,DOWNLOAD_FOLDER,UPLOAD_FOLDER,RESUME_FOLDER,TRACKER_STATE_FOLDER]:
     if not os.path.exists(folder):
         os.makedirs(folder)
 LOG_LEVEL = "INFO"
@@ -18,3 +46,60 @@ LOG_FILE = "logs/app.log"
 
 MAX_CONNECTIONS = 5
 CHUNK_SIZE = 512 
+
+# Peer exchange: seconds between messages on a connection, the shortest gap
+# accepted from a peer, and the most added/dropped peers per message
+PEX_INTERVAL = 60
+PEX_MIN_INTERVAL = 30
+PEX_MAX_PEERS = 50
+
+# Local peer discovery (BEP 14 multicast). LSD_INTERFACE picks the interface
+# to join the group on. "127.0.0.1" matches the default peer host and keeps
+# discovery to peers on this host; use the LAN address (or "0.0.0.0") for
+# peers listening on the LAN.
+LSD_ENABLED = True
+LSD_GROUP = "239.192.152.143"
+LSD_PORT = 6771
+LSD_INTERFACE = "127.0.0.1"
+LSD_INTERVAL = 300  # Seconds between re-announces of each torrent
+LSD_MIN_INTERVAL = 1  # Shortest gap between announces of one torrent, replies included
+
+# Kademlia DHT (BEP 5): bucket size and lookup parallelism, seconds to wait
+# for each round of replies, and lifetimes of tokens and announced peers
+DHT_ENABLED = False
+DHT_BOOTSTRAP = []  # "host:port" of nodes to join through
+DHT_K = 8
+DHT_ALPHA = 3
+DHT_TIMEOUT = 1.0
+DHT_TOKEN_INTERVAL = 300
+DHT_PEER_TTL = 30 * 60
+DHT_ANNOUNCE_INTERVAL = 15 * 60
+DHT_MAX_VALUES = 50  # Peers per get_peers reply, to fit one datagram
+
+# Transfer statistics: EWMA windows for the rates and seconds between samples
+STATS_WINDOWS = (5, 20, 60)
+STATS_INTERVAL = 1.0
+
+# Profiling (see utils.profiling): time spans from startup rather than only
+# between "profile start" and "profile stop", durations kept per span for
+# percentiles, and where reports are written
+PROFILE_SPANS = False
+PROFILE_RECENT = 1000
+PROFILE_FOLDER = "logs"
+
+# Automatic piece length selection (sizes in KB, like CHUNK_SIZE)
+MIN_PIECE_LENGTH = 16
+MAX_PIECE_LENGTH = 16 * 1024
+TARGET_PIECE_COUNT = 1500
+
+# Per-block hash tree (bytes) and how often a bad block is refetched before giving up
+MERKLE_BLOCK_LENGTH = 16 * 1024
+MAX_BLOCK_RETRIES = 3
+
+# Full-data recheck
+RECHECK_READ_SIZE = 8 * 1024 * 1024
+
+# Logging: records waiting for the writer thread before new ones are dropped,
+# and seconds between per-chunk progress messages
+LOG_QUEUE_SIZE = 10000
+LOG_CHUNK_INTERVAL = 1.0
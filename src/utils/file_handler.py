@@ -1,6 +1,6 @@
 import os
 import hashlib
-import bencodepy
+from utils import bencode
 
 CHUNK_SIZE = 512 * 1024
 HASH_ALGO = "sha1"
@@ -18,7 +18,7 @@ class FileHandler:
         os.makedirs(os.path.dirname(file_path),exist_ok=True)
         with open(file_path,mode) as file:
             if(is_torrent):
-                file.write(bencodepy.encode(data))
+                file.write(bencode.encode(data))
             else:
                 file.write(data)
     @staticmethod
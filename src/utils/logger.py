@@ -1,17 +1,101 @@
-import logging
 import os
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from utils.config import LOG_QUEUE_SIZE, LOG_CHUNK_INTERVAL
 
 LOG_DIR = "logs"
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Message arguments formatted later on the writer thread; anything else could
+# change before then, so records carrying it are formatted before queueing
+LAZY_ARG_TYPES = (int, float, str, bytes, bool, type(None))
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread, so file I/O happens off the calling
+    thread, as does %-formatting when every argument is an immutable scalar.
+    When the queue is full, records are dropped and counted rather than
+    blocking.
+    """
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.drop_lock = threading.Lock()
+
+    def prepare(self, record):
+        args = record.args
+        if args and (not isinstance(args, tuple) or not all(isinstance(arg, LAZY_ARG_TYPES) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames; render them now and pass text only
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _drop(self, count):
+        with self.drop_lock:
+            self.dropped += count
+
+    def enqueue(self, record):
+        if self.dropped:
+            with self.drop_lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                try:
+                    self.queue.put_nowait(logging.makeLogRecord({
+                        "name": record.name, "levelno": logging.WARNING, "levelname": "WARNING",
+                        "msg": "%d log records dropped, writer fell behind", "args": (dropped,)}))
+                except queue.Full:
+                    self._drop(dropped + 1)
+                    return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._drop(1)
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # Wait for room so stop() still drains a full queue
+
+class LogThrottle:
+    """
+    Lets one message through per interval seconds. allow() returns how many
+    were held back since the last one let through, or None to skip this one.
+    """
+    def __init__(self, interval=LOG_CHUNK_INTERVAL):
+        self.interval = interval
+        self.next = 0.0
+        self.suppressed = 0
+
+    def allow(self):
+        now = time.monotonic()
+        if now < self.next:
+            self.suppressed += 1
+            return None
+        self.next = now + self.interval
+        suppressed, self.suppressed = self.suppressed, 0
+        return suppressed
+
 if os.path.exists(LOG_FILE):
     open(LOG_FILE, "w").close()
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
+file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
+file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+log_queue = queue.Queue(LOG_QUEUE_SIZE)
+listener = _QueueListener(log_queue, file_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)  # Drain the queue to the file before logging shuts down
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
     handlers=[
-        logging.FileHandler(LOG_FILE, encoding="utf-8")
+        _QueueHandler(log_queue)
     ]
 )
-logger = logging.getLogger("P2P-Torrent-Client")
\ No newline at end of file
+logger = logging.getLogger("P2P-Torrent-Client")
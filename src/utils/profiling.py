@@ -0,0 +1,206 @@
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import deque
+from utils.config import PROFILE_SPANS, PROFILE_RECENT
+
+# cProfile hooks one thread per Profile before 3.12; from 3.12 it uses
+# sys.monitoring, which sees every thread but allows one active Profile.
+PER_THREAD_CPU = sys.version_info < (3, 12)
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, traceback):
+        return None
+
+NULL_SPAN = _NullSpan()
+
+class SpanStats:
+    """Count, total and max of one span's durations, and the last PROFILE_RECENT for percentiles."""
+    __slots__ = ("count", "total", "max", "recent", "lock")
+
+    def __init__(self, recent=PROFILE_RECENT):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=recent)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            self.recent.append(seconds)
+
+    def summary(self):
+        with self.lock:
+            recent = sorted(self.recent)
+            count, total, peak = self.count, self.total, self.max
+        pick = lambda pct: recent[min(len(recent) - 1, int(len(recent) * pct / 100))] * 1e6 if recent else 0.0
+        return {"count": count, "total_ms": round(total * 1000, 3),
+                "mean_us": round(total / count * 1e6, 1) if count else 0.0,
+                "p50_us": round(pick(50), 1), "p99_us": round(pick(99), 1), "max_us": round(peak * 1e6, 1)}
+
+class _Span:
+    __slots__ = ("stats", "start")
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stats.record(time.perf_counter() - self.start)
+
+class _ThreadProfile:
+    """A thread's Profile in a CPU run. Dropping it, also when the thread exits, releases its count."""
+    __slots__ = ("owner", "run", "profile")
+
+    def __init__(self, owner, run):
+        self.owner = owner
+        self.run = run
+        self.profile = cProfile.Profile()
+
+    def __del__(self):
+        with self.owner.lock:
+            self.owner.live_profiles -= 1
+            self.owner._update_active()
+
+class Profiler:
+    """
+    Timing spans around the transfer path, plus cProfile and tracemalloc on
+    demand. Call sites use `with profiler.span("disk_read"):`; while nothing
+    is switched on that is one flag test returning a shared no-op span.
+
+    Before Python 3.12 cProfile only sees the thread that enabled it, so each
+    thread passing a span turns on its own Profile while a CPU profile is
+    running and turns it off at its first span after the run ends; the
+    report merges them. Threads that never pass a span are not profiled.
+    """
+    def __init__(self, spans=PROFILE_SPANS):
+        self.lock = threading.RLock()  # RLock: _ThreadProfile.__del__ may run while it is held
+        self.local = threading.local()
+        self.spans = {}
+        self.spans_enabled = spans
+        self.cpu_run = None       # Profiles of the running CPU profile, or None
+        self.live_profiles = 0    # Per-thread Profiles still enabled
+        self.memory = False
+        self.started = None
+        self.active = spans       # Fast path flag: any span work to do at all
+
+    def _update_active(self):
+        self.active = self.spans_enabled or self.cpu_run is not None or self.live_profiles > 0
+
+    def span(self, name):
+        if not self.active:
+            return NULL_SPAN
+        if PER_THREAD_CPU:
+            self._sync_thread()
+        if not self.spans_enabled:
+            return NULL_SPAN
+        stats = self.spans.get(name)
+        if stats is None:
+            with self.lock:
+                stats = self.spans.setdefault(name, SpanStats())
+        return _Span(stats)
+
+    def _sync_thread(self):
+        """Start or stop this thread's Profile to match the CPU profile run."""
+        local = self.local
+        run = self.cpu_run
+        current = getattr(local, "cpu", None)
+        if (current.run if current is not None else None) is run:
+            return
+        if current is not None:
+            current.profile.disable()
+            local.cpu = None
+        if run is not None:
+            with self.lock:
+                local.cpu = _ThreadProfile(self, run)
+                run.append(local.cpu.profile)
+                self.live_profiles += 1
+                self._update_active()
+            local.cpu.profile.enable()
+
+    def start(self, spans=True, cpu=False, memory=False):
+        """Begin a profiling run. Span timings restart from zero."""
+        with self.lock:
+            self.spans = {}
+            self.spans_enabled = spans or self.spans_enabled
+            if cpu and self.cpu_run is None:
+                self.cpu_run = []
+                if not PER_THREAD_CPU:
+                    profile = cProfile.Profile()
+                    profile.enable()
+                    self.cpu_run.append(profile)
+            self._update_active()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self.memory = True
+        self.started = time.time()
+
+    def span_summary(self):
+        with self.lock:
+            spans = dict(self.spans)
+        return {name: stats.summary() for name, stats in sorted(spans.items())}
+
+    def stop(self, path=None, top=40):
+        """
+        End the run and write its report to path: span timings, the top
+        functions by cumulative time and the largest allocation sites. The
+        raw cProfile data goes to path + ".prof" for pstats or snakeviz.
+        Returns the report text.
+        """
+        with self.lock:
+            run, self.cpu_run = self.cpu_run, None
+            self.spans_enabled = PROFILE_SPANS
+            self._update_active()
+        spans = self.span_summary()
+        elapsed = time.time() - self.started if self.started else 0.0
+        out = io.StringIO()
+        out.write(f"Profile of {elapsed:.1f}s ending {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        out.write(f"{'span':<16}{'count':>9}{'total ms':>12}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}\n")
+        for name, s in spans.items():
+            out.write(f"{name:<16}{s['count']:>9}{s['total_ms']:>12}{s['mean_us']:>10}{s['p50_us']:>10}"
+                      f"{s['p99_us']:>10}{s['max_us']:>10}\n")
+        if run:
+            if not PER_THREAD_CPU:
+                run[0].disable()
+            stats = pstats.Stats(run[0], stream=out)
+            for profile in run[1:]:
+                stats.add(profile)
+            threads = f"{len(run)} thread{'s' if len(run) != 1 else ''}" if PER_THREAD_CPU else "all threads"
+            out.write(f"\nCPU profile ({threads})\n")
+            stats.sort_stats("cumulative").print_stats(top)
+            if path:
+                stats.dump_stats(path + ".prof")
+        elif run is not None:
+            out.write("\nCPU profile: no thread passed a span while it ran\n")
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.memory = False
+            out.write(f"\nMemory: {current / 1e6:.1f} MB traced now, {peak / 1e6:.1f} MB peak\n")
+            for stat in snapshot.statistics("lineno")[:top]:
+                out.write(f"{stat}\n")
+        report = out.getvalue()
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(report)
+        self.started = None
+        return report
+
+profiler = Profiler()
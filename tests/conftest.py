@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Modules import as `from utils.x import ...`, the way they run from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path[0] = os.path.abspath(sys.path[0])
+# utils.logger truncates logs/app.log under the working directory on import
+os.chdir(tempfile.mkdtemp(prefix="p2p-tests-"))
+
+# test_peer.py is a mock peer server script that blocks when imported
+collect_ignore = ["test_peer.py"]
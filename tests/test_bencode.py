@@ -0,0 +1,79 @@
+import hashlib
+import pytest
+from utils import bencode
+
+TORRENT = {
+    b"announce": b"http://127.0.0.1:8080/announce",
+    b"info": {
+        b"name": b"file.bin",
+        b"piece length": 16384,
+        b"length": 40000,
+        b"pieces": bytes(range(60)),
+        b"files": [{b"length": 1, b"path": [b"a", b"b"]}, {b"length": -2, b"path": []}],
+    },
+    b"comment": b"x" * (bencode.LAZY_STRING_THRESHOLD + 1),
+}
+
+
+def test_round_trip():
+    data = bencode.encode(TORRENT)
+    assert bencode.decode(data) == TORRENT
+    assert bencode.encode(bencode.decode(data)) == data
+    assert bencode.encode({"key": ["text", 0, b""]}) == b"d3:keyl4:texti0e0:ee"
+
+
+def test_keys_keep_insertion_order():
+    assert bencode.encode({b"z": 1, b"a": 2}) == b"d1:zi1e1:ai2ee"
+
+
+def test_lazy_matches_eager():
+    data = bencode.encode(TORRENT)
+    lazy = bencode.decode_lazy(data)
+    assert lazy.to_dict() == TORRENT
+    assert lazy["info"]["files"][1]["length"] == -2
+    assert list(lazy["info"]["files"][-1]["path"]) == []
+    # Long strings come back as views into the source buffer
+    assert isinstance(lazy["comment"], memoryview)
+    assert bytes(lazy["comment"]) == TORRENT[b"comment"]
+    # Lazy values re-encode from their raw bytes
+    assert bencode.encode(lazy) == data
+    assert bencode.info_hash(lazy) == hashlib.sha1(bencode.encode(TORRENT[b"info"])).hexdigest()
+
+
+def test_load(tmp_path):
+    path = tmp_path / "file.torrent"
+    path.write_bytes(bencode.encode(TORRENT))
+    torrent, mapped = bencode.load(str(path))
+    try:
+        assert torrent[b"info"][b"length"] == 40000
+    finally:
+        del torrent
+        mapped.close()
+
+
+def test_unencodable():
+    with pytest.raises(TypeError):
+        bencode.encode(1.5)
+    with pytest.raises(TypeError):
+        bencode.encode({b"a": None})
+
+
+@pytest.mark.parametrize("data", [
+    b"", b"i", b"ie", b"i1x2e", b"3ab", b"5:ab", b"x", b"-1:a",
+    b"l", b"d", b"li1e", b"l5:abe", b"d1:a", b"d1:ae",
+])
+def test_malformed(data):
+    with pytest.raises(ValueError):
+        bencode.decode(data)
+    with pytest.raises(ValueError):
+        value = bencode.decode_lazy(data)
+        # Dicts are only indexed, and their keys checked, on first access
+        if isinstance(value, bencode.LazyDict):
+            value.to_dict()
+
+
+def test_trailing_data():
+    with pytest.raises(ValueError):
+        bencode.decode(b"i1ee")
+    # The lazy decoder reads only the value at the start
+    assert bencode.decode_lazy(b"i1ee") == 1
@@ -0,0 +1,44 @@
+import base64
+from tracker.peers_db import Peer_DB
+from peer.connections import PeerConnection
+from utils.compact_peers import (pack_key, unpack_key, pack_peer, pack_peers, unpack_peers,
+                                 encode_peers, decode_peers)
+
+
+def test_pack_and_unpack_peers():
+    peers = [["10.0.0.1", 6000], ["192.168.1.20", 65535], ["127.0.0.1", 1]]
+    packed = pack_peers(peers)
+    assert len(packed) == 18
+    assert packed[:6] == bytes([10, 0, 0, 1]) + (6000).to_bytes(2, "big")
+    assert unpack_peers(packed) == peers
+    assert decode_peers(encode_peers(peers)) == peers
+
+
+def test_peers_without_a_compact_form_are_skipped():
+    assert pack_peer("::1", 6000) is None
+    assert pack_peer("localhost", 6000) is None
+    assert pack_peers([["localhost", 6000], ["10.0.0.1", 6001]]) == pack_peer("10.0.0.1", 6001)
+    # A trailing partial record is ignored
+    assert unpack_peers(pack_peer("10.0.0.1", 6001) + b"\x01\x02") == [["10.0.0.1", 6001]]
+
+
+def test_keys():
+    assert pack_key("10.0.0.1", "6000") == pack_peer("10.0.0.1", 6000)
+    assert len(pack_key("2001:db8::1", 6000)) == 18
+    assert pack_key("localhost", 6000) == "localhost|6000"
+    for peer in [("10.0.0.1", 6000), ("2001:db8::1", 6001), ("localhost", 6002)]:
+        assert unpack_key(pack_key(*peer)) == peer
+
+
+def test_compact_reply_keeps_other_peers():
+    db = Peer_DB()
+    for peer in [("10.0.0.1", 6000), ("2001:db8::1", 6001), ("localhost", 6002)]:
+        db.add_peer("file.torrent", peer)
+    packed, others = db.get_peers_compact("file.torrent")
+    assert packed == pack_peer("10.0.0.1", 6000)
+    assert sorted(others) == [("2001:db8::1", 6001), ("localhost", 6002)]
+    assert db.get_peers_compact("unknown.torrent") == (b"", [])
+
+    reply = {"peers": base64.b64encode(packed).decode("ascii"), "compact": 1,
+             "peers_other": [list(peer) for peer in others]}
+    assert sorted(map(tuple, PeerConnection._decode_peer_list(reply))) == sorted(db.get_peers("file.torrent"))
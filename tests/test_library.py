@@ -0,0 +1,68 @@
+import os
+import shutil
+import sqlite3
+import pytest
+from torrent.library import TorrentLibrary
+from torrent.torrent_creator import TorrentCreator
+
+
+def create(tmp_path, name, folder):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(40000))
+    return os.path.basename(TorrentCreator(str(path), "http://127.0.0.1:1", piece_length=16)
+                            .create_torrent(output_dir=str(folder)))
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "torrents"
+    folder.mkdir()
+    return folder
+
+
+@pytest.fixture
+def library(tmp_path, folder):
+    library = TorrentLibrary(folder=str(folder), db_path=str(tmp_path / "library.sqlite"))
+    yield library
+    library.close()
+
+
+def test_copies_of_one_torrent(tmp_path, folder, library):
+    name = create(tmp_path, "a.bin", folder)
+    shutil.copy(folder / name, folder / "copy.torrent")
+    assert library.refresh() == (2, 0)
+    assert sorted(entry["path"] for entry in library.list_torrents()) == ["a.bin.torrent", "copy.torrent"]
+    info_hash = library.lookup("copy.torrent")["info_hash"]
+    assert library.lookup(name)["info_hash"] == info_hash
+    assert library.lookup(info_hash.upper())["path"] == name
+
+    os.remove(folder / name)
+    assert library.refresh() == (0, 1)
+    assert library.resolve(info_hash[:8]) == "copy.torrent"
+
+
+def test_lookup_by_prefix(tmp_path, folder, library):
+    names = [create(tmp_path, f"{n}.bin", folder) for n in "ab"]
+    library.refresh()
+    hashes = [library.lookup(name)["info_hash"] for name in names]
+    assert [library.lookup(h[:6])["path"] for h in hashes] == names
+    # LIKE wildcards in the key are matched literally
+    for key in ("%", "_" * 40, hashes[0][:4] + "%", ""):
+        assert library.lookup(key) is None
+    assert library.resolve("missing.torrent") == "missing.torrent"
+
+
+def test_old_catalog_is_rebuilt(tmp_path, folder):
+    db_path = str(tmp_path / "library.sqlite")
+    old = sqlite3.connect(db_path)
+    old.execute("CREATE TABLE torrents (info_hash TEXT PRIMARY KEY, path TEXT NOT NULL UNIQUE)")
+    old.commit()
+    old.close()
+    name = create(tmp_path, "a.bin", folder)
+    shutil.copy(folder / name, folder / "copy.torrent")
+    library = TorrentLibrary(folder=str(folder), db_path=db_path)
+    try:
+        assert library.refresh() == (2, 0)
+        assert len(library.list_torrents()) == 2
+    finally:
+        library.close()
@@ -0,0 +1,89 @@
+import os
+import time
+import socket
+import pytest
+from peer.peer import Peer
+from torrent.torrent_creator import TorrentCreator
+from torrent.torrent_parser import TorrentParse
+
+HOST = "127.0.0.1"
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def torrent(tmp_path):
+    """(info dict, file contents, info-hash) of a 256 KB file in 64 KB pieces."""
+    data = os.urandom(256 * 1024)
+    path = tmp_path / "shared.bin"
+    path.write_bytes(data)
+    torrent_path = TorrentCreator(str(path), f"http://{HOST}:1", piece_length=64).create_torrent(output_dir=str(tmp_path))
+    parsed = TorrentParse(torrent_path)
+    return parsed.get_info(), data, parsed.get_info_hash()
+
+
+@pytest.fixture
+def peers():
+    started = []
+
+    def start(info, save_path, seed, path=None):
+        """A started peer; a leecher serves what it downloads unless path says otherwise."""
+        if path or not seed:
+            info = dict(info)
+            info[b'path'] = (path or os.path.join(save_path, bytes(info[b'name']).decode())).encode()
+        peer = Peer(host=HOST, port=free_port(), shared_files=info, save_path=str(save_path), is_seed=seed)
+        peer.start()
+        assert peer.connection.server_ready.wait(5)
+        started.append(peer)
+        return peer
+    yield start
+    for peer in started:
+        peer.stop()
+
+
+def downloaded(peer, info):
+    with open(os.path.join(peer.save_path, bytes(info[b'name']).decode()), "rb") as f:
+        return f.read()
+
+
+def test_download_from_peer_that_dialled_us(torrent, peers, tmp_path):
+    info, data, _ = torrent
+    seed = peers(info, tmp_path, seed=True)
+    leecher = peers(info, tmp_path / "leecher", seed=False)
+    seed_address = (HOST, seed.port)
+    assert seed.connect_to_peer((HOST, leecher.port))
+    # The seed's PEX message tells the leecher where it listens; the leecher
+    # dials back, since it can only send requests on its own connections
+    assert wait_for(lambda: leecher.connection.get_socket(seed_address) is not None)
+    leecher.download(info[b'name'])
+    assert downloaded(leecher, info) == data
+
+
+def test_local_discovery_peers_download_from_each_other(torrent, peers, tmp_path):
+    info, data, info_hash = torrent
+    pair = []
+    for name in ("a", "b"):
+        # Each serves the complete file and downloads it again into a folder of its own
+        pair.append(peers(info, tmp_path / name, seed=False, path=str(tmp_path / "shared.bin")))
+    for peer in pair:
+        if not peer.start_local_discovery(info_hash):
+            pytest.skip("multicast unavailable")
+    a, b = pair
+    assert wait_for(lambda: a.connection.get_socket((HOST, b.port)) is not None and
+                    b.connection.get_socket((HOST, a.port)) is not None)
+    for peer in pair:
+        peer.download(info[b'name'])
+        assert downloaded(peer, info) == data
@@ -0,0 +1,89 @@
+import os
+import hashlib
+import pytest
+from torrent import merkle
+from torrent.merkle import MerkleVerifier, has_block_hashes, merkle_root
+from torrent.torrent_creator import TorrentCreator
+from torrent.torrent_parser import TorrentParse
+
+PIECE_LENGTH = 64 * 1024
+
+
+def sha1(data):
+    return hashlib.sha1(data).digest()
+
+
+def test_merkle_root():
+    a, b, c = sha1(b"a"), sha1(b"b"), sha1(b"c")
+    assert merkle_root([]) == sha1(b"")
+    assert merkle_root([a]) == a
+    assert merkle_root([a, b]) == sha1(a + b)
+    # An odd level repeats its last node
+    assert merkle_root([a, b, c]) == sha1(sha1(a + b) + sha1(c + c))
+
+
+def test_block_length_for():
+    assert merkle.block_length_for(PIECE_LENGTH, 16384) == 16384
+    assert merkle.block_length_for(24576, 16384) == 8192
+    assert merkle.block_length_for(8192, 16384) == 8192
+
+
+@pytest.fixture
+def merkle_torrent(tmp_path):
+    """(info dict, file contents) of a file whose last piece and block are short."""
+    data = os.urandom(3 * PIECE_LENGTH + 20000)
+    path = tmp_path / "shared.bin"
+    path.write_bytes(data)
+    torrent_path = TorrentCreator(str(path), "http://127.0.0.1:1", piece_length=64, merkle=True) \
+        .create_torrent(output_dir=str(tmp_path))
+    parsed = TorrentParse(torrent_path)
+    return parsed.get_info(), data
+
+
+def test_leaves_and_root(merkle_torrent):
+    info, data = merkle_torrent
+    assert has_block_hashes(info)
+    assert not has_block_hashes({b'piece_length': PIECE_LENGTH})
+    verifier = MerkleVerifier(info)
+    assert verifier.check_root()
+    block = verifier.block_length
+    assert len(verifier.leaves) == 20 * -(-len(data) // block)
+    assert verifier.block_count(3) == 2
+    assert verifier.block_range(3, 1) == (block, 20000 - block)
+    assert verifier.get_block_hashes(0)[1] == sha1(data[block:2 * block])
+    assert verifier.get_block_hashes(3) == [sha1(data[3 * PIECE_LENGTH:3 * PIECE_LENGTH + block]),
+                                            sha1(data[3 * PIECE_LENGTH + block:])]
+
+
+def test_tampered_root(merkle_torrent):
+    info, _ = merkle_torrent
+    info = dict(info)
+    root, leaves = info[b'merkle_root'], bytearray(info[b'block_hashes'])
+    info[b'merkle_root'] = sha1(b"other")
+    assert not MerkleVerifier(info).check_root()
+    # A single changed leaf no longer hashes up to the stored root
+    leaves[-1] ^= 0xFF
+    info[b'merkle_root'], info[b'block_hashes'] = root, bytes(leaves)
+    assert not MerkleVerifier(info).check_root()
+    # Without a stored root there is nothing to check against
+    del info[b'merkle_root']
+    assert MerkleVerifier(info).check_root()
+
+
+def test_verify_block(merkle_torrent):
+    info, data = merkle_torrent
+    verifier = MerkleVerifier(info)
+    block = verifier.block_length
+    piece = data[PIECE_LENGTH:2 * PIECE_LENGTH]
+    assert verifier.verify_block(1, 2, piece[2 * block:3 * block])
+    assert not verifier.verify_block(1, 2, piece[3 * block:4 * block])
+    assert verifier.bad_blocks(1, piece) == []
+
+    corrupted = bytearray(piece)
+    corrupted[2 * block + 7] ^= 0xFF
+    assert verifier.bad_blocks(1, corrupted) == [2]
+    # A short piece fails its missing blocks
+    assert verifier.bad_blocks(1, piece[:block + 1]) == [1, 2, 3]
+    last = data[3 * PIECE_LENGTH:]
+    assert verifier.bad_blocks(3, last) == []
+    assert verifier.bad_blocks(3, last[:-1]) == [1]
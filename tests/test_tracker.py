@@ -0,0 +1,183 @@
+import pytest
+from tracker import peers_db as peers_db_module
+from tracker.peers_db import Peer_DB
+from tracker.persistence import TrackerJournal
+from utils.compact_peers import pack_key, unpack_key
+
+TORRENT = "file.torrent"
+GRANULARITY = 5
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Peer_DB and TrackerJournal both read time.time()
+    clock = Clock(1_700_000_000.0)
+    monkeypatch.setattr(peers_db_module.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def db(clock):
+    return Peer_DB(timeout=60, shards=4, granularity=GRANULARITY)
+
+
+def test_add_and_remove(db):
+    db.add_peer(TORRENT, ("10.0.0.1", 6000))
+    db.add_peer(TORRENT, ("10.0.0.2", 6001), left=0)
+    assert sorted(db.get_peers(TORRENT)) == [("10.0.0.1", 6000), ("10.0.0.2", 6001)]
+    assert db.scrape(TORRENT) == {"seeders": 1, "leechers": 1, "completed": 0}
+    with pytest.raises(BufferError):
+        db.add_peer(TORRENT, ("10.0.0.1", 6000))
+
+    db.remove_peer(TORRENT, ("10.0.0.1", 6000))
+    assert db.get_peers(TORRENT) == [("10.0.0.2", 6001)]
+    db.remove_peer(TORRENT, ("10.0.0.2", 6001))
+    assert db.get_peers(TORRENT) is None
+    assert db.stats()["peers"] == 0
+
+
+def test_refresh_marks_completion(db):
+    db.add_peer(TORRENT, ("10.0.0.1", 6000), left=100)
+    db.update_last_seen(TORRENT, ("10.0.0.1", 6000), left=0)
+    assert db.scrape(TORRENT) == {"seeders": 1, "leechers": 0, "completed": 1}
+    assert not db.update_key(TORRENT, pack_key("10.0.0.9", 6000))
+
+
+def test_expire(db, clock):
+    db.add_peer(TORRENT, ("10.0.0.1", 6000), ttl=30)
+    db.add_peer(TORRENT, ("10.0.0.2", 6000), ttl=300)
+    clock.now += 30 + GRANULARITY
+    assert db.cleanup_inactive_peers() == 1
+    assert db.get_peers(TORRENT) == [("10.0.0.2", 6000)]
+    clock.now += 300
+    assert db.cleanup_inactive_peers() == 1
+    assert db.get_peers(TORRENT) is None
+    assert db.stats()["peers"] == 0
+
+
+def test_refresh_extends_expiry(db, clock):
+    db.add_peer(TORRENT, ("10.0.0.1", 6000), ttl=30)
+    clock.now += 20
+    db.update_last_seen(TORRENT, ("10.0.0.1", 6000), ttl=30)
+    clock.now += 20 + GRANULARITY
+    # The entry filed by the add has come due, but the peer was refreshed since
+    assert db.cleanup_inactive_peers() == 0
+    clock.now += 30
+    assert db.cleanup_inactive_peers() == 1
+
+
+def test_refresh_to_shorter_ttl(db, clock):
+    db.add_peer(TORRENT, ("10.0.0.1", 6000), ttl=600)
+    db.update_last_seen(TORRENT, ("10.0.0.1", 6000), ttl=30)
+    clock.now += 30 + GRANULARITY
+    assert db.cleanup_inactive_peers() == 1
+    assert db.get_peers(TORRENT) is None
+    # The stale entry from the add comes due later and finds nothing to drop
+    clock.now += 600
+    assert db.cleanup_inactive_peers() == 0
+    assert db.stats()["peers"] == 0
+
+
+def test_refreshes_keep_wheel_bounded(db, clock):
+    peers = [("10.0.0.%d" % i, 6000) for i in range(1, 5)]
+    for peer in peers:
+        db.add_peer(TORRENT, peer, ttl=600)
+    for _ in range(1000):
+        clock.now += 1
+        for peer in peers:
+            db.update_last_seen(TORRENT, peer, ttl=600)
+    entries = sum(shard.entries for shard in db.shards)
+    assert entries == sum(len(keys) for shard in db.shards
+                          for torrents in shard.wheel.values() for keys in torrents.values())
+    assert entries <= peers_db_module.TRACKER_WHEEL_SLACK * len(peers) + 1
+    clock.now += 600 + GRANULARITY
+    assert db.cleanup_inactive_peers() == len(peers)
+    assert sum(shard.entries for shard in db.shards) == 0
+
+
+def test_key_forms(db):
+    peers = [("10.0.0.1", 6000), ("2001:db8::1", 6001), ("peer.example", 6002)]
+    for peer in peers:
+        db.add_peer(TORRENT, peer)
+    keys = [pack_key(*peer) for peer in peers]
+    assert [len(key) for key in keys[:2]] == [6, 18]
+    assert keys[2] == "peer.example|6002"
+    assert sorted(db.get_peers(TORRENT)) == sorted(peers)
+    assert [unpack_key(key) for key in keys] == peers
+    assert all(db.peer_exist(TORRENT, peer) for peer in peers)
+    # Only IPv4 peers fit the 6-byte compact form
+    assert db.get_peers_packed(TORRENT) == keys[0]
+    db.remove_peer(TORRENT, ("2001:db8::1", 6001))
+    db.remove_peer(TORRENT, ("peer.example", 6002))
+    assert db.get_peers(TORRENT) == [("10.0.0.1", 6000)]
+
+
+def swarms(db):
+    return {info_hash: ({key: (expiry, seeder) for key, expiry, seeder in zip(keys, expires, seeding)}, completed)
+            for info_hash, keys, expires, seeding, completed in db.export_swarms()}
+
+
+def test_snapshot_and_journal_round_trip(db, clock, tmp_path):
+    journal = TrackerJournal(db, str(tmp_path), snapshot_interval=3600, flush_interval=3600)
+    journal.start()
+    try:
+        # In the snapshot
+        db.add_peer(TORRENT, ("10.0.0.1", 6000), left=10)
+        db.add_peer(TORRENT, ("2001:db8::1", 6001), left=0)
+        db.add_peer(TORRENT, ("peer.example", 6002))
+        db.add_peer("other.torrent", ("10.0.0.2", 6000), ttl=600)
+        db.update_last_seen(TORRENT, ("10.0.0.1", 6000), left=0)
+        journal.snapshot()
+        # Only in the journal
+        db.add_peer(TORRENT, ("10.0.0.3", 6003), left=5)
+        db.add_peer(TORRENT, ("2001:db8::2", 6004))
+        db.update_last_seen(TORRENT, ("peer.example", 6002), ttl=300)
+        db.remove_peer(TORRENT, ("2001:db8::1", 6001))
+        db.remove_peer("other.torrent", ("10.0.0.2", 6000))
+        journal.flush()
+
+        restored = Peer_DB(timeout=60, shards=4, granularity=GRANULARITY)
+        assert TrackerJournal(restored, str(tmp_path)).restore() > 0
+    finally:
+        journal.stop_event.set()
+        journal.thread.join()
+
+    assert swarms(restored) == swarms(db)
+    assert restored.scrape(TORRENT) == db.scrape(TORRENT) == {"seeders": 1, "leechers": 3, "completed": 1}
+    assert restored.stats()["peers"] == db.stats()["peers"] == 4
+    # Restored peers expire on the same schedule
+    clock.now += 60 + GRANULARITY
+    assert restored.cleanup_inactive_peers() == db.cleanup_inactive_peers() == 3
+    assert restored.get_peers(TORRENT) == db.get_peers(TORRENT) == [("peer.example", 6002)]
+
+
+def test_restore_drops_lapsed_journal_records(db, clock, tmp_path):
+    journal = TrackerJournal(db, str(tmp_path), snapshot_interval=3600, flush_interval=3600)
+    journal.start()
+    try:
+        db.add_peer(TORRENT, ("10.0.0.1", 6000), ttl=600)
+        db.add_peer(TORRENT, ("10.0.0.2", 6000), ttl=600)
+        journal.snapshot()
+        db.add_peer(TORRENT, ("10.0.0.3", 6000), ttl=30)
+        db.update_last_seen(TORRENT, ("10.0.0.2", 6000), ttl=30)
+        journal.flush()
+    finally:
+        journal.stop_event.set()
+        journal.thread.join()
+
+    clock.now += 30 + GRANULARITY
+    restored = Peer_DB(timeout=60, shards=4, granularity=GRANULARITY)
+    TrackerJournal(restored, str(tmp_path)).restore()
+    assert restored.get_peers(TORRENT) == [("10.0.0.1", 6000)]
+    assert restored.stats()["peers"] == 1
+    clock.now += 600
+    assert restored.cleanup_inactive_peers() == 1
+    assert restored.get_peers(TORRENT) is None
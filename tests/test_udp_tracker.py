@@ -0,0 +1,132 @@
+import socket
+import pytest
+from peer.udp_tracker_client import UDPTrackerClient
+from tracker.peers_db import Peer_DB
+from tracker.udp_server import (
+    UDPTrackerServer, PROTOCOL_ID, ACTION_CONNECT, ACTION_ANNOUNCE, ACTION_SCRAPE, ACTION_ERROR,
+    EVENT_NONE, EVENT_COMPLETED, EVENT_STOPPED, HEADER, ANNOUNCE, ID_LENGTH, LEFT,
+    CONNECT_REPLY, ANNOUNCE_REPLY, SCRAPE_ENTRY, REPLY_HEADER
+)
+from utils.compact_peers import unpack_peers
+
+HOST = "127.0.0.1"
+CLIENT = ("10.0.0.1", 40000)
+TORRENT = "file.torrent"
+
+
+@pytest.fixture
+def server():
+    return UDPTrackerServer(HOST, 0, Peer_DB(timeout=60))
+
+
+def connect(server, addr=CLIENT):
+    reply = server.handle_packet(HEADER.pack(PROTOCOL_ID, ACTION_CONNECT, 7), addr)
+    action, transaction_id, connection_id = CONNECT_REPLY.unpack(reply)
+    assert (action, transaction_id) == (ACTION_CONNECT, 7)
+    return connection_id
+
+
+def announce(server, connection_id, port, event=EVENT_NONE, left=None, ip=b'\0\0\0\0', torrent=TORRENT,
+             addr=CLIENT):
+    torrent = torrent.encode()
+    body = ANNOUNCE.pack(ip, port, -1, event, len(torrent)) + torrent
+    if left is not None:
+        body += LEFT.pack(left)
+    return server.handle_packet(HEADER.pack(connection_id, ACTION_ANNOUNCE, 8) + body, addr)
+
+
+def error(reply):
+    action, transaction_id = REPLY_HEADER.unpack_from(reply)
+    assert action == ACTION_ERROR
+    return reply[REPLY_HEADER.size:].decode()
+
+
+def test_connect(server):
+    assert server.handle_packet(b"\0" * (HEADER.size - 1), CLIENT) is None
+    assert server.handle_packet(HEADER.pack(PROTOCOL_ID + 1, ACTION_CONNECT, 7), CLIENT) is None
+    connection_id = connect(server)
+    # The id is tied to the sender's address
+    assert connect(server) == connection_id
+    assert connect(server, ("10.0.0.2", 40000)) != connection_id
+    assert error(announce(server, connection_id, 6000, addr=("10.0.0.2", 40000))) == "Invalid connection id"
+
+
+def test_announce(server):
+    connection_id = connect(server)
+    reply = announce(server, connection_id, 6000, left=100)
+    action, transaction_id, interval = ANNOUNCE_REPLY.unpack_from(reply)
+    assert (action, transaction_id) == (ACTION_ANNOUNCE, 8) and interval > 0
+    # An explicit ip replaces the sender's
+    reply = announce(server, connection_id, 6001, ip=socket.inet_aton("10.0.0.9"))
+    assert sorted(unpack_peers(reply[ANNOUNCE_REPLY.size:])) == [["10.0.0.1", 6000], ["10.0.0.9", 6001]]
+    assert server.peer_db.scrape(TORRENT) == {"seeders": 0, "leechers": 2, "completed": 0}
+
+    announce(server, connection_id, 6000, event=EVENT_COMPLETED)
+    assert server.peer_db.scrape(TORRENT) == {"seeders": 1, "leechers": 1, "completed": 1}
+    reply = announce(server, connection_id, 6000, event=EVENT_STOPPED)
+    assert len(reply) == ANNOUNCE_REPLY.size
+    assert server.peer_db.get_peers(TORRENT) == [("10.0.0.9", 6001)]
+
+
+def test_malformed(server):
+    connection_id = connect(server)
+    header = HEADER.pack(connection_id, ACTION_ANNOUNCE, 8)
+    assert error(server.handle_packet(header + b"\0" * (ANNOUNCE.size - 1), CLIENT)) == "Malformed request"
+    assert error(announce(server, connection_id, 6000, torrent="")) == "Missing torrent_id"
+    # The id length runs past the end of the packet
+    body = ANNOUNCE.pack(b'\0\0\0\0', 6000, -1, EVENT_NONE, 20) + b"short"
+    assert error(server.handle_packet(header + body, CLIENT)) == "Missing torrent_id"
+    body = ID_LENGTH.pack(2) + b"\xff\xfe"
+    assert error(server.handle_packet(HEADER.pack(connection_id, ACTION_SCRAPE, 8) + body, CLIENT)) \
+        == "Malformed request"
+    assert error(server.handle_packet(HEADER.pack(connection_id, 9, 8), CLIENT)) == "Unknown action"
+
+
+def test_scrape(server):
+    connection_id = connect(server)
+    announce(server, connection_id, 6000, left=0)
+    announce(server, connection_id, 6001)
+    body = b"".join(ID_LENGTH.pack(len(t)) + t for t in (TORRENT.encode(), b"other.torrent"))
+    reply = server.handle_packet(HEADER.pack(connection_id, ACTION_SCRAPE, 8) + body, CLIENT)
+    assert REPLY_HEADER.unpack_from(reply) == (ACTION_SCRAPE, 8)
+    entries = [SCRAPE_ENTRY.unpack_from(reply, REPLY_HEADER.size + i * SCRAPE_ENTRY.size) for i in range(2)]
+    assert entries == [(1, 0, 1), (0, 0, 0)]
+    assert len(reply) == REPLY_HEADER.size + 2 * SCRAPE_ENTRY.size
+
+
+def test_client_round_trip(server):
+    server.start()
+    client = UDPTrackerClient(timeout=0.5, retries=2)
+    url = f"udp://{HOST}:{server.sock.getsockname()[1]}"
+    try:
+        interval, peers = client.announce(url, TORRENT, HOST, 6000, left=10)
+        assert interval > 0 and peers == [[HOST, 6000]]
+        # Joining as a seed is not a completed download
+        _, peers = client.announce(url, TORRENT, HOST, 6001, event=EVENT_COMPLETED)
+        assert sorted(peers) == [[HOST, 6000], [HOST, 6001]]
+        assert client.scrape(url, [TORRENT, "other.torrent"]) == {
+            TORRENT: {'seeders': 1, 'completed': 0, 'leechers': 1},
+            "other.torrent": {'seeders': 0, 'completed': 0, 'leechers': 0},
+        }
+        # A connection id the tracker no longer accepts is replaced once
+        tracker = next(iter(client.trackers.values()))
+        tracker.connection_id ^= 1
+        client.announce(url, TORRENT, HOST, 6000, event=EVENT_STOPPED)
+        assert server.peer_db.get_peers(TORRENT) == [(HOST, 6001)]
+        assert client.bytes_out > 0 and client.bytes_in > 0
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_client_timeout():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as silent:
+        silent.bind((HOST, 0))
+        client = UDPTrackerClient(timeout=0.05, retries=2)
+        try:
+            with pytest.raises(TimeoutError):
+                client.announce(f"udp://{HOST}:{silent.getsockname()[1]}", TORRENT, HOST, 6000)
+        finally:
+            client.close()
+        # Each try sent one connect request
+        assert len([silent.recv(2048) for _ in range(2)]) == 2